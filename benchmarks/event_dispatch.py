@@ -0,0 +1,66 @@
+''' Compare the compiled event dispatch with the old per-call lookups
+
+Run with: python -m benchmarks.event_dispatch
+'''
+import time
+
+from hexgame import entity
+
+
+def legacy_signal(ent, event, value=None):
+    ''' Entity.signal_event before the dispatch table '''
+    listeners_map = entity.Entity._event_listeners
+    ent_type = type(ent).__name__
+    listeners_list = [
+        listeners_map.get(None, {}).get(None, []),
+        listeners_map.get(None, {}).get(event, []),
+        listeners_map.get(ent_type, {}).get(None, []),
+        listeners_map.get(ent_type, {}).get(event, [])
+    ]
+    for listeners in listeners_list:
+        for listener in listeners:
+            listener(ent, event, value)
+
+
+def time_events(signal, ents, events):
+    start = time.perf_counter()
+    for ent in ents:
+        for event in events:
+            signal(ent, event)
+    entity.Entity.deliver_events()
+    return time.perf_counter() - start
+
+
+def main():
+    counts = {}
+
+    def handler(ent, event, value):
+        counts[event] = counts.get(event, 0) + 1
+
+    def batch_handler(events):
+        for ent, event, value in events:
+            counts[event] = counts.get(event, 0) + 1
+
+    ents = [entity.Plant() for _ in range(100000)]
+    events = ['birth', 'death', 'diseased', 'disease_cured']
+    types = ['Creature', 'Plant']
+    num_events = len(ents) * len(events)
+
+    entity.Entity.add_event_listener(handler, types, events)
+    legacy = time_events(legacy_signal, ents, events)
+    compiled = time_events(entity.Entity.signal_event, ents, events)
+    entity.Entity.remove_event_listener(handler)
+
+    entity.Entity.add_event_listener(batch_handler, types, events, batched=True)
+    batched = time_events(entity.Entity.signal_event, ents, events)
+    entity.Entity.remove_event_listener(batch_handler)
+
+    for name, elapsed in (('legacy', legacy), ('compiled', compiled),
+                          ('batched', batched)):
+        print(f'{name:>8}: {elapsed:.3f}s for {num_events} events '
+              f'({num_events/elapsed/1e6:.2f}M events/s, '
+              f'{legacy/elapsed:.2f}x legacy)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+''' Compare the numpy random pool with the scalar random.Random path
+
+Run with: python -m benchmarks.random_pool
+'''
+import contextlib
+import io
+import random
+import time
+
+from hexgame import randpool
+from hexgame import simulation
+
+
+def draws(rand, count):
+    ''' The rolls every plant and creature update makes, one at a time '''
+    for i in range(count):
+        rand.randrange(1000 - i % 900) == 0
+        rand.randrange(100 - i % 90) == 0
+
+
+def block_draws(pool, count):
+    ''' The same rolls, taken from a block like the world does '''
+    values = iter(pool.take(2 * count))
+    for i in range(count):
+        next(values) * (1000 - i % 900) < 1
+        next(values) * (100 - i % 90) < 1
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def time_ticks(random_mode, ticks):
+    ''' Return the seconds per entity update of a run '''
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim = simulation.Simulation(1, random_mode=random_mode)
+        sim.populate()
+        seconds = 0
+        updates = 0
+        for _ in range(ticks):
+            updates += sum(
+                layer.count() for layer in sim.world.entity_layers())
+            start = time.perf_counter()
+            sim.update()
+            seconds += time.perf_counter() - start
+        sim.close()
+        return seconds / updates
+
+
+def main():
+    count = 200000
+    scalar = time_call(draws, random.Random(1), count)
+    pool = time_call(block_draws, randpool.RandomPool(1), count)
+    print(f'{count} update rolls: scalar {scalar:.3f}s, pool {pool:.3f}s '
+          f'({scalar/pool:.2f}x)')
+
+    ticks = 300
+    # Per entity update, the runs don't end with the same populations
+    scalar = time_ticks('shared', ticks)
+    pool = time_ticks('pool', ticks)
+    print(f'{ticks} ticks: scalar {scalar*1e6:.2f}us, pool {pool*1e6:.2f}us '
+          f'per entity update ({scalar/pool:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,403 @@
+import logging
+
+import numpy as np
+
+from . import location
+from . import stats
+
+
+CREATURE_FIELDS = {
+    'life': np.int32,
+    'reproduce': np.int32,
+    'satiation': np.int32,
+    'health': np.int32,
+    'diseased': np.bool_,
+    'cured': np.bool_,
+    'progression': np.int32,
+    'resistance': np.int32,
+    'birth_cost': np.int32,
+    'generation': np.int32,
+    'direction': np.int8,
+}
+
+PLANT_FIELDS = {
+    'life': np.int32,
+    'reproduce': np.int32,
+    'diseased': np.bool_,
+    'generation': np.int32,
+}
+
+DISEASE_FIELDS = {
+    'life': np.int8,
+}
+
+
+class ArrayLayer:
+    ''' A layer stored as one array per field, indexed by cell '''
+    def __init__(self, num_cells, fields):
+        self._fields = fields
+        self.occupied = np.zeros(num_cells, dtype=np.bool_)
+        for name, dtype in fields.items():
+            setattr(self, name, np.zeros(num_cells, dtype=dtype))
+
+    def field(self, name):
+        return getattr(self, name)
+
+    def cells(self):
+        ''' Return the indices of all occupied cells '''
+        return np.flatnonzero(self.occupied)
+
+    def count(self):
+        return int(np.count_nonzero(self.occupied))
+
+    def add(self, cells, **values):
+        ''' Occupy the (empty) cells, setting fields to values or 0 '''
+        self.occupied[cells] = True
+        for name in self._fields:
+            self.field(name)[cells] = values.get(name, 0)
+
+    def move(self, src, dst):
+        ''' Move the entities in cells src to the empty cells dst '''
+        for name in self._fields:
+            array = self.field(name)
+            array[dst] = array[src]
+            array[src] = 0
+        self.occupied[src] = False
+        self.occupied[dst] = True
+
+    def remove(self, cells):
+        self.occupied[cells] = False
+        for name in self._fields:
+            self.field(name)[cells] = 0
+
+
+class ArrayWorld:
+    ''' Structure-of-arrays version of World with vectorized entity rules
+
+    Follows the same rules as Creature, Plant and Disease in hexgame.entity.
+    Entities are updated in batches instead of one at a time, so when two
+    entities want the same cell in a tick the winner is picked at random, and
+    entities can't move into a cell vacated during the same tick.
+    '''
+    def __init__(self, size=30, seed=None):
+        if size is None:
+            raise ValueError('ArrayWorld needs a bounded grid size')
+        self._size = size
+        self._width = 2*size + 1
+        self._grid = location.Grid(size)
+        self._rand = np.random.default_rng(seed)
+        num_cells = self._width * self._width
+        self._neighbors = self._make_neighbors()
+        self._creatures = ArrayLayer(num_cells, CREATURE_FIELDS)
+        self._plants = ArrayLayer(num_cells, PLANT_FIELDS)
+        self._diseases = ArrayLayer(num_cells, DISEASE_FIELDS)
+        self._counters = {
+            ent_type + field: 0
+            for ent_type in stats.ENT_TYPES
+            for field in ['Births', 'Deaths', 'Generation']
+        }
+        self._counters.update(DiseaseBirths=0, DiseaseDeaths=0)
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def creatures(self):
+        return self._creatures
+
+    @property
+    def plants(self):
+        return self._plants
+
+    @property
+    def diseases(self):
+        return self._diseases
+
+    def layer(self, index):
+        return (self._creatures, self._plants, self._diseases)[index]
+
+    @property
+    def grid(self):
+        return self._grid
+
+    def cell(self, loc):
+        ''' Return the cell index of a Location, or -1 if it is off the grid '''
+        return self._grid.cell_at(loc)
+
+    def location(self, cell):
+        return self._grid.location(int(cell))
+
+    def _make_neighbors(self):
+        size = self._size
+        coords = np.arange(-size, size + 1)
+        ys, xs = np.meshgrid(coords, coords, indexing='ij')
+        xs = xs.ravel()
+        ys = ys.ravel()
+        even = (ys % 2) == 0
+        neighbors = np.empty((6, xs.size), dtype=np.int64)
+        for dir in location.Direction.dirs():
+            nx = xs + np.where(even, dir.even_x, dir.odd_x)
+            ny = ys + dir.y
+            inside = (np.abs(nx) <= size) & (np.abs(ny) <= size)
+            cells = (ny + size) * self._width + (nx + size)
+            neighbors[dir.idx] = np.where(inside, cells, -1)
+        return neighbors
+
+    def add_creatures(self, cells, satiation=1000, birth_cost=200,
+                      disease_resistance=50, generation=1):
+        cells = self._empty(self._creatures, np.asarray(cells))
+        self._creatures.add(
+            cells, life=1000, reproduce=500, satiation=satiation, health=100,
+            resistance=disease_resistance, birth_cost=birth_cost,
+            generation=generation)
+        self._births('Creature', cells.size, generation)
+
+    def add_plants(self, cells, diseased=False, generation=1):
+        cells = self._empty(self._plants, np.asarray(cells))
+        self._plants.add(
+            cells, life=1000, reproduce=100, diseased=diseased,
+            generation=generation)
+        self._births('Plant', cells.size, generation)
+
+    def _empty(self, layer, cells):
+        cells = np.unique(cells[cells >= 0])
+        return cells[~layer.occupied[cells]]
+
+    def _births(self, ent_type, count, generation):
+        if count:
+            self._counters[ent_type + 'Births'] += int(count)
+            key = ent_type + 'Generation'
+            self._counters[key] = max(self._counters[key], int(np.max(generation)))
+
+    def _deaths(self, layer, ent_type, cells):
+        if cells.size:
+            self._counters[ent_type + 'Deaths'] += int(cells.size)
+            layer.remove(cells)
+
+    def _chance(self, size):
+        return self._rand.random(size)
+
+    def _randrange_zero(self, values):
+        ''' Vectorized "values <= 0 or rand.randrange(values) == 0" '''
+        return (values <= 0) | (self._chance(values.size) * values < 1)
+
+    def _claim(self, targets):
+        ''' Pick one winner at random for each distinct target cell
+
+        Returns indices into targets
+        '''
+        order = self._rand.permutation(targets.size)
+        _, first = np.unique(targets[order], return_index=True)
+        return np.sort(order[first])
+
+    def _infect(self, cells, chance):
+        ''' Vectorized Creature._maybe_get_disease, returns infected cells '''
+        c = self._creatures
+        cells = cells[~c.cured[cells] & ~c.diseased[cells]]
+        adjusted = chance * (101 - c.resistance[cells]) / 100
+        cells = cells[self._chance(cells.size) < adjusted]
+        c.diseased[cells] = True
+        return cells
+
+    def update(self):
+        disease_cells = self._diseases.cells()
+        self._update_creatures()
+        self._update_plants()
+        self._update_diseases(disease_cells)
+
+    def _update_creatures(self):
+        c = self._creatures
+        cells = c.cells()
+
+        # Disease progression and cure
+        sick = cells[c.diseased[cells]]
+        c.progression[sick] += 1
+        penalty = c.progression[sick] // 100
+        c.life[sick] -= penalty
+        c.satiation[sick] -= penalty
+        cure_chance = c.resistance[sick] / 10000
+        cured = sick[self._chance(sick.size) < cure_chance]
+        c.diseased[cured] = False
+        c.cured[cured] = True
+
+        # Age
+        c.life[cells] -= 1
+        dead = self._randrange_zero(c.life[cells])
+        self._deaths(c, 'Creature', cells[dead])
+        cells = cells[~dead]
+
+        # Hunger
+        c.satiation[cells] -= 1
+        hungry = self._randrange_zero(c.satiation[cells])
+        c.health[cells[hungry]] -= 10
+        dead = c.health[cells] <= 0
+        self._deaths(c, 'Creature', cells[dead])
+        cells = cells[~dead]
+
+        # Eat
+        p = self._plants
+        eating = cells[(c.health[cells] < 100) & p.occupied[cells]]
+        nourishment = np.clip((1000 - p.life[eating]) // 5, 10, 100)
+        c.health[eating] = np.minimum(100, c.health[eating] + nourishment // 10)
+        c.satiation[eating] = np.minimum(1000, c.satiation[eating] + nourishment)
+        self._infect(eating[p.diseased[eating]], 1/5)
+        self._deaths(p, 'Plant', eating)
+
+        # Reproduce
+        c.reproduce[cells] -= 1
+        parents = cells[self._randrange_zero(c.reproduce[cells])]
+        c.reproduce[parents] = 500
+        dirs = self._rand.integers(0, 6, parents.size)
+        targets = self._neighbors[dirs, parents]
+        free = (targets >= 0)
+        free[free] = ~c.occupied[targets[free]]
+        parents = parents[free]
+        targets = targets[free]
+        winners = self._claim(targets)
+        parents = parents[winners]
+        targets = targets[winners]
+        self._make_creatures(parents, targets)
+
+        # Move
+        moving = cells[self._rand.integers(0, 2, cells.size) == 1]
+        dirs = c.direction[moving].astype(np.int64)
+        targets = self._neighbors[dirs, moving]
+        turns = np.array([-1, -1, 0, 0, 1])[self._rand.integers(0, 5, moving.size)]
+        c.direction[moving] = (dirs + turns) % 6
+        free = (targets >= 0)
+        free[free] = ~c.occupied[targets[free]]
+        moving = moving[free]
+        targets = targets[free]
+        winners = self._claim(targets)
+        moving = moving[winners]
+        targets = targets[winners]
+        was_diseased = c.diseased[moving]
+        c.move(moving, targets)
+
+        d = self._diseases
+        drop = moving[was_diseased]
+        drop = drop[~d.occupied[drop]]
+        d.add(drop, life=3)
+        self._counters['DiseaseBirths'] += int(drop.size)
+        healthy = targets[~was_diseased]
+        infected = self._infect(healthy[d.occupied[healthy]], 2/3)
+        self._deaths(d, 'Disease', infected)
+
+    def _make_creatures(self, parents, targets):
+        c = self._creatures
+        c.satiation[parents] -= c.birth_cost[parents]
+        birth_cost = np.maximum(
+            0, c.birth_cost[parents] + self._rand.integers(-2, 3, parents.size))
+        resistance = np.clip(
+            c.resistance[parents] + self._rand.integers(-1, 2, parents.size), 0, 100)
+        generation = c.generation[parents] + 1
+        diseased_parents = c.diseased[parents]
+        c.add(
+            targets, life=1000, reproduce=500, satiation=c.satiation[parents],
+            health=100, resistance=resistance, birth_cost=birth_cost,
+            generation=generation)
+        self._births('Creature', targets.size, generation)
+        self._infect(targets[diseased_parents], 1/2)
+
+    def _update_plants(self):
+        p = self._plants
+        cells = p.cells()
+
+        p.life[cells] -= 1
+        dead = self._randrange_zero(p.life[cells])
+        self._deaths(p, 'Plant', cells[dead])
+        cells = cells[~dead]
+
+        p.reproduce[cells] -= 1
+        parents = cells[self._randrange_zero(p.reproduce[cells])]
+        p.reproduce[parents] = 100
+        dirs = self._rand.integers(0, 6, parents.size)
+        targets = self._neighbors[dirs, parents]
+        free = (targets >= 0)
+        free[free] = ~p.occupied[targets[free]]
+        parents = parents[free]
+        targets = targets[free]
+        winners = self._claim(targets)
+        parents = parents[winners]
+        targets = targets[winners]
+
+        p.life[parents] -= 100
+        diseased_chance = np.where(p.diseased[parents], 1/5, 1/5000)
+        diseased = self._chance(parents.size) < diseased_chance
+        generation = p.generation[parents] + 1
+        p.add(
+            targets, life=1000, reproduce=100, diseased=diseased,
+            generation=generation)
+        self._births('Plant', targets.size, generation)
+
+    def _update_diseases(self, cells):
+        d = self._diseases
+        cells = cells[d.occupied[cells]]
+        d.life[cells] -= 1
+        self._deaths(d, 'Disease', cells[d.life[cells] <= 0])
+
+    def stats(self):
+        ''' Return the same statistics as EntityStats, without resetting '''
+        values = dict(self._counters)
+        for ent_type, layer in (('Creature', self._creatures),
+                                ('Plant', self._plants)):
+            cells = layer.cells()
+            values[ent_type + 'Count'] = cells.size
+            values[ent_type + 'Diseased'] = int(
+                np.count_nonzero(layer.diseased[cells]))
+        cells = self._creatures.cells()
+        for field, array in (('BirthCost', self._creatures.birth_cost),
+                             ('Resistance', self._creatures.resistance)):
+            if cells.size:
+                values['CreatureMin' + field] = int(array[cells].min())
+                values['CreatureMax' + field] = int(array[cells].max())
+            else:
+                values['CreatureMin' + field] = 0
+                values['CreatureMax' + field] = 0
+        values['DiseaseCount'] = self._diseases.cells().size
+        return {name: values[name] for name in stats.stat_names()}
+
+    def reset_delta_stats(self):
+        for name in stats.delta_stat_names():
+            self._counters[name] = 0
+
+
+class ArraySimulation:
+    ''' Simulation using ArrayWorld instead of World '''
+    def __init__(self, seed=None, size=30, stats_sink=None, stats_interval=10):
+        self._world = ArrayWorld(size, seed)
+        self._reporter = stats.StatsReporter(stats_sink, stats_interval)
+        self._tick = 0
+
+    @property
+    def world(self):
+        return self._world
+
+    @property
+    def tick(self):
+        return self._tick
+
+    def populate(self):
+        ''' Add the same starting plants and creatures as Simulation.populate '''
+        world = self._world
+        radius = min(20, world.size)
+        world.add_plants([
+            world.cell(location.Location(x, y))
+            for x in range(-radius, radius+1)
+            for y in range(-radius, radius+1)])
+        world.add_creatures([
+            world.cell(location.Location(x, y))
+            for x in range(-1, 2)
+            for y in range(-1, 2)])
+
+    def close(self):
+        self._reporter.close()
+
+    def update(self):
+        logging.debug(f'Tick {self._tick}')
+        self._world.update()
+        if self._reporter.due(self._tick):
+            self._reporter.report(self._tick, self._world.stats())
+            self._world.reset_delta_stats()
+        self._tick += 1
@@ -0,0 +1,339 @@
+import argparse
+import contextlib
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from . import entity
+from . import simulation
+from . import sinks
+from . import stats
+from . import timingwheel
+
+
+class NullSink(sinks.Sink):
+    ''' Sink that drops the statistics, so printing isn't benchmarked '''
+    def write(self, records):
+        pass
+
+
+def _fill(world, layer, make, radius):
+    ''' Add an entity made by make to each empty cell within radius '''
+    grid = world.grid
+    layer = world.layer(layer)
+    for y in range(-radius, radius+1):
+        for x in range(-radius, radius+1):
+            cell = grid.cell(x, y)
+            if layer.is_empty(cell):
+                layer.add_entity(make(), cell)
+
+
+def populate_default(world):
+    ''' The layout of the game '''
+    simulation.populate(world)
+
+
+def populate_dense_plants(world):
+    ''' Plants in every cell of the grid, with the usual creatures '''
+    _fill(world, 1, entity.Plant, world.size)
+    _fill(world, 0, entity.Creature, 1)
+
+
+def populate_outbreak(world):
+    ''' The default layout with a diseased plant field and creatures '''
+    _fill(world, 1, lambda: entity.Plant(diseased=True), 8)
+    simulation.populate(world)
+    _fill(world, 0, entity.Creature, 5)
+    for creature in world.layer(0).entities():
+        creature._diseased = True
+        creature.signal_event('diseased')
+    grid = world.grid
+    for y in range(-3, 4):
+        for x in range(-3, 4):
+            world.layer(2).put(grid.cell(x, y), 3)
+
+
+def populate_large_grid(world):
+    ''' Several colonies spread over a large grid '''
+    grid = world.grid
+    spacing = 60
+    for cy in range(-2, 3):
+        for cx in range(-2, 3):
+            for y in range(-10, 11):
+                for x in range(-10, 11):
+                    world.layer(1).add_entity(
+                        entity.Plant(), grid.cell(cx*spacing + x, cy*spacing + y))
+            for y in range(-1, 2):
+                for x in range(-1, 2):
+                    world.layer(0).add_entity(
+                        entity.Creature(), grid.cell(cx*spacing + x, cy*spacing + y))
+
+
+# Scenarios, as name: (grid size, populate function, default ticks)
+SCENARIOS = {
+    'default': (30, populate_default, 500),
+    'dense_plants': (30, populate_dense_plants, 300),
+    'outbreak': (30, populate_outbreak, 300),
+    'large_grid': (150, populate_large_grid, 100),
+}
+
+
+class PhaseTimer:
+    ''' Total time spent in functions, by phase name '''
+    def __init__(self, phases=()):
+        self.totals = dict.fromkeys(phases, 0.0)
+
+    def reset(self):
+        for phase in self.totals:
+            self.totals[phase] = 0.0
+
+    def wrap(self, phase, func):
+        totals = self.totals
+        totals.setdefault(phase, 0.0)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                totals[phase] += time.perf_counter() - start
+        return timed
+
+    @contextlib.contextmanager
+    def patch(self, owner, name, phase, static=False):
+        ''' Time an attribute of a class or object while in the context '''
+        original = owner.__dict__[name] if isinstance(owner, type) else None
+        func = getattr(owner, name)
+        wrapped = self.wrap(phase, func)
+        setattr(owner, name, staticmethod(wrapped) if static else wrapped)
+        try:
+            yield
+        finally:
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+
+
+def make_simulation(name, seed, scheduling='every'):
+    size, populate, _ = SCENARIOS[name]
+    sim = simulation.Simulation(
+        seed, size, stats_sink=NullSink(), scheduling=scheduling)
+    populate(sim.world)
+    entity.Entity.deliver_events()
+    return sim
+
+
+def entity_bytes():
+    ''' Return the size of an entity of each type, including its __dict__ '''
+    sizes = {}
+    for cls in (entity.Creature, entity.Plant):
+        ent = cls()
+        size = sys.getsizeof(ent)
+        if hasattr(ent, '__dict__'):
+            size += sys.getsizeof(ent.__dict__)
+        sizes[cls.__name__] = size
+    return sizes
+
+
+def _gc_collections():
+    return [stats['collections'] for stats in gc.get_stats()]
+
+
+def _entity_count(world):
+    return sum(world.layer(index).count() for index in range(world.num_layers))
+
+
+def run_scenario(name, ticks=None, seed=1, scheduling='every'):
+    ''' Time a scenario, returning a dict of results
+
+    Phase times are inclusive: world_update contains event_dispatch, which
+    contains the stats event handler. stats_report is the time spent
+    collecting the reported statistics. gc_collections is the number of
+    garbage collections of each generation during the ticks.
+    '''
+    if ticks is None:
+        ticks = SCENARIOS[name][2]
+    timer = PhaseTimer(
+        ['world_update', 'event_dispatch', 'stats_events', 'stats_report'])
+    with contextlib.ExitStack() as patches:
+        # The stats listener is bound when the simulation is created
+        patches.enter_context(timer.patch(
+            stats.EntityStats, '_handler_events', 'stats_events'))
+        patches.enter_context(timer.patch(
+            stats.EntityStats, 'collect', 'stats_report'))
+        sim = make_simulation(name, seed, scheduling)
+        try:
+            patches.enter_context(timer.patch(
+                sim.world, 'update', 'world_update'))
+            patches.enter_context(timer.patch(
+                entity.Entity, 'deliver_events', 'event_dispatch', static=True))
+            timer.reset()
+            updates = 0
+            collections = _gc_collections()
+            start = time.perf_counter()
+            for _ in range(ticks):
+                updates += _entity_count(sim.world)
+                sim.update()
+            elapsed = time.perf_counter() - start
+            collections = [
+                after - before
+                for before, after in zip(collections, _gc_collections())]
+            final_count = _entity_count(sim.world)
+        finally:
+            sim.close()
+    return {
+        'ticks': ticks,
+        'seed': seed,
+        'seconds': elapsed,
+        'ticks_per_s': ticks / elapsed,
+        'entity_updates': updates,
+        'entity_updates_per_s': updates / elapsed,
+        'final_entities': final_count,
+        'gc_collections': collections,
+        'phases': timer.totals,
+    }
+
+
+def peak_memory(name, ticks=None, seed=1, scheduling='every'):
+    ''' Run a scenario under tracemalloc, returning the peak traced bytes '''
+    if ticks is None:
+        ticks = SCENARIOS[name][2]
+    tracemalloc.start()
+    try:
+        sim = make_simulation(name, seed, scheduling)
+        try:
+            for _ in range(ticks):
+                sim.update()
+        finally:
+            sim.close()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names=None, ticks=None, seed=1, memory=True, pool=True,
+        scheduling='every'):
+    ''' Run scenarios, returning the results with details of the machine
+
+    Without pool dead entities are not reused, to measure what the pool saves
+    '''
+    pool_size = entity.Entity.pool_size
+    if not pool:
+        entity.Entity.pool_size = 0
+    results = {}
+    try:
+        for name in names or SCENARIOS:
+            entity.Entity.clear_pool()
+            result = run_scenario(name, ticks, seed, scheduling)
+            if memory:
+                # tracemalloc slows everything down, so memory gets its own run
+                entity.Entity.clear_pool()
+                result['peak_memory'] = peak_memory(
+                    name, ticks, seed, scheduling)
+            results[name] = result
+    finally:
+        entity.Entity.pool_size = pool_size
+    return {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pool': pool,
+        'scheduling': scheduling,
+        'entity_bytes': entity_bytes(),
+        'scenarios': results,
+    }
+
+
+def format_results(results, baseline=None):
+    ''' Return a table of results, compared with baseline results if given '''
+    sizes = ', '.join(
+        f'{name} {size}' for name, size in results['entity_bytes'].items())
+    lines = [
+        f'entity bytes: {sizes}',
+        f'{"scenario":<14}{"ticks/s":>10}{"updates/s":>12}{"peak MB":>10}'
+        f'{"gc":>8}{"vs base":>9}'
+    ]
+    base = baseline['scenarios'] if baseline else {}
+    for name, result in results['scenarios'].items():
+        memory = result.get('peak_memory')
+        memory = '' if memory is None else f'{memory / 1e6:.1f}'
+        ratio = ''
+        if name in base:
+            ratio = f'{result["ticks_per_s"] / base[name]["ticks_per_s"]:.2f}x'
+        collections = sum(result['gc_collections'])
+        lines.append(
+            f'{name:<14}{result["ticks_per_s"]:>10.1f}'
+            f'{result["entity_updates_per_s"]:>12.0f}{memory:>10}'
+            f'{collections:>8}{ratio:>9}')
+        phases = ', '.join(
+            f'{phase} {seconds:.3f}s' for phase, seconds in result['phases'].items())
+        lines.append(f'    {phases}')
+    return '\n'.join(lines)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the simulation on standard scenarios')
+    parser.add_argument(
+        'scenarios', nargs='*',
+        help=f'Scenarios to run, default all of: {", ".join(SCENARIOS)}')
+    parser.add_argument(
+        '-t', '--ticks', type=int, default=None,
+        help='Ticks per scenario, default depends on the scenario')
+    parser.add_argument(
+        '-s', '--seed', type=int, default=1,
+        help='Random seed')
+    parser.add_argument(
+        '-o', '--output', metavar='PATH',
+        help='Save the results as JSON')
+    parser.add_argument(
+        '-c', '--compare', metavar='PATH',
+        help='Compare with results saved by an earlier run')
+    parser.add_argument(
+        '--no-memory', dest='memory', action='store_false',
+        help='Skip measuring peak memory')
+    parser.add_argument(
+        '--no-pool', dest='pool', action='store_false',
+        help='Don\'t reuse dead entities')
+    parser.add_argument(
+        '--scheduling', choices=timingwheel.SCHEDULING_MODES, default='every',
+        help='Update every plant every tick, or only wake plants when they '
+             'die or reproduce')
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f'unknown scenario: {name}')
+    return args
+
+
+def benchmark_main():
+    args = parse_args()
+    results = run(
+        args.scenarios, args.ticks, args.seed, args.memory, args.pool,
+        args.scheduling)
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(format_results(results, baseline))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    benchmark_main()
@@ -0,0 +1,159 @@
+CHUNK_BITS = 8
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_MASK = CHUNK_SIZE - 1
+# Occupancy of a chunk that has no values
+EMPTY = bytes(CHUNK_SIZE)
+
+
+class Chunk:
+    __slots__ = ('cells', 'occupied', 'count')
+
+    def __init__(self):
+        self.cells = [None] * CHUNK_SIZE
+        # 1 for each cell with a value, so cells can be tested in bulk
+        self.occupied = bytearray(CHUNK_SIZE)
+        self.count = 0
+
+
+class ChunkedStore:
+    ''' Mapping of cell ids to values, stored in fixed-size chunks
+
+    Each chunk holds a run of consecutive cell ids. Chunks are allocated when
+    their first value is added and freed when their last one is removed, so
+    memory grows with the number of values instead of the number of cells.
+    '''
+    def __init__(self):
+        self._chunks = {}
+        self._count = 0
+
+    def get(self, cell):
+        chunk = self._chunks.get(cell >> CHUNK_BITS)
+        return None if chunk is None else chunk.cells[cell & CHUNK_MASK]
+
+    def setdefault(self, cell, value):
+        ''' Store value in the cell if it is empty, return the value stored there '''
+        key = cell >> CHUNK_BITS
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            chunk = self._chunks[key] = Chunk()
+        offset = cell & CHUNK_MASK
+        current = chunk.cells[offset]
+        if current is not None:
+            return current
+        chunk.cells[offset] = value
+        chunk.occupied[offset] = 1
+        chunk.count += 1
+        self._count += 1
+        return value
+
+    def fill(self, cells, values):
+        ''' Store each value in its cell, which must be empty
+
+        Faster than setdefault for many values, runs of cells in the same
+        chunk share a chunk lookup.
+        '''
+        chunks = self._chunks
+        key = None
+        for cell, value in zip(cells, values):
+            if cell >> CHUNK_BITS != key:
+                key = cell >> CHUNK_BITS
+                chunk = chunks.get(key)
+                if chunk is None:
+                    chunk = chunks[key] = Chunk()
+                chunk_cells = chunk.cells
+                occupied = chunk.occupied
+            offset = cell & CHUNK_MASK
+            if chunk_cells[offset] is not None:
+                raise ValueError(f'Cell {cell} already has a value')
+            chunk_cells[offset] = value
+            occupied[offset] = 1
+            chunk.count += 1
+            self._count += 1
+
+    def pop(self, cell):
+        ''' Remove and return the value in the cell, raising KeyError if empty '''
+        key = cell >> CHUNK_BITS
+        offset = cell & CHUNK_MASK
+        chunk = self._chunks.get(key)
+        value = None if chunk is None else chunk.cells[offset]
+        if value is None:
+            raise KeyError(cell)
+        chunk.cells[offset] = None
+        chunk.occupied[offset] = 0
+        chunk.count -= 1
+        self._count -= 1
+        if chunk.count == 0:
+            del self._chunks[key]
+        return value
+
+    def move(self, cell, new_cell):
+        ''' Move the value in cell to new_cell if it is empty
+
+        Returns True if the value was moved
+        '''
+        chunks = self._chunks
+        new_key = new_cell >> CHUNK_BITS
+        new_chunk = chunks.get(new_key)
+        new_offset = new_cell & CHUNK_MASK
+        if new_chunk is not None and new_chunk.occupied[new_offset]:
+            return False
+        value = self.pop(cell)
+        if new_chunk is None or new_chunk.count == 0:
+            new_chunk = chunks.get(new_key)
+            if new_chunk is None:
+                new_chunk = chunks[new_key] = Chunk()
+        new_chunk.cells[new_offset] = value
+        new_chunk.occupied[new_offset] = 1
+        new_chunk.count += 1
+        self._count += 1
+        return True
+
+    def is_occupied(self, cell):
+        chunk = self._chunks.get(cell >> CHUNK_BITS)
+        return chunk is not None and chunk.occupied[cell & CHUNK_MASK] == 1
+
+    def occupied(self, cells):
+        ''' Return a bytearray with 1 for each of the cells that has a value
+
+        Consecutive cells in the same chunk share a chunk lookup, so runs of
+        nearby cells are cheap. Negative cells are never occupied.
+        '''
+        chunks = self._chunks
+        flags = bytearray(len(cells))
+        key = None
+        occupied = EMPTY
+        for i, cell in enumerate(cells):
+            if cell >> CHUNK_BITS != key:
+                key = cell >> CHUNK_BITS
+                chunk = chunks.get(key)
+                occupied = EMPTY if chunk is None else chunk.occupied
+            flags[i] = occupied[cell & CHUNK_MASK]
+        return flags
+
+    def occupancy(self, size):
+        ''' Return a bytearray with 1 for each of the cells below size with a value
+
+        Copies the occupancy of each chunk, so it costs one slice per chunk
+        instead of a lookup per cell.
+        '''
+        flags = bytearray(size)
+        for key, chunk in self._chunks.items():
+            start = key << CHUNK_BITS
+            if start < size:
+                end = min(start + CHUNK_SIZE, size)
+                flags[start:end] = chunk.occupied[:end - start]
+        return flags
+
+    def values(self):
+        return [
+            value
+            for chunk in self._chunks.values()
+            for value in chunk.cells
+            if value is not None
+        ]
+
+    def chunk_count(self):
+        return len(self._chunks)
+
+    def __len__(self):
+        return self._count
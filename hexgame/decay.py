@@ -0,0 +1,145 @@
+from .chunks import CHUNK_BITS, CHUNK_MASK, CHUNK_SIZE
+
+
+# Translation table of a decay, taking every countdown down by one
+_DECREMENT = bytes([0] + list(range(255)))
+
+
+class _FieldChunk:
+    __slots__ = ('values', 'count')
+
+    def __init__(self):
+        self.values = bytearray(CHUNK_SIZE)
+        self.count = 0
+
+
+class DecayField:
+    ''' A layer of per-cell countdowns, for things too short-lived to be entities
+
+    Each cell holds the number of ticks it has left, or 0 if it is empty.
+    The values are kept in chunks of bytes, allocated like the chunks of a
+    layer, and decay counts all of them down at once with bytes.translate.
+    Cells added or cleared by add and kill are counted as births and
+    deaths, as are cells that decay to zero. While recording, the values
+    set by add and kill are also kept, for an event log to replay.
+    '''
+    image = None
+    order = 0
+
+    def __init__(self, world, index):
+        self._world = world
+        self._index = index
+        self._chunks = {}
+        self._count = 0
+        self._births = 0
+        self._deaths = 0
+        self._changes = None
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def world(self):
+        return self._world
+
+    def get(self, cell):
+        ''' Return the ticks the cell has left, 0 if it is empty '''
+        chunk = self._chunks.get(cell >> CHUNK_BITS)
+        return 0 if chunk is None else chunk.values[cell & CHUNK_MASK]
+
+    def is_empty(self, cell):
+        return cell >= 0 and self.get(cell) == 0
+
+    def put(self, cell, value):
+        ''' Set the value of a cell, without counting a birth or death '''
+        key = cell >> CHUNK_BITS
+        offset = cell & CHUNK_MASK
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            if not value:
+                return
+            chunk = self._chunks[key] = _FieldChunk()
+        old = chunk.values[offset]
+        chunk.values[offset] = value
+        change = (value != 0) - (old != 0)
+        chunk.count += change
+        self._count += change
+        if chunk.count == 0:
+            del self._chunks[key]
+
+    def add(self, cell, life):
+        ''' Start a countdown of life ticks in an empty cell
+
+        Like a new entity, the cell isn't aged by the decay of the tick it
+        was added in, so life + 1 is stored and life must be below 255.
+        Returns True if the cell was empty.
+        '''
+        if not self.is_empty(cell):
+            return False
+        self.put(cell, life + 1)
+        self._births += 1
+        if self._changes is not None:
+            self._changes.append((cell, life + 1))
+        return True
+
+    def kill(self, cell):
+        ''' Clear a cell before its countdown ends '''
+        if self.get(cell):
+            self.put(cell, 0)
+            self._deaths += 1
+            if self._changes is not None:
+                self._changes.append((cell, 0))
+
+    def decay(self):
+        ''' Count every cell down by one tick, clearing those that reach 0 '''
+        chunks = self._chunks
+        for key, chunk in list(chunks.items()):
+            values = chunk.values
+            ending = values.count(1)
+            chunk.values = values.translate(_DECREMENT)
+            if ending:
+                self._deaths += ending
+                self._count -= ending
+                chunk.count -= ending
+                if chunk.count == 0:
+                    del chunks[key]
+
+    def cells(self):
+        ''' Return the (cell, value) pairs of the cells that aren't empty '''
+        return [
+            ((key << CHUNK_BITS) + offset, value)
+            for key, chunk in self._chunks.items()
+            for offset, value in enumerate(chunk.values)
+            if value
+        ]
+
+    def values(self):
+        ''' Return a bytearray of the values of every cell of a bounded grid '''
+        size = self._world.grid.num_cells()
+        values = bytearray(size)
+        for key, chunk in self._chunks.items():
+            start = key << CHUNK_BITS
+            if start < size:
+                end = min(start + CHUNK_SIZE, size)
+                values[start:end] = chunk.values[:end - start]
+        return values
+
+    def count(self):
+        return self._count
+
+    def record_changes(self, enabled=True):
+        ''' Start or stop keeping the values set by add and kill '''
+        self._changes = [] if enabled else None
+
+    def take_changes(self):
+        ''' Return the (cell, value) pairs set since the last call, in order '''
+        changes = self._changes
+        self._changes = []
+        return changes
+
+    def take_counts(self):
+        ''' Return the (births, deaths) since the last call '''
+        counts = (self._births, self._deaths)
+        self._births = self._deaths = 0
+        return counts
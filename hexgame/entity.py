@@ -1,15 +1,48 @@
 import collections
-import pyglet
 
+from . import decay
 from . import location
-from . import util
+from . import parameters
+from . import rng
+from .timingwheel import countdown_ticks
 
 
 class Entity:
+    __slots__ = ('_id', '_stream', '_cell', '_layer')
     _event_listeners = collections.defaultdict(lambda: collections.defaultdict(list))
+    # Pending events of batched listeners, {listener: [(entity, event, value)]}
+    _event_batches = {}
+    # Compiled listeners, {(entity class, event): (listeners, batches)}
+    _dispatch = {}
+    # Entities that died this tick, and dead entities free to be reused,
+    # {entity class: [entities]}, at most pool_size of each class
+    _dead = []
+    _free = {}
+    pool_size = 10000
+    image = None
+    order = 0
 
     @staticmethod
-    def add_event_listener(listener, entity_types=None, event_types=None):
+    def remove_event_listener(listener):
+        ''' Remove a listener from all the events it was added for
+
+        Events not yet delivered to a batched listener are dropped.
+        '''
+        for event_listeners in Entity._event_listeners.values():
+            for listeners in event_listeners.values():
+                while listener in listeners:
+                    listeners.remove(listener)
+        Entity._event_batches.pop(listener, None)
+        Entity._dispatch.clear()
+
+    @staticmethod
+    def add_event_listener(listener, entity_types=None, event_types=None,
+                           batched=False):
+        ''' Call listener(entity, event, value) when entities signal events
+
+        With batched the events are queued instead, and delivered by
+        deliver_events as one list of (entity, event, value) tuples.
+        '''
         if entity_types is None:
             entity_keys = [None]
         else:
@@ -21,17 +54,115 @@ class Entity:
         for ent_key in entity_keys:
             for event_key in event_keys:
                 Entity._event_listeners[ent_key][event_key].append(listener)
+        if batched:
+            Entity._event_batches.setdefault(listener, [])
+        Entity._dispatch.clear()
+
+    @staticmethod
+    def deliver_events():
+        ''' Call the batched listeners with the events queued for them
+
+        The world calls this at the end of every tick. Entities are passed
+        as they are at delivery, not as they were when the event happened.
+        '''
+        for listener, batch in list(Entity._event_batches.items()):
+            if batch:
+                events = batch.copy()
+                batch.clear()
+                listener(events)
+        Entity._recycle_dead()
+
+    @staticmethod
+    def _recycle_dead():
+        ''' Move the entities that died to the free lists
+
+        Called once the listeners have seen their death events, and the
+        tick is over, so nothing uses them anymore.
+        '''
+        dead = Entity._dead
+        if not dead:
+            return
+        Entity._dead = []
+        free_lists = Entity._free
+        for ent in dead:
+            free = free_lists.get(type(ent))
+            if free is None:
+                free = free_lists[type(ent)] = []
+            if len(free) < Entity.pool_size:
+                free.append(ent)
+
+    @staticmethod
+    def clear_pool():
+        ''' Drop the dead entities kept for reuse '''
+        Entity._dead = []
+        Entity._free = {}
+
+    @staticmethod
+    def _compile_listeners(cls, event):
+        ''' Build the dispatch entry of an entity class and event '''
+        get = Entity._event_listeners.get
+        ent_type = cls.__name__
+        listeners = []
+        batches = []
+        for ent_key, event_key in ((None, None), (None, event),
+                                   (ent_type, None), (ent_type, event)):
+            for listener in get(ent_key, {}).get(event_key, []):
+                batch = Entity._event_batches.get(listener)
+                if batch is None:
+                    listeners.append(listener)
+                elif not any(queued is batch for queued in batches):
+                    batches.append(batch)
+        entry = Entity._dispatch[cls, event] = (tuple(listeners), tuple(batches))
+        return entry
+
+    def __new__(cls, *args, **kwargs):
+        # Reuse a dead entity if there is one, __init__ sets all its slots
+        free = Entity._free.get(cls)
+        if free:
+            return free.pop()
+        return super().__new__(cls)
 
     def __init__(self):
         super().__init__()
-        self._loc = None
-        self._layer = None
-        self._sprite = None
+        self._id = None
+        self._cell = None
+        self.init_unsaved()
         self.signal_event('birth')
 
+    def init_unsaved(self):
+        ''' Set the attributes that snapshots don't save '''
+        self._stream = None
+        self._layer = None
+
+    @classmethod
+    def slot_names(cls):
+        ''' Names of the attributes of the class's entities '''
+        return [
+            name for base in cls.__mro__ for name in vars(base).get('__slots__', ())]
+
+    def __getstate__(self):
+        # The layer belongs to the process the entity is in
+        state = {name: getattr(self, name) for name in self.slot_names()}
+        state['_layer'] = None
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def cell(self):
+        return self._cell
+
     @property
     def loc(self):
-        return self._loc
+        if self._layer is None:
+            return None
+        return self._layer.world.grid.location(self._cell)
 
     @property
     def layer(self):
@@ -42,54 +173,71 @@ class Entity:
         return None if self._layer is None else self._layer.world
 
     def signal_event(self, event, value=None):
-        ent_type = type(self).__name__
-        listeners_list = [
-            Entity._event_listeners.get(None, {}).get(None, []),
-            Entity._event_listeners.get(None, {}).get(event, []),
-            Entity._event_listeners.get(ent_type, {}).get(None, []),
-            Entity._event_listeners.get(ent_type, {}).get(event, [])
-        ]
-        for listeners in listeners_list:
-            for listener in listeners:
-                listener(self, event, value)
-
-    def _update_position(self):
-        if self._sprite is not None:
-            if self._loc is None:
-                self._sprite.visible = False
-            else:
-                pos = self._loc.real_pos()
-                self._sprite.update(x=pos[0], y=pos[1])
-                self._sprite.visible = True
+        entry = Entity._dispatch.get((type(self), event))
+        if entry is None:
+            entry = Entity._compile_listeners(type(self), event)
+        listeners, batches = entry
+        for listener in listeners:
+            listener(self, event, value)
+        for batch in batches:
+            batch.append((self, event, value))
+
+    def image_name(self):
+        ''' Name of the image the entity is drawn with '''
+        return self.image
 
     def die(self):
+        ''' Remove the entity from its layer
+
+        Once the tick's events are delivered the entity may be reused for
+        a new one, so it must not be kept.
+        '''
         if self._layer is not None:
             self._layer.remove_entity(self)
-            self._sprite.delete()
             self.signal_event('death')
+            if Entity.pool_size:
+                Entity._dead.append(self)
 
-    def try_move(self, loc):
+    def try_move(self, cell):
         assert self._layer is not None, 'Can\'t move an entity not in a layer!'
-        return self._layer.move_entity(self, loc)
+        return self._layer.move_entity(self, cell)
+
+    def update(self, game, draws=None):
+        ''' Run the entity's rules for a tick
 
-    def update(self, game):
+        draws, if given, is an iterator over a block of random numbers in
+        [0, 1) that the rolls made every update are taken from, at most
+        UPDATE_DRAWS of them, instead of the entity's generator.
+        '''
         pass
 
 
 class AliveMixin:
+    # Slots of the mixins are in the entity classes, to avoid layout conflicts
+    __slots__ = ()
+
     def __init__(self, *args, max_life=None, **kwargs):
         self._life = max_life
         super().__init__(*args, **kwargs)
 
-    def age(self, game):
+    def age(self, game, draws=None):
         self._life -= 1
-        if self._life <= 0 or game.rand.randrange(self._life) == 0:
+        if self._life <= 0:
+            dies = True
+        elif draws is None:
+            dies = game.random_for(self).randrange(self._life) == 0
+        else:
+            # The chance of randrange(life) == 0
+            dies = next(draws) * self._life < 1
+        if dies:
             self.die()
             return True
         return False
 
 
 class ReproducibleMixin:
+    __slots__ = ()
+
     def __init__(self, *args, max_reproduce, generation, **kwargs):
         self._reproduce = max_reproduce
         self._max_reproduce = max_reproduce
@@ -103,33 +251,55 @@ class ReproducibleMixin:
     def make_child(self, game):
         raise RuntimeError('Not implemented!')
 
-    def try_reproduce(self, game):
+    def try_reproduce(self, game, draws=None):
         self._reproduce -= 1
-        if self._reproduce <= 0 or game.rand.randrange(self._reproduce) == 0:
-            dir = game.rand.choice(location.Direction.dirs())
-            loc = self.loc.in_direction(dir)
-            if self._layer.is_empty(loc):
-                child = self.make_child(game)
-                self._layer.add_entity(child, loc)
-            self._reproduce = self._max_reproduce
+        if self._reproduce <= 0:
+            reproduces = True
+        elif draws is None:
+            reproduces = game.random_for(self).randrange(self._reproduce) == 0
+        else:
+            reproduces = next(draws) * self._reproduce < 1
+        if reproduces:
+            self.reproduce(game)
 
+    def reproduce(self, game):
+        ''' Put a child in a random neighboring cell, if it is empty '''
+        dir = game.random_for(self).choice(location.Direction.dirs())
+        cell = self._layer.world.grid.neighbor(self._cell, dir.idx)
+        if cell in self._layer.free_neighbors([self._cell])[0]:
+            child = self.make_child(game)
+            self._layer.add_entity(child, cell)
+        self._reproduce = self._max_reproduce
 
-class Creature(AliveMixin, ReproducibleMixin, Entity):
-    image = pyglet.image.load('data/creature.png')
-    image_diseased = pyglet.image.load('data/creature_diseased.png')
 
-    def __init__(self, disease_resistance=50, generation=1,
-                 satiation=1000, birth_cost=200):
-        super().__init__(generation=generation, max_life=1000, max_reproduce=500)
+class Creature(AliveMixin, ReproducibleMixin, Entity):
+    __slots__ = (
+        '_life', '_reproduce', '_max_reproduce', '_generation', '_dir',
+        '_satiation', '_birth_cost', '_health', '_diseased',
+        '_disease_resistance', '_disease_progression', '_cured')
+    image = 'creature.png'
+    image_diseased = 'creature_diseased.png'
+    order = 2
+
+    def __init__(self, disease_resistance=None, generation=1,
+                 satiation=None, birth_cost=None, params=parameters.DEFAULT):
+        ''' Values that aren't given come from params '''
+        if disease_resistance is None:
+            disease_resistance = params.creature_disease_resistance
+        # Set before Entity.__init__ so the birth event sees them
         self._dir = location.Direction.E
-        self._sprite = util.draw.make_sprite(Creature.image, order=2)
-        self._satiation = satiation
-        self._birth_cost = birth_cost
-        self._health = 100
+        self._satiation = (
+            params.creature_satiation if satiation is None else satiation)
+        self._birth_cost = (
+            params.creature_birth_cost if birth_cost is None else birth_cost)
+        self._health = params.creature_max_health
         self._diseased = False
         self._disease_resistance = disease_resistance
         self._disease_progression = 0
         self._cured = False
+        super().__init__(
+            generation=generation, max_life=params.creature_max_life,
+            max_reproduce=params.creature_max_reproduce)
 
     @property
     def diseased(self):
@@ -143,125 +313,219 @@ class Creature(AliveMixin, ReproducibleMixin, Entity):
     def disease_resistance(self):
         return self._disease_resistance
 
+    def image_name(self):
+        return Creature.image_diseased if self._diseased else Creature.image
+
     def make_child(self, game):
+        rand = game.random_for(self)
         self._satiation -= self._birth_cost
-        child_birth_cost = max(0, self._birth_cost + game.rand.randint(-2, 2))
+        child_birth_cost = max(0, self._birth_cost + rand.randint(-2, 2))
         child_disease_resistance = max(
-            0, min(self._disease_resistance + game.rand.randint(-1, 1), 100))
+            0, min(self._disease_resistance + rand.randint(-1, 1), 100))
         creature = Creature(
             disease_resistance=child_disease_resistance,
             generation=self.generation + 1,
-            satiation=self._satiation, birth_cost=child_birth_cost)
+            satiation=self._satiation, birth_cost=child_birth_cost,
+            params=game.params)
+        creature._id = game.new_id(self, rng.CHILD_ID)
         if self._diseased:
-            creature._maybe_get_disease(game, 1/2)
+            creature._maybe_get_disease(
+                game, game.params.creature_diseased_child_chance)
         return creature
 
-    def update(self, game):
+    def update(self, game, draws=None):
         if self._diseased:
             self._disease_progression += 1
             self._life -= self._disease_progression//100
             self._satiation -= self._disease_progression//100
             self._maybe_get_cured(game)
 
-        if self.age(game):
+        if self.age(game, draws):
             return
 
+        params = game.params
+        rand = game.random_for(self)
         self._satiation -= 1
-        if self._satiation <= 0 or game.rand.randrange(self._satiation) == 0:
-            self._health -= 10
+        if self._satiation <= 0:
+            starves = True
+        elif draws is None:
+            starves = rand.randrange(self._satiation) == 0
+        else:
+            starves = next(draws) * self._satiation < 1
+        if starves:
+            self._health -= params.creature_starve_damage
 
         if self._health <= 0:
             self.die()
             return
 
-        plant = self.world.layer(1).get_entity(self.loc)
-        if self._health < 100 and plant is not None:
-            self._health = min(100, self._health + plant.nourishment//10)
-            self._satiation = min(1000, self._satiation + plant.nourishment)
+        plant = self.world.layer(1).get_entity(self._cell)
+        max_health = params.creature_max_health
+        if self._health < max_health and plant is not None:
+            plant.sync(game)
+            self._health = min(max_health, self._health + plant.nourishment//10)
+            self._satiation = min(
+                params.creature_satiation, self._satiation + plant.nourishment)
             if plant.diseased:
-                self._maybe_get_disease(game, 1/5)
+                self._maybe_get_disease(game, params.creature_eat_disease_chance)
             plant.die()
 
-        self.try_reproduce(game)
+        self.try_reproduce(game, draws)
 
-        if game.rand.randrange(2):
-            new_loc = self.loc.in_direction(self._dir)
-            new_dir = self._dir.turn(game.rand.randint(-2, 2)//2)
+        if draws is None:
+            moves = rand.randrange(2)
+        else:
+            moves = next(draws) < 0.5
+        if moves:
+            new_cell = self.world.grid.neighbor(self._cell, self._dir.idx)
+            if draws is None:
+                turn = rand.randint(-2, 2)
+            else:
+                turn = int(next(draws) * 5) - 2
+            new_dir = self._dir.turn(turn//2)
             self._dir = new_dir
-            old_loc = self._loc
-            if self.try_move(new_loc):
-                layer = game.world.layer(2)
+            old_cell = self._cell
+            if self.try_move(new_cell):
+                diseases = game.world.layer(2)
                 if self._diseased:
-                    layer.add_entity(Disease(), old_loc)
-                else:
-                    disease = layer.get_entity(new_loc)
-                    if disease is not None and isinstance(disease, Disease):
-                        if self._maybe_get_disease(game, 2/3):
-                            disease.die()
+                    diseases.add(old_cell, params.disease_life)
+                elif diseases.get(new_cell):
+                    if self._maybe_get_disease(
+                            game, params.creature_touch_disease_chance):
+                        diseases.kill(new_cell)
 
     def _maybe_get_disease(self, game, chance):
         if self._cured:
             return False
         adjusted_chance = chance * (101 - self._disease_resistance)/100
-        if not self._diseased and game.rand.random() < adjusted_chance:
+        if not self._diseased and game.random_for(self).random() < adjusted_chance:
             self._diseased = True
             self.signal_event('diseased')
-            self._sprite.image = Creature.image_diseased
             return True
         return False
 
     def _maybe_get_cured(self, game):
-        chance = 1/100 * (self._disease_resistance/100)
-        if game.rand.random() < chance:
+        chance = game.params.creature_cure_chance * (self._disease_resistance/100)
+        if game.random_for(self).random() < chance:
             self._diseased = False
             self.signal_event('disease_cured')
-            self._sprite.image = Creature.image
             self._cured = True
             return True
         return False
 
 
 class Plant(AliveMixin, ReproducibleMixin, Entity):
-    image = pyglet.image.load('data/plant.png')
-    image_diseased = pyglet.image.load('data/plant_diseased.png')
-
-    def __init__(self, diseased=False, generation=1):
-        super().__init__(generation=generation, max_life=1000, max_reproduce=100)
-        image = Plant.image_diseased if diseased else Plant.image
-        self._sprite = util.draw.make_sprite(image, order=1)
+    ''' A plant, updated every tick or woken by the world's timing wheel
+
+    When woken, _life and _reproduce are the values at the end of tick
+    _synced, and _death_at and _reproduce_at are the ticks of the next
+    death and reproduction, drawn with the same chances as update's.
+    '''
+    __slots__ = (
+        '_life', '_reproduce', '_max_reproduce', '_generation', '_diseased',
+        '_synced', '_death_at', '_reproduce_at')
+    image = 'plant.png'
+    image_diseased = 'plant_diseased.png'
+    order = 1
+
+    def __init__(self, diseased=False, generation=1, params=parameters.DEFAULT):
+        super().__init__(
+            generation=generation, max_life=params.plant_max_life,
+            max_reproduce=params.plant_max_reproduce)
         self._diseased = diseased
         if self._diseased:
             self.signal_event('diseased')
 
+    def init_unsaved(self):
+        super().init_unsaved()
+        self._synced = None
+        self._death_at = None
+        self._reproduce_at = None
+
     @property
     def diseased(self):
         return self._diseased
 
+    def image_name(self):
+        return Plant.image_diseased if self._diseased else Plant.image
+
     @property
     def nourishment(self):
         return max(10, min((1000 - self._life)//5, 100))
 
     def make_child(self, game):
-        self._life -= 100
-        diseased_chance = 1/5 if self._diseased else 1/5000
-        child_diseased = game.rand.random() < diseased_chance
-        return Plant(diseased=child_diseased, generation=self.generation + 1)
-
-    def update(self, game):
-        if self.age(game):
+        params = game.params
+        self._life -= params.plant_reproduce_cost
+        if self._diseased:
+            diseased_chance = params.plant_diseased_child_chance
+        else:
+            diseased_chance = params.plant_disease_chance
+        child_diseased = game.random_for(self).random() < diseased_chance
+        plant = Plant(
+            diseased=child_diseased, generation=self.generation + 1,
+            params=params)
+        plant._id = game.new_id(self, rng.CHILD_ID)
+        return plant
+
+    def update(self, game, draws=None):
+        if self.age(game, draws):
             return
-        self.try_reproduce(game)
+        self.try_reproduce(game, draws)
 
+    def _advance(self, tick):
+        elapsed = tick - self._synced
+        self._life -= elapsed
+        self._reproduce -= elapsed
+        self._synced = tick
 
-class Disease(Entity):
-    image = pyglet.image.load('data/disease.png')
+    def sync(self, game):
+        ''' Bring the counters of a woken plant up to the last tick
 
-    def __init__(self):
-        super().__init__()
-        self._life = 3
-        self._sprite = util.draw.make_sprite(Disease.image, order=3)
+        Does nothing for plants updated every tick
+        '''
+        if self._synced is not None and self._synced < game.tick - 1:
+            self._advance(game.tick - 1)
 
-    def update(self, game):
-        self._life -= 1
-        if self._life == 0:
+    @property
+    def wake_tick(self):
+        ''' The tick the plant is next woken at, None if it isn't scheduled '''
+        if self._death_at is None:
+            return None
+        return min(self._death_at, self._reproduce_at)
+
+    def schedule(self, game):
+        ''' Draw the next death and reproduction of a plant added last tick '''
+        rand = game.random_for(self)
+        self._synced = game.tick - 1
+        self._death_at = self._synced + countdown_ticks(rand, self._life)
+        self._reproduce_at = self._synced + countdown_ticks(
+            rand, self._reproduce)
+        self._layer.world.wake_at(self, self.wake_tick)
+
+    def wake(self, game):
+        ''' Die or reproduce at a tick drawn by schedule or the last wake '''
+        tick = game.tick
+        self._advance(tick)
+        if tick == self._death_at:
             self.die()
+            return
+        life = self._life
+        self.reproduce(game)
+        rand = game.random_for(self)
+        self._reproduce_at = tick + countdown_ticks(rand, self._reproduce)
+        if self._life != life:
+            self._death_at = tick + countdown_ticks(rand, self._life)
+        self._layer.world.wake_at(self, self.wake_tick)
+
+
+class DiseaseField(decay.DecayField):
+    ''' The disease diseased creatures leave behind, for disease_life ticks '''
+    image = 'disease.png'
+    order = 3
+
+
+# The most random numbers an update takes from a block, see Entity.update
+UPDATE_DRAWS = 5
+
+# Layers of the world that are fields instead of entities
+FIELDS = {2: DiseaseField}
@@ -0,0 +1,324 @@
+import bisect
+import json
+import os
+import struct
+
+from . import entity
+from . import sinks
+from . import snapshot
+from . import world
+
+
+VERSION = 1
+META_FILE = 'log.json'
+EVENTS_FILE = 'events.bin'
+KEYFRAMES_FILE = 'keyframes.bin'
+
+# A tick's block in the events file is a header and its records. The
+# meaning of a record's key and value depends on its kind:
+#   BIRTH: entity id, cell, with the layer and entity type code
+#   DEATH, DISEASED, CURED: entity id
+#   MOVE: entity id, new cell
+#   FIELD: cell, value set by DecayField.add or kill, with the layer
+_BLOCK = struct.Struct('<QI')
+_RECORD = struct.Struct('<BBBQQ')
+# An entry of the keyframes file, a tick and the offset of its block
+_KEYFRAME = struct.Struct('<QQ')
+
+BIRTH, DEATH, MOVE, DISEASED, CURED, FIELD = range(6)
+EVENT_KINDS = {
+    'birth': BIRTH,
+    'death': DEATH,
+    'move': MOVE,
+    'diseased': DISEASED,
+    'disease_cured': CURED,
+}
+TYPES = list(snapshot.ENTITY_TYPES.values())
+_TYPE_CODES = {cls: code for code, cls in enumerate(TYPES)}
+
+# What the writer thread writes to, the events or the keyframes file
+_EVENTS, _KEYFRAMES = range(2)
+
+
+def keyframe_path(path, tick):
+    return os.path.join(path, f'keyframe-{tick}.snap')
+
+
+class _LogSink(sinks.Sink):
+    ''' Appends the queued blocks and keyframe entries to their files '''
+    def __init__(self, path):
+        self._path = path
+        self._files = []
+
+    def open(self, names):
+        self._files = [
+            open(os.path.join(self._path, name), 'wb')
+            for name in (EVENTS_FILE, KEYFRAMES_FILE)
+        ]
+
+    def write(self, records):
+        for target, data in records:
+            self._files[target].write(data)
+        for f in self._files:
+            f.flush()
+
+    def close(self):
+        for f in self._files:
+            f.close()
+
+
+class EventRecorder:
+    ''' Records the events of a simulation to a directory, to be replayed
+
+    Every tick the births, deaths, moves and disease changes of entities,
+    and the values set in fields, are packed into a block that a
+    background thread appends to the events file. Every keyframe_interval
+    ticks, and when recording starts, the simulation is saved as a keyframe
+    snapshot, which Simulation.load can also start from.
+
+    Events are taken from the batched listeners at the end of the tick, so
+    a birth is recorded at the cell the entity is in then. Entities that
+    die in the tick they are born in are left out.
+    '''
+    def __init__(self, path, sim, keyframe_interval=1000):
+        if keyframe_interval < 1:
+            raise ValueError('The keyframe interval must be at least 1')
+        os.makedirs(path, exist_ok=True)
+        self._path = path
+        self._sim = sim
+        self._interval = keyframe_interval
+        self._records = []
+        self._offset = 0
+        with open(os.path.join(path, META_FILE), 'w') as f:
+            json.dump({
+                'version': VERSION,
+                'size': sim.world.size,
+                'num_layers': sim.world.num_layers,
+                'types': [cls.__name__ for cls in TYPES],
+                'keyframe_interval': keyframe_interval,
+            }, f)
+        self._writer = sinks.StatsWriter(_LogSink(path), [], what='events')
+        self._fields = sim.world.fields()
+        for field in self._fields:
+            field.record_changes()
+        entity.Entity.add_event_listener(
+            self._handler_events, None, list(EVENT_KINDS), batched=True)
+        self._keyframe()
+
+    def _handler_events(self, events):
+        pack = _RECORD.pack
+        records = self._records
+        # Entities that died before the events were delivered
+        skipped = set()
+        for ent, event, value in events:
+            if ent in skipped:
+                continue
+            kind = EVENT_KINDS[event]
+            if kind == BIRTH:
+                layer = ent._layer
+                if layer is None:
+                    skipped.add(ent)
+                    continue
+                records.append(pack(
+                    BIRTH, layer.index, _TYPE_CODES[type(ent)], ent._id,
+                    ent._cell))
+            elif kind == MOVE:
+                records.append(pack(MOVE, 0, 0, ent._id, value))
+            else:
+                records.append(pack(kind, 0, 0, ent._id, 0))
+
+    def _keyframe(self):
+        tick = self._sim.tick
+        self._sim.save(keyframe_path(self._path, tick))
+        self._writer.write((_KEYFRAMES, _KEYFRAME.pack(tick, self._offset)))
+
+    def end_tick(self):
+        ''' Queue the block of the tick that just ended
+
+        Called by the simulation after its tick has been advanced
+        '''
+        records = self._records
+        for field in self._fields:
+            index = field.index
+            records.extend(
+                _RECORD.pack(FIELD, index, 0, cell, value)
+                for cell, value in field.take_changes())
+        block = _BLOCK.pack(self._sim.tick - 1, len(records)) + b''.join(records)
+        self._records = []
+        self._writer.write((_EVENTS, block))
+        self._offset += len(block)
+        if self._sim.tick % self._interval == 0:
+            self._keyframe()
+
+    def close(self):
+        ''' Stop recording and wait until everything has been written '''
+        entity.Entity.remove_event_listener(self._handler_events)
+        for field in self._fields:
+            field.record_changes(False)
+        self._writer.close()
+
+
+class EventLog:
+    ''' The files of a directory written by EventRecorder '''
+    def __init__(self, path):
+        self._path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            self._meta = json.load(f)
+        if self._meta['version'] != VERSION:
+            raise ValueError(f'Unknown event log version: {self._meta["version"]}')
+        self._types = [snapshot.ENTITY_TYPES[name] for name in self._meta['types']]
+        self._events = open(os.path.join(path, EVENTS_FILE), 'rb')
+        self._keyframes = []
+        self.reload()
+
+    @property
+    def meta(self):
+        return self._meta
+
+    @property
+    def types(self):
+        ''' The entity classes, by the type codes of birth records '''
+        return self._types
+
+    @property
+    def keyframes(self):
+        ''' The (tick, block offset) of each keyframe, in order '''
+        return self._keyframes
+
+    def reload(self):
+        ''' Read the keyframes again, for a log that is still being written '''
+        with open(os.path.join(self._path, KEYFRAMES_FILE), 'rb') as f:
+            data = f.read()
+        end = len(data) - len(data) % _KEYFRAME.size
+        self._keyframes = list(_KEYFRAME.iter_unpack(data[:end]))
+
+    def keyframe(self, tick):
+        ''' Return the (tick, block offset) of the last keyframe up to tick '''
+        index = bisect.bisect_right(self._keyframes, (tick, float('inf')))
+        if index == 0:
+            raise ValueError(f'Tick {tick} is before the first keyframe')
+        return self._keyframes[index - 1]
+
+    def load_keyframe(self, tick):
+        return snapshot.load(keyframe_path(self._path, tick))
+
+    def read_block(self, offset):
+        ''' Return the (tick, records, next offset) of the block at offset
+
+        Returns None at the end of the log, or if the block hasn't been
+        completely written yet.
+        '''
+        self._events.seek(offset)
+        header = self._events.read(_BLOCK.size)
+        if len(header) < _BLOCK.size:
+            return None
+        tick, count = _BLOCK.unpack(header)
+        size = count * _RECORD.size
+        data = self._events.read(size)
+        if len(data) < size:
+            return None
+        return tick, _RECORD.iter_unpack(data), offset + _BLOCK.size + size
+
+    def end_tick(self):
+        ''' The tick after the last one in the log '''
+        tick, offset = self._keyframes[-1]
+        while True:
+            block = self.read_block(offset)
+            if block is None:
+                return tick
+            tick, _, offset = block
+            tick += 1
+
+    def close(self):
+        self._events.close()
+
+
+class Replay:
+    ''' The world of a recorded run at any tick, rebuilt from an EventLog
+
+    Seeking loads the nearest keyframe before the tick and applies the
+    records of the ticks after it, without running the rules. The
+    entities only have what is needed to draw them.
+    '''
+    def __init__(self, path):
+        self._log = EventLog(path)
+        self._world = None
+        self._tick = None
+        self._offset = None
+        self._entities = {}
+        if not self._log.keyframes:
+            raise ValueError(f'{path} has no keyframes')
+        self.seek(self._log.keyframes[0][0])
+
+    @property
+    def log(self):
+        return self._log
+
+    @property
+    def world(self):
+        return self._world
+
+    @property
+    def tick(self):
+        ''' The tick the world is at the start of '''
+        return self._tick
+
+    def _load_keyframe(self, tick, offset):
+        snap = self._log.load_keyframe(tick)
+        self._world = world.World(
+            self._log.meta['num_layers'], snap.size, entity.FIELDS)
+        self._entities = {ent.id: ent for ent in snap.restore(self._world)}
+        self._tick = tick
+        self._offset = offset
+
+    def _apply(self, records):
+        layer = self._world.layer
+        ents = self._entities
+        types = self._log.types
+        for kind, layer_index, type_code, key, value in records:
+            if kind == BIRTH:
+                cls = types[type_code]
+                ent = cls.__new__(cls)
+                ent._id = key
+                ent._diseased = False
+                ent.init_unsaved()
+                layer(layer_index).add_entity(ent, value)
+                ents[key] = ent
+            elif kind == FIELD:
+                layer(layer_index).put(key, value)
+            elif kind == DEATH:
+                ent = ents.pop(key)
+                ent.layer.remove_entity(ent)
+            elif kind == MOVE:
+                ent = ents[key]
+                if ent.cell != value:
+                    ent.layer.move_entity(ent, value)
+            else:
+                ents[key]._diseased = kind == DISEASED
+        for field in self._world.fields():
+            field.decay()
+
+    def seek(self, tick):
+        ''' Go to the start of a tick, or the end of the log if it is before
+
+        Returns the tick the replay is at
+        '''
+        key_tick, offset = self._log.keyframe(tick)
+        if self._tick is None or tick < self._tick or key_tick > self._tick:
+            self._load_keyframe(key_tick, offset)
+        while self._tick < tick:
+            block = self._log.read_block(self._offset)
+            if block is None:
+                break
+            _, records, self._offset = block
+            self._apply(records)
+            self._tick += 1
+        return self._tick
+
+    def step(self):
+        ''' Go forward a tick, returns False at the end of the log '''
+        tick = self._tick
+        return self.seek(tick + 1) > tick
+
+    def close(self):
+        self._log.close()
@@ -0,0 +1,230 @@
+import array
+import json
+import operator
+import os
+import sys
+
+from . import decay
+from . import sinks
+from . import snapshot
+from .entity import Creature
+
+
+VERSION = 1
+META_FILE = 'export.json'
+# Columns of the creatures table, as (name, attribute, array typecode)
+CREATURE_COLUMNS = [('tick', None, 'q')] + snapshot.COLUMNS['Creature']
+
+_NPY_MAGIC = b'\x93NUMPY\x01\x00'
+# Room for the header, which is rewritten as rows are added
+_NPY_HEADER_SIZE = 128
+_BYTEORDER = '<' if sys.byteorder == 'little' else '>'
+
+
+def npy_descr(typecode):
+    ''' The .npy type of the items of an array.array typecode '''
+    itemsize = array.array(typecode).itemsize
+    kind = 'u' if typecode.isupper() else 'i'
+    order = '|' if itemsize == 1 else _BYTEORDER
+    return f'{order}{kind}{itemsize}'
+
+
+class NpyWriter:
+    ''' A .npy file that rows are appended to
+
+    The header is written with room to spare, and rewritten with the new
+    number of rows by flush, so the file can be loaded or memory-mapped by
+    numpy.load between flushes without numpy being needed to write it.
+    '''
+    def __init__(self, path, descr, row_shape=()):
+        self._file = open(path, 'wb')
+        self._descr = descr
+        self._row_shape = tuple(row_shape)
+        self._rows = 0
+        self.flush()
+
+    @property
+    def rows(self):
+        return self._rows
+
+    def append(self, data, rows=1):
+        ''' Add rows, given as the bytes of their items '''
+        self._file.write(data)
+        self._rows += rows
+
+    def flush(self):
+        header = repr({
+            'descr': self._descr,
+            'fortran_order': False,
+            'shape': (self._rows,) + self._row_shape,
+        }).encode('latin1')
+        padding = _NPY_HEADER_SIZE - len(_NPY_MAGIC) - 2 - len(header) - 1
+        if padding < 0:
+            raise ValueError(f'The header of {self._file.name} is too long')
+        self._file.seek(0)
+        self._file.write(_NPY_MAGIC)
+        self._file.write((_NPY_HEADER_SIZE - len(_NPY_MAGIC) - 2).to_bytes(
+            2, 'little'))
+        self._file.write(header + b' ' * padding + b'\n')
+        self._file.seek(0, os.SEEK_END)
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+def chunk_path(path, index):
+    return os.path.join(path, f'chunk-{index:06d}')
+
+
+class _ExportSink(sinks.Sink):
+    ''' Appends the queued dumps to the .npy files of the current chunk '''
+    def __init__(self, path, width, layer_names, chunk_dumps):
+        self._path = path
+        self._width = width
+        self._layer_names = layer_names
+        self._chunk_dumps = chunk_dumps
+        self._chunks = 0
+        self._dumps = 0
+        self._ticks = None
+        self._layers = []
+        self._columns = []
+
+    def _writers(self):
+        if self._ticks is None:
+            return []
+        return [self._ticks] + self._layers + self._columns
+
+    def _start_chunk(self):
+        for writer in self._writers():
+            writer.close()
+        path = chunk_path(self._path, self._chunks)
+        os.makedirs(path, exist_ok=True)
+        self._chunks += 1
+        self._dumps = 0
+        self._ticks = NpyWriter(os.path.join(path, 'ticks.npy'), npy_descr('q'))
+        self._layers = [
+            NpyWriter(
+                os.path.join(path, name + '.npy'), npy_descr('B'),
+                (self._width, self._width))
+            for name in self._layer_names
+        ]
+        self._columns = [
+            NpyWriter(
+                os.path.join(path, f'creature_{name}.npy'), npy_descr(typecode))
+            for name, _, typecode in CREATURE_COLUMNS
+        ]
+
+    def write(self, records):
+        for tick, layers, count, columns in records:
+            if self._ticks is None or self._dumps == self._chunk_dumps:
+                self._start_chunk()
+            self._ticks.append(array.array('q', [tick]).tobytes())
+            for writer, data in zip(self._layers, layers):
+                writer.append(data)
+            for writer, data in zip(self._columns, columns):
+                writer.append(data, count)
+            self._dumps += 1
+        for writer in self._writers():
+            writer.flush()
+
+    def close(self):
+        for writer in self._writers():
+            writer.close()
+
+
+class WorldExporter:
+    ''' Streams dumps of a simulation's world to a directory of .npy files
+
+    Every interval ticks, and when exporting starts, the layers are dumped
+    as one byte per cell, laid out as the rows of the grid: 1 for cells
+    with an entity, or the value of the cell for fields. The traits of the
+    creatures are dumped as one row per creature, with the tick. The dumps
+    are written by a background thread to chunks of chunk_dumps dumps, each
+    a directory of .npy files that numpy.load can memory-map. At most
+    queue_size dumps wait to be written, so memory doesn't grow with the
+    length of the run.
+    '''
+    def __init__(self, path, sim, interval=10, chunk_dumps=1000, queue_size=64):
+        world = sim.world
+        size = world.size
+        if size is None:
+            raise ValueError('Only bounded grids can be exported')
+        if interval < 1 or chunk_dumps < 1:
+            raise ValueError('The interval and chunk size must be at least 1')
+        os.makedirs(path, exist_ok=True)
+        self._sim = sim
+        self._interval = interval
+        self._layers = [world.layer(index) for index in range(world.num_layers)]
+        layer_names = [f'layer{layer.index}' for layer in self._layers]
+        self._getters = [
+            operator.attrgetter(attr) for _, attr, _ in CREATURE_COLUMNS[1:]]
+        with open(os.path.join(path, META_FILE), 'w') as f:
+            json.dump({
+                'version': VERSION,
+                'size': size,
+                'interval': interval,
+                'chunk_dumps': chunk_dumps,
+                'layers': {
+                    name: ('values' if isinstance(layer, decay.DecayField)
+                           else 'occupancy')
+                    for name, layer in zip(layer_names, self._layers)
+                },
+                'creature_columns': [name for name, _, _ in CREATURE_COLUMNS],
+            }, f)
+        self._writer = sinks.StatsWriter(
+            _ExportSink(path, 2*size + 1, layer_names, chunk_dumps), [],
+            queue_size, what='the export')
+        self._dump()
+
+    def _dump(self):
+        tick = self._sim.tick
+        layers = [
+            layer.values() if isinstance(layer, decay.DecayField)
+            else layer.occupancy()
+            for layer in self._layers
+        ]
+        creatures = [
+            ent
+            for layer in self._sim.world.entity_layers()
+            for ent in layer.entities()
+            if type(ent) is Creature
+        ]
+        columns = [(array.array('q', [tick]) * len(creatures)).tobytes()] + [
+            array.array(typecode, map(getter, creatures)).tobytes()
+            for getter, (_, _, typecode) in zip(
+                self._getters, CREATURE_COLUMNS[1:])
+        ]
+        self._writer.write((tick, layers, len(creatures), columns))
+
+    def end_tick(self):
+        ''' Dump the world if the tick that starts now is due
+
+        Called by the simulation after its tick has been advanced
+        '''
+        if self._sim.tick % self._interval == 0:
+            self._dump()
+
+    def close(self):
+        ''' Wait until every dump has been written '''
+        self._writer.close()
+
+
+def read_chunks(path):
+    ''' Yield each chunk of an export as a dict of memory-mapped arrays
+
+    The dict has the ticks of the chunk's dumps, a (dumps, rows, columns)
+    array for each layer and the creature columns. Needs numpy.
+    '''
+    import numpy as np
+    index = 0
+    while os.path.isdir(chunk_path(path, index)):
+        chunk = chunk_path(path, index)
+        yield {
+            name[:-len('.npy')]: np.load(
+                os.path.join(chunk, name), mmap_mode='r')
+            for name in sorted(os.listdir(chunk))
+            if name.endswith('.npy')
+        }
+        index += 1
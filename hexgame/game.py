@@ -1,74 +1,128 @@
 import logging
 import math
 import pyglet
-import random
 
-from . import location
-from . import stats
-from . import util
-from . import world
+from . import scheduler
+from . import simulation
+from .util import draw
 
 
 class Game:
-    def __init__(self, window):
+    def __init__(self, window, seed=None, size=30, random_mode='shared',
+                 stats_sink=None, stats_interval=10, rate=30,
+                 profile_path='hexgame.prof', params=None, scheduling='every'):
         self._window = window
-        self._world = world.World(3)
-        self._rand = random.Random()
-        self._grid = self._create_grid()
+        self._sim = simulation.Simulation(
+            seed, size, random_mode, stats_sink, stats_interval, params,
+            scheduling)
+        self._scheduler = scheduler.Scheduler(self._sim, rate)
+        self._profile_path = profile_path or 'hexgame.prof'
+        self._renderer = draw.ViewportRenderer()
         self._keys = pyglet.window.key.KeyStateHandler()
-        self._view_controller = ViewController(util.draw.state().view)
-        self._stats = stats.EntityStats()
-        self._stats.print_header()
-        self._tick = 0
+        self._view_controller = ViewController(draw.state().view)
 
         @self._window.event
         def on_draw():
             logging.debug('Draw')
-            self._window.clear()
-            util.draw.state().draw()
+            with self._sim.instruments.phase('Game', 'draw'):
+                self._window.clear()
+                # Draw the world as it was after the last completed tick
+                with self._scheduler.locked():
+                    self._renderer.sync(
+                        self.world, *self._window.get_size(), self._sim.tick)
+                draw.state().draw()
+
+        @self._window.event
+        def on_key_press(symbol, modifiers):
+            self._key_command(symbol)
 
         self._window.push_handlers(self._keys)
-        pyglet.clock.schedule_interval(self.update, 1/30)
+        pyglet.clock.schedule_interval(self.update, 1/60)
 
     @property
     def world(self):
-        return self._world
+        return self._sim.world
+
+    @property
+    def simulation(self):
+        return self._sim
+
+    @property
+    def scheduler(self):
+        return self._scheduler
+
+    @property
+    def renderer(self):
+        return self._renderer
 
     def key_pressed(self, key):
         return self._keys[key]
 
+    def window_center(self):
+        width, height = self._window.get_size()
+        return (width / 2, height / 2)
+
     @property
     def rand(self):
-        return self._rand
-
-    def _create_grid(self):
-        tile_image = pyglet.image.load('data/tile.png')
-        grid = []
-        count = 30
-        for y in range(-count, count+1):
-            row = []
-            for x in range(-count, count+1):
-                loc = location.Location(x, y)
-                pos = loc.real_pos()
-                row.append(
-                    util.draw.make_sprite(tile_image, x=pos[0], y=pos[1], order=0))
-            grid.append(row)
-        return grid
+        return self._sim.rand
+
+    def _key_command(self, symbol):
+        ''' Handle the speed control keys
+
+        Space pauses, period steps when paused, and 1, 2 and 3 run at 1x, 10x
+        and full speed. F2 turns instrumentation on and off, and F3 starts
+        and stops profiling the simulation. Zooming (+ and -) is handled by
+        the ViewController.
+        '''
+        key = pyglet.window.key
+        speed_keys = dict(zip((key._1, key._2, key._3), scheduler.SPEEDS))
+        if symbol == key.SPACE:
+            self._scheduler.toggle_pause()
+        elif symbol == key.PERIOD and self._scheduler.paused:
+            self._scheduler.step()
+        elif symbol in speed_keys:
+            self._scheduler.set_speed(speed_keys[symbol])
+        elif symbol == key.F2:
+            self._toggle_instruments()
+        elif symbol == key.F3:
+            self._sim.instruments.toggle_profile(self._profile_path)
+            logging.info(f'Toggled profiling, saving to {self._profile_path}')
+
+    def _toggle_instruments(self):
+        ''' Turn instrumentation on, or off and log the timings '''
+        instruments = self._sim.instruments
+        # The simulation thread writes the records at the end of each tick
+        with self._scheduler.locked():
+            instruments.toggle()
+            enabled = instruments.enabled
+            totals = None if enabled else instruments.totals()
+        if enabled:
+            logging.info('Instrumentation on')
+            return
+        totals = sorted(totals.items(), key=lambda item: -item[1][1])
+        for key, (count, seconds) in totals:
+            logging.info(f'{key}: {count} calls, {seconds:.3f}s')
 
     def update(self, dt):
+        ''' Move the view, the simulation is updated by the scheduler '''
         logging.debug(f'Update (dt={dt})')
+        self._scheduler.check()
         self._view_controller.update(self)
-        self._world.update(self)
-        if self._tick % 10 == 0:
-            self._stats.print_stats()
-        self._tick += 1
 
     def run(self):
         logging.debug('Running')
-        pyglet.app.run()
+        self._scheduler.start()
+        try:
+            pyglet.app.run()
+        finally:
+            self._scheduler.stop()
+            self._sim.close()
 
 
 class ViewController:
+    ZOOM_STEP = 1.05
+    MAX_SCALE = 4
+
     def __init__(self, view):
         self._view = view
         self._xy_speed = (0, 0)
@@ -96,10 +150,23 @@ class ViewController:
         else:
             self._xy_speed = (0, 0)
 
+    def _zoom(self, game):
+        key = pyglet.window.key
+        direction = game.key_pressed(key.EQUAL) - game.key_pressed(key.MINUS)
+        if not direction:
+            return
+        scale = self._view.scale
+        new_scale = max(
+            game.renderer.min_scale,
+            min(scale * self.ZOOM_STEP**direction, self.MAX_SCALE))
+        if new_scale != scale:
+            self._view.zoom(new_scale / scale, game.window_center())
+
     def update(self, game):
         accel = 2.5
         max_speed = 25
         self._accelerate(game, accel*2, max_speed)
         self._deccelerate(accel)
         if self._xy_speed != (0, 0):
-            util.draw.state().view.translate(self._xy_speed)
+            self._view.translate(self._xy_speed)
+        self._zoom(game)
@@ -0,0 +1,139 @@
+import argparse
+import cProfile
+import logging
+import time
+
+from . import main
+from . import parameters
+from . import simulation
+
+
+ENGINES = ['object', 'array']
+
+
+def make_simulation(engine, seed=None, size=30, workers=1, random_mode='shared',
+                    stats_sink=None, stats_interval=10, params=None,
+                    scheduling='every'):
+    if scheduling != 'every' and (engine == 'array' or workers > 1):
+        raise ValueError(
+            'Only the object engine with one worker can schedule plants')
+    if engine == 'array':
+        if params is not None and params.changed():
+            raise ValueError('The array engine does not take parameters')
+        # The array engine needs numpy, so only import it when asked for
+        from . import arrayworld
+        return arrayworld.ArraySimulation(
+            seed, size, stats_sink, stats_interval)
+    if workers > 1:
+        from . import parallel
+        return parallel.PartitionedSimulation(
+            seed, size, workers, random_mode, stats_sink, stats_interval,
+            params)
+    return simulation.Simulation(
+        seed, size, random_mode, stats_sink, stats_interval, params, scheduling)
+
+
+def run(ticks, seed=None, engine='object', size=30, workers=1,
+        random_mode='shared', load=None, save=None, compress=False,
+        stats_sink=None, stats_interval=10, instrument=None, profile=None,
+        params=None, scheduling='every', record=None, keyframe_interval=1000,
+        export=None, export_interval=10):
+    ''' Run the simulation for a number of ticks as fast as possible
+
+    If load is given the simulation starts from that snapshot file, with
+    the parameters it was saved with, and if save is given it is saved
+    there at the end. instrument and profile are paths to save tick
+    timings and cProfile stats to. record and export are directories to
+    record the events to and export dumps of the world to.
+    Returns the simulation, which has been closed
+    '''
+    if load is not None:
+        sim = simulation.Simulation.load(
+            load, stats_sink, stats_interval, scheduling)
+    else:
+        sim = make_simulation(
+            engine, seed, size, workers, random_mode, stats_sink,
+            stats_interval, params, scheduling)
+    profiler = None
+    try:
+        if instrument is not None:
+            if not hasattr(sim, 'instruments'):
+                raise ValueError('Only the object engine can be instrumented')
+            sim.instruments.enable(instrument)
+        # Checked before running, so the run isn't lost at the end
+        if save is not None and not hasattr(sim, 'save'):
+            raise ValueError(
+                'Only the object engine with one worker can be saved')
+        if profile is not None:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        if load is None:
+            sim.populate()
+        if record is not None:
+            if not hasattr(sim, 'record'):
+                raise ValueError(
+                    'Only the object engine with one worker can be recorded')
+            sim.record(record, keyframe_interval)
+        if export is not None:
+            if not hasattr(sim, 'export'):
+                raise ValueError(
+                    'Only the object engine with one worker can be exported')
+            sim.export(export, export_interval)
+        start = time.perf_counter()
+        for _ in range(ticks):
+            sim.update()
+        elapsed = time.perf_counter() - start
+        if save is not None:
+            sim.save(save, compress)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile)
+        sim.close()
+    logging.info(
+        f'{ticks} ticks in {elapsed:.2f}s ({ticks/max(elapsed, 1e-9):.1f} ticks/s)')
+    return sim
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Run the simulation without a window')
+    parser.add_argument(
+        '-t', '--ticks', type=int, default=1000,
+        help='Number of ticks to run')
+    main.add_simulation_args(parser)
+    parser.add_argument(
+        '-e', '--engine', choices=ENGINES, default='object',
+        help='World engine: entity objects or numpy arrays')
+    parser.add_argument(
+        '-w', '--workers', type=int, default=1,
+        help='Number of worker processes for the object engine')
+    parser.add_argument(
+        '--load', metavar='PATH',
+        help='Start from a snapshot instead of the default layout')
+    parser.add_argument(
+        '--save', metavar='PATH',
+        help='Save a snapshot at the end')
+    parser.add_argument(
+        '--compress', action='store_true',
+        help='Compress the saved snapshot')
+    parser.add_argument(
+        '-v', '--verbose', action='store_true',
+        help='Verbose output')
+    args = parser.parse_args()
+    return args
+
+
+def headless_main():
+    args = parse_args()
+    main.init_logging(args.verbose)
+    run(
+        args.ticks, args.seed, args.engine, args.size, args.workers,
+        args.random_mode, args.load, args.save, args.compress, args.stats,
+        args.stats_interval, args.instrument, args.profile,
+        parameters.Params(**dict(args.params)), args.scheduling,
+        args.record, args.keyframe_interval, args.export, args.export_interval)
+
+
+if __name__ == '__main__':
+    headless_main()
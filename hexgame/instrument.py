@@ -0,0 +1,193 @@
+import collections
+import contextlib
+import json
+import time
+
+from .entity import Creature, DiseaseField, Plant
+
+
+# Timed entity methods, by phase. Each phase includes the phases it calls,
+# so update includes move, reproduce and die of the same entity, and wake,
+# which active scheduling calls instead of update, includes reproduce and
+# die. Reproduce only counts the children tried for, in either mode.
+PHASES = {
+    'update': 'update',
+    'move': 'try_move',
+    'reproduce': 'reproduce',
+    'die': 'die',
+    'events': 'signal_event',
+    'decay': 'decay',
+    'wake': 'wake',
+}
+ENTITY_CLASSES = [Creature, Plant, DiseaseField]
+
+
+class Instruments:
+    ''' Per tick counters and timers of the entity methods, by type and phase
+
+    While enabled the methods in PHASES are replaced by timing wrappers on
+    each entity class, and restored when disabled, so there is no overhead
+    when instrumentation is off. Only one Instruments can be enabled at a
+    time. At the end of each tick a record is added to a rolling buffer of
+    the last buffer_size ticks and, if a path was given, appended to that
+    file as a line of JSON.
+    '''
+    _active = None
+
+    def __init__(self, buffer_size=1000):
+        self._buffer = collections.deque(maxlen=buffer_size)
+        self._counters = {}
+        self._patched = []
+        self._file = None
+        self._profile = None
+        self._profile_path = None
+        self._profile_request = None
+
+    @property
+    def enabled(self):
+        return Instruments._active is self
+
+    @property
+    def buffer(self):
+        ''' Records of the most recent ticks, oldest first '''
+        return self._buffer
+
+    def _wrap(self, counter, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                counter[0] += 1
+                counter[1] += time.perf_counter() - start
+        return timed
+
+    def enable(self, path=None):
+        ''' Start instrumenting, appending tick records to path if given '''
+        if self.enabled:
+            return
+        if Instruments._active is not None:
+            raise RuntimeError('Another Instruments is already enabled')
+        if path is not None:
+            self._file = open(path, 'a')
+        for cls in ENTITY_CLASSES:
+            for phase, name in PHASES.items():
+                func = getattr(cls, name, None)
+                if func is None:
+                    continue
+                counter = self._counter(cls.__name__, phase)
+                self._patched.append((cls, name, cls.__dict__.get(name)))
+                setattr(cls, name, self._wrap(counter, func))
+        Instruments._active = self
+
+    def disable(self):
+        if not self.enabled:
+            return
+        for cls, name, original in reversed(self._patched):
+            if original is None:
+                delattr(cls, name)
+            else:
+                setattr(cls, name, original)
+        self._patched = []
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        Instruments._active = None
+
+    def toggle(self, path=None):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable(path)
+
+    def _counter(self, source, phase):
+        key = f'{source}.{phase}'
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = [0, 0.0]
+        return counter
+
+    @contextlib.contextmanager
+    def phase(self, source, phase):
+        ''' Time a block of code outside the entities, like drawing '''
+        if not self.enabled:
+            yield
+            return
+        counter = self._counter(source, phase)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            counter[0] += 1
+            counter[1] += time.perf_counter() - start
+
+    def end_tick(self, tick, seconds):
+        ''' Record the counters of a tick that took seconds, and reset them
+
+        Called by the simulation after every tick, in the thread running it
+        '''
+        if self._profile_request is not None:
+            path, self._profile_request = self._profile_request, None
+            if self._profile is None:
+                self.start_profile(path)
+            else:
+                self.stop_profile()
+        if not self.enabled:
+            return
+        record = {
+            'tick': tick,
+            'seconds': seconds,
+            'phases': {
+                key: list(counter)
+                for key, counter in self._counters.items()
+                if counter[0]
+            },
+        }
+        for counter in self._counters.values():
+            counter[0] = 0
+            counter[1] = 0.0
+        self._buffer.append(record)
+        if self._file is not None:
+            self._file.write(json.dumps(record) + '\n')
+
+    def totals(self):
+        ''' Return {phase key: [count, seconds]} summed over the buffer '''
+        totals = {}
+        for record in self._buffer:
+            for key, (count, seconds) in record['phases'].items():
+                total = totals.setdefault(key, [0, 0.0])
+                total[0] += count
+                total[1] += seconds
+        return totals
+
+    @property
+    def profiling(self):
+        return self._profile is not None
+
+    def start_profile(self, path):
+        ''' Start a cProfile session of the calling thread, saved to path '''
+        if self._profile is None:
+            # Imported here, only a profiled run needs it
+            import cProfile
+            self._profile_path = path
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop_profile(self):
+        ''' Stop the cProfile session and save its stats '''
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self._profile_path)
+            self._profile = None
+
+    def toggle_profile(self, path):
+        ''' Start or stop profiling at the end of the next tick
+
+        cProfile only sees the thread it was started in, so this is how other
+        threads, like the game's, profile the simulation thread.
+        '''
+        self._profile_request = path
+
+    def close(self):
+        self.disable()
+        self.stop_profile()
@@ -1,11 +1,37 @@
+import array
 import math
 
 
 X_SCALE = 20
 Y_SCALE = X_SCALE * math.cos(math.pi/6)
 
+# Packing of unbounded coordinates into one non-negative int
+PACK_BITS = 32
+PACK_OFFSET = 1 << (PACK_BITS - 1)
+PACK_MASK = (1 << PACK_BITS) - 1
+
+# Bounded grids with more cells than this compute neighbors instead of
+# keeping a table of them
+NEIGHBOR_TABLE_LIMIT = 1 << 20
+
+
+def pack(x, y):
+    return ((y + PACK_OFFSET) << PACK_BITS) | (x + PACK_OFFSET)
+
+
+def unpack(cell):
+    return (cell & PACK_MASK) - PACK_OFFSET, (cell >> PACK_BITS) - PACK_OFFSET
+
+
+def real_pos(x, y):
+    xx = x * X_SCALE - (y % 2) * X_SCALE // 2
+    yy = y * Y_SCALE
+    return (xx, yy)
+
 
 class Location:
+    __slots__ = ('_x', '_y')
+
     def __init__(self, x, y):
         self._x = x
         self._y = y
@@ -19,9 +45,7 @@ class Location:
         return self._y
 
     def real_pos(self):
-        xx = self._x * X_SCALE - (self._y % 2) * X_SCALE // 2
-        yy = self._y * Y_SCALE
-        return (xx, yy)
+        return real_pos(self._x, self._y)
 
     def in_direction(self, dir):
         even = self._y % 2 == 0
@@ -33,7 +57,7 @@ class Location:
         return self._x == loc._x and self._y == loc._y
 
     def __hash__(self):
-        return hash((self._x, self._y))
+        return pack(self._x, self._y)
 
     def __repr__(self):
         return f'({self._x}, {self._y})'
@@ -64,6 +88,9 @@ class Direction:
     def __repr__(self):
         return self.name
 
+    def __reduce__(self):
+        return (getattr, (Direction, self.name))
+
 
 Direction.E = Direction('E', 0, 1, 1, 0)
 Direction.SE = Direction('SE', 1, 1, 0, 1)
@@ -74,3 +101,101 @@ Direction.NE = Direction('NE', 5, 1, 0, -1)
 Direction._dirs = (
     Direction.E, Direction.SE, Direction.SW, Direction.W, Direction.NW, Direction.NE
 )
+
+
+class Grid:
+    ''' Numbering of the cells of a hex grid as ints
+
+    A bounded grid of the given radius numbers its cells from 0 row by row.
+    An unbounded grid (size None) packs the coordinates into one int.
+    Cells outside the grid are -1.
+    '''
+    def __init__(self, size=None):
+        self._size = size
+        self._table = None
+        if size is None:
+            self._width = None
+            self._offsets = [
+                ((dir.y << PACK_BITS) + dir.even_x, (dir.y << PACK_BITS) + dir.odd_x)
+                for dir in Direction.dirs()
+            ]
+            self.neighbor = self._packed_neighbor
+        else:
+            self._width = 2*size + 1
+            if self._width * self._width <= NEIGHBOR_TABLE_LIMIT:
+                self._table = self._make_table()
+                self.neighbor = self._table_neighbor
+            else:
+                self.neighbor = self._bounded_neighbor
+
+    @property
+    def size(self):
+        return self._size
+
+    def num_cells(self):
+        ''' Number of cells in a bounded grid, or None if unbounded '''
+        return None if self._width is None else self._width * self._width
+
+    def cell(self, x, y):
+        size = self._size
+        if size is None:
+            return pack(x, y)
+        if not (-size <= x <= size and -size <= y <= size):
+            return -1
+        return (y + size) * self._width + (x + size)
+
+    def cell_at(self, loc):
+        return self.cell(loc.x, loc.y)
+
+    def xy(self, cell):
+        if self._size is None:
+            return unpack(cell)
+        y, x = divmod(cell, self._width)
+        return x - self._size, y - self._size
+
+    def location(self, cell):
+        return Location(*self.xy(cell))
+
+    def real_pos(self, cell):
+        return real_pos(*self.xy(cell))
+
+    def neighbors(self, cell):
+        ''' Return the neighbors of a cell, in Direction order '''
+        return [self.neighbor(cell, idx) for idx in range(6)]
+
+    def _make_table(self):
+        width = self._width
+        table = []
+        for dir in Direction.dirs():
+            cells = array.array('l')
+            for y in range(-self._size, self._size+1):
+                dx = dir.even_x if y % 2 == 0 else dir.odd_x
+                ny = y + dir.y + self._size
+                if not 0 <= ny < width:
+                    cells.extend([-1] * width)
+                    continue
+                start = ny * width + dx
+                row = array.array('l', range(start, start + width))
+                if dx < 0:
+                    row[0] = -1
+                elif dx > 0:
+                    row[-1] = -1
+                cells.extend(row)
+            table.append(cells)
+        return table
+
+    def _table_neighbor(self, cell, dir_idx):
+        ''' Return the cell next to cell in the direction, or -1 '''
+        return self._table[dir_idx][cell]
+
+    def _bounded_neighbor(self, cell, dir_idx):
+        dir = Direction._dirs[dir_idx]
+        y, x = divmod(cell, self._width)
+        x += dir.even_x if (y - self._size) % 2 == 0 else dir.odd_x
+        y += dir.y
+        if 0 <= x < self._width and 0 <= y < self._width:
+            return y * self._width + x
+        return -1
+
+    def _packed_neighbor(self, cell, dir_idx):
+        return cell + self._offsets[dir_idx][(cell >> PACK_BITS) & 1]
@@ -1,31 +1,42 @@
 import argparse
 import logging.config
-import pyglet
 
-from .game import Game
-from .entity import Creature, Plant
-from . import location
+from . import parameters
+from . import rng
+from . import sinks
+from . import timingwheel
 
 
 def main():
     args = parse_args()
     init_logging(args.verbose)
+    # pyglet is only needed for the windowed game, see hexgame.headless
+    import pyglet
+    from .game import Game
     config = pyglet.gl.Config(alpha_size=8)
     window = pyglet.window.Window(config=config, width=1300, height=1100)
-    game = Game(window)
-    for x in range(-20, 21):
-        for y in range(-20, 21):
-            loc = location.Location(x, y)
-            game.world.layer(1).add_entity(Plant(), loc)
-    for x in range(-1, 2):
-        for y in range(-1, 2):
-            loc = location.Location(x, y)
-            game.world.layer(0).add_entity(Creature(), loc)
+    game = Game(
+        window, args.seed, args.size, args.random_mode,
+        args.stats, args.stats_interval, args.rate, args.profile,
+        parameters.Params(**dict(args.params)), args.scheduling)
+    if args.instrument is not None:
+        game.simulation.instruments.enable(args.instrument)
+    if args.profile is not None:
+        game.simulation.instruments.toggle_profile(args.profile)
+    game.simulation.populate()
+    if args.record is not None:
+        game.simulation.record(args.record, args.keyframe_interval)
+    if args.export is not None:
+        game.simulation.export(args.export, args.export_interval)
     game.run()
 
 
 def parse_args():
     parser = argparse.ArgumentParser()
+    add_simulation_args(parser)
+    parser.add_argument(
+        '-r', '--rate', type=float, default=30,
+        help='Ticks per second at 1x speed')
     parser.add_argument(
         '-v', '--verbose', action='store_true',
         help='Verbose output')
@@ -33,6 +44,72 @@ def parse_args():
     return args
 
 
+def add_simulation_args(parser):
+    parser.add_argument(
+        '-s', '--seed', type=int, default=None,
+        help='Random seed')
+    parser.add_argument(
+        '--random', dest='random_mode', choices=rng.MODES, default='shared',
+        help='Where entities get random numbers: one shared generator, a '
+             'stream per entity whose draws do not depend on the update '
+             'order, or a pool filled by numpy')
+    parser.add_argument(
+        '--scheduling', choices=timingwheel.SCHEDULING_MODES, default='every',
+        help='Update every plant every tick, or only wake plants at the '
+             'ticks they die or reproduce at')
+    parser.add_argument(
+        '--size', type=grid_size, default=30,
+        help='Grid radius, or 0 for an unbounded grid')
+    parser.add_argument(
+        '-p', '--param', dest='params', metavar='NAME=VALUE', action='append',
+        type=parameters.param_value, default=[],
+        help='Change a rule parameter, can be repeated. Parameters: '
+             + ', '.join(parameters.DEFAULTS))
+    parser.add_argument(
+        '--stats', metavar='FORMAT[:PATH]', type=stats_sink, default=None,
+        help='Where statistics are written: text (default, stdout), '
+             'csv:PATH, json:PATH (one object per line) or columns:DIR')
+    parser.add_argument(
+        '--stats-interval', metavar='TICKS', type=int, default=10,
+        help='Number of ticks between statistics reports')
+    parser.add_argument(
+        '--instrument', metavar='PATH',
+        help='Time the entity updates of every tick, appending the timings '
+             'to PATH as lines of JSON')
+    parser.add_argument(
+        '--profile', metavar='PATH',
+        help='Profile the simulation with cProfile, saving the stats to PATH')
+    parser.add_argument(
+        '--record', metavar='DIR',
+        help='Record the events of every tick to DIR, to be replayed with '
+             'hexgame.replay')
+    parser.add_argument(
+        '--keyframe-interval', metavar='TICKS', type=int, default=1000,
+        help='Number of ticks between the snapshots of a recording')
+    parser.add_argument(
+        '--export', metavar='DIR',
+        help='Dump the layers and creature traits to .npy files in DIR')
+    parser.add_argument(
+        '--export-interval', metavar='TICKS', type=int, default=10,
+        help='Number of ticks between exported dumps')
+
+
+def grid_size(value):
+    ''' argparse type for a grid radius, where 0 means unbounded '''
+    size = int(value)
+    if size < 0:
+        raise argparse.ArgumentTypeError(f'invalid grid size: {value}')
+    return size or None
+
+
+def stats_sink(value):
+    ''' argparse type for a statistics sink, see sinks.make_sink '''
+    try:
+        return sinks.make_sink(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
 def init_logging(verbose):
     level = 'DEBUG' if verbose else 'INFO'
     logging.config.dictConfig({
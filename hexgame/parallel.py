@@ -0,0 +1,410 @@
+import collections
+import logging
+import multiprocessing
+import random
+import traceback
+
+from . import entity
+from . import parameters
+from . import rng
+from . import simulation
+from . import stats
+from . import world
+
+
+class RegionStats:
+    ''' Births and deaths of the entities in one region
+
+    Entities move between regions, so the per-entity statistics are computed
+    from the entities in the region when they are collected.
+    '''
+    def __init__(self, diseases):
+        self._diseases = diseases
+        self._counts = collections.Counter()
+        self._generation = collections.Counter()
+        entity.Entity.add_event_listener(
+            self._handler, stats.ENT_TYPES, ['birth', 'death'])
+
+    def _handler(self, ent, event, value):
+        ent_type = type(ent).__name__
+        if event == 'birth':
+            self._counts[ent_type + 'Births'] += 1
+            self._generation[ent_type] = max(
+                self._generation[ent_type], ent.generation)
+        else:
+            self._counts[ent_type + 'Deaths'] += 1
+
+    def collect(self, ents):
+        ''' Return the statistics of the region and reset the delta stats '''
+        values = dict(self._counts)
+        self._counts.clear()
+        values['DiseaseBirths'], values['DiseaseDeaths'] = (
+            self._diseases.take_counts())
+        values['DiseaseCount'] = self._diseases.count()
+        for ent_type in stats.ENT_TYPES:
+            values[ent_type + 'Generation'] = self._generation[ent_type]
+        minmax = collections.defaultdict(list)
+        for ent in ents:
+            ent_type = type(ent).__name__
+            if ent_type not in stats.ENT_TYPES:
+                continue
+            values[ent_type + 'Count'] = values.get(ent_type + 'Count', 0) + 1
+            if ent.diseased:
+                key = ent_type + 'Diseased'
+                values[key] = values.get(key, 0) + 1
+            if ent_type == 'Creature':
+                minmax['BirthCost'].append(ent.birth_cost)
+                minmax['Resistance'].append(ent.disease_resistance)
+        for field, vals in minmax.items():
+            values['CreatureMin' + field] = min(vals)
+            values['CreatureMax' + field] = max(vals)
+        return values
+
+
+def merge_stats(region_stats):
+    ''' Combine the statistics of all regions into one row of EntityStats '''
+    merged = {}
+    for name in stats.stat_names():
+        vals = [values[name] for values in region_stats if name in values]
+        if 'Min' in name:
+            merged[name] = min(vals) if vals else 0
+        elif 'Max' in name or 'Generation' in name:
+            merged[name] = max(vals) if vals else 0
+        else:
+            merged[name] = sum(vals)
+    return merged
+
+
+class Region:
+    ''' The part of the world updated by one worker process
+
+    A region owns a strip of grid rows. The row on each side of the strip is
+    a halo holding copies (ghosts) of the neighboring regions' entities, so
+    entities can move and reproduce across the border. Entities that end up
+    in the halo are handed over to the region that owns it.
+    '''
+    def __init__(self, index, num_regions, size, seed, random_mode,
+                 params=None):
+        self._world = world.World(3, size, entity.FIELDS)
+        self.params = parameters.DEFAULT if params is None else params
+        self._width = 2*size + 1
+        self._start = self._width * index // num_regions
+        self._stop = self._width * (index + 1) // num_regions
+        self._random = rng.RandomSource(
+            seed, random_mode, shared_seed=seed * num_regions + index)
+        self.random_for = self._random.random_for
+        self.random_block = self._random.block
+        self.new_id = self._random.new_id
+        self._stats = RegionStats(self._world.layer(2))
+        self._ghosts = {}
+        # Cells of fields set to the values of the neighbors' cells
+        self._field_ghosts = []
+        self._ghost_kills = 0
+        self._arrived = set()
+        halo_rows = [
+            row for row in (self._start - 1, self._stop)
+            if 0 <= row < self._width
+        ]
+        self._halo_cells = [
+            row * self._width + col
+            for row in halo_rows
+            for col in range(self._width)
+        ]
+
+    @property
+    def world(self):
+        return self._world
+
+    @property
+    def rand(self):
+        return self._random.shared
+
+    def owns(self, cell):
+        return self._start <= cell // self._width < self._stop
+
+    def _row_entities(self, row):
+        start = row * self._width
+        cells = range(start, start + self._width)
+        return [
+            (layer.index, cell, layer.get_entity(cell))
+            for layer in self._world.entity_layers()
+            for cell, flag in zip(cells, layer.occupied(cells))
+            if flag
+        ] + [
+            (field.index, cell, value)
+            for field in self._world.fields()
+            for cell in cells
+            for value in [field.get(cell)]
+            if value
+        ]
+
+    def _entities(self):
+        return [
+            ent
+            for layer in self._world.entity_layers()
+            for ent in layer.entities()
+            if ent not in self._ghosts
+        ]
+
+    def _clear_field_ghosts(self):
+        for layer_index, cell in self._field_ghosts:
+            self._world.layer(layer_index).put(cell, 0)
+        self._field_ghosts = []
+
+    def populate(self):
+        simulation.populate(self._world, self.owns, self.params)
+
+    def border(self):
+        ''' Return the entities in the first and last rows of the region '''
+        return self._row_entities(self._start), self._row_entities(self._stop - 1)
+
+    def set_halo(self, ents):
+        ''' Replace the ghosts in the halo with copies of the given entities
+
+        For fields the entities are the values of the cells
+        '''
+        for ghost in self._ghosts:
+            if ghost.layer is not None:
+                ghost.layer.remove_entity(ghost)
+        self._ghosts = {}
+        self._clear_field_ghosts()
+        fields = self._world.fields()
+        for layer_index, cell, ent in ents:
+            layer = self._world.layer(layer_index)
+            if layer in fields:
+                layer.put(cell, ent)
+                self._field_ghosts.append((layer_index, cell))
+            else:
+                layer.add_entity(ent, cell)
+                self._ghosts[ent] = (layer_index, cell)
+
+    def update(self, tick):
+        ''' Update the entities of the region
+
+        Returns the entities that moved into the halo, and the cells of the
+        ghosts that were killed, as (layer index, cell, entity) tuples
+        '''
+        self._random.start_tick(tick)
+        layer_ents = [
+            (layer, list(layer.entities()))
+            for layer in self._world.entity_layers()
+        ]
+        for layer, ents in layer_ents:
+            draws = self._random.block(len(ents) * entity.UPDATE_DRAWS)
+            for ent in ents:
+                if (ent._layer is layer and ent not in self._ghosts
+                        and ent not in self._arrived):
+                    ent.update(self, draws)
+        self._arrived = set()
+        killed = [
+            (layer_index, cell, None)
+            for layer_index, cell in self._field_ghosts
+            if not self._world.layer(layer_index).get(cell)
+        ]
+        self._ghost_kills += len(killed)
+        # Ghosts are not updated, so they are cleared before the fields decay
+        self._clear_field_ghosts()
+        for field in self._world.fields():
+            field.decay()
+        entity.Entity.deliver_events()
+
+        killed += [
+            (layer_index, cell, None)
+            for ghost, (layer_index, cell) in self._ghosts.items()
+            if ghost.layer is None
+        ]
+        leaving = []
+        layers = self._world.entity_layers()
+        flags = [layer.occupied(self._halo_cells) for layer in layers]
+        for i, cell in enumerate(self._halo_cells):
+            for layer, occupied in zip(layers, flags):
+                if not occupied[i]:
+                    continue
+                index = layer.index
+                ent = layer.get_entity(cell)
+                if ent not in self._ghosts:
+                    layer.remove_entity(ent)
+                    leaving.append((index, cell, ent))
+        return leaving, killed
+
+    def arrive(self, ents, skip_update):
+        ''' Add entities handed over by other regions
+
+        Tuples without an entity are ghosts that another region killed.
+        If skip_update is True the arrivals were already updated this tick.
+        '''
+        for layer_index, cell, ent in ents:
+            layer = self._world.layer(layer_index)
+            if ent is None:
+                if layer in self._world.fields():
+                    layer.kill(cell)
+                    continue
+                killed = layer.get_entity(cell)
+                if killed is not None:
+                    killed.die()
+                continue
+            added = layer.add_entity(ent, cell)
+            assert added, 'Region handed an entity to an occupied cell!'
+            if skip_update:
+                self._arrived.add(ent)
+
+    def collect_stats(self):
+        values = self._stats.collect(self._entities())
+        # Killed field ghosts are counted by the regions owning their cells
+        values['DiseaseDeaths'] -= self._ghost_kills
+        self._ghost_kills = 0
+        return values
+
+    def cells(self):
+        return sorted(
+            [(ent.layer.index, ent.cell, type(ent).__name__)
+             for ent in self._entities()] +
+            [(field.index, cell, 'Disease')
+             for field in self._world.fields()
+             for cell, _ in field.cells()
+             if self.owns(cell)])
+
+
+def _worker(conn, index, num_regions, size, seed, random_mode, params):
+    region = Region(index, num_regions, size, seed, random_mode, params)
+    while True:
+        command, args = conn.recv()
+        if command == 'stop':
+            break
+        try:
+            result = getattr(region, command)(*args)
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+        else:
+            conn.send(('ok', result))
+    conn.close()
+
+
+class PartitionedSimulation:
+    ''' Simulation split into strips of rows updated by worker processes
+
+    Even and odd strips are updated in alternating phases, so neighboring
+    strips are never updated at the same time and the halo of a strip being
+    updated always matches its neighbors. For a given seed and number of
+    workers the results are always the same.
+    '''
+    def __init__(self, seed=None, size=30, workers=2, random_mode='shared',
+                 stats_sink=None, stats_interval=10, params=None):
+        if size is None:
+            raise ValueError('Partitioned simulation needs a bounded grid size')
+        width = 2*size + 1
+        if width < 2*workers:
+            raise ValueError(
+                f'Grid of size {size} is too small for {workers} workers')
+        if seed is None:
+            seed = random.randrange(1 << 32)
+        self._width = width
+        self._num_regions = workers
+        self._row_owner = [
+            index
+            for index in range(workers)
+            for _ in range(width * index // workers, width * (index + 1) // workers)
+        ]
+        context = multiprocessing.get_context()
+        self._conns = []
+        self._procs = []
+        for index in range(workers):
+            parent_conn, child_conn = context.Pipe()
+            proc = context.Process(
+                target=_worker,
+                args=(child_conn, index, workers, size, seed, random_mode,
+                      params),
+                daemon=True)
+            proc.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._procs.append(proc)
+        self._stats = dict.fromkeys(stats.stat_names(), 0)
+        self._reporter = stats.StatsReporter(stats_sink, stats_interval)
+        self._tick = 0
+
+    @property
+    def tick(self):
+        return self._tick
+
+    @property
+    def stats(self):
+        return self._stats
+
+    def _call(self, calls):
+        ''' Run commands on workers concurrently
+
+        calls is a list of (worker index, command, args), returns the results
+        '''
+        for index, command, args in calls:
+            self._conns[index].send((command, args))
+        results = []
+        for index, command, args in calls:
+            try:
+                status, result = self._conns[index].recv()
+            except EOFError:
+                raise RuntimeError(f'Worker {index} exited during {command}')
+            if status == 'error':
+                raise RuntimeError(
+                    f'Worker {index} failed during {command}:\n{result}')
+            results.append(result)
+        return results
+
+    def _all(self, command, *args):
+        return self._call([
+            (index, command, args) for index in range(self._num_regions)])
+
+    def populate(self):
+        self._all('populate')
+
+    def _exchange_halos(self, active):
+        frozen = sorted({
+            neighbor
+            for index in active
+            for neighbor in (index - 1, index + 1)
+            if 0 <= neighbor < self._num_regions
+        })
+        borders = dict(zip(frozen, self._call([(i, 'border', ()) for i in frozen])))
+        calls = []
+        for index in active:
+            halo = []
+            if index - 1 in borders:
+                halo += borders[index - 1][1]
+            if index + 1 in borders:
+                halo += borders[index + 1][0]
+            calls.append((index, 'set_halo', (halo,)))
+        self._call(calls)
+
+    def update(self):
+        logging.debug(f'Tick {self._tick}')
+        for phase in (0, 1):
+            active = list(range(phase, self._num_regions, 2))
+            if not active:
+                continue
+            self._exchange_halos(active)
+            results = self._call([
+                (index, 'update', (self._tick,)) for index in active])
+            arrivals = collections.defaultdict(list)
+            for leaving, killed in results:
+                for layer_index, cell, ent in killed + leaving:
+                    arrivals[self._row_owner[cell // self._width]].append(
+                        (layer_index, cell, ent))
+            self._call([
+                (index, 'arrive', (ents, index % 2 > phase))
+                for index, ents in sorted(arrivals.items())
+            ])
+        if self._reporter.due(self._tick):
+            self._stats = merge_stats(self._all('collect_stats'))
+            self._reporter.report(self._tick, self._stats)
+        self._tick += 1
+
+    def cells(self):
+        ''' Return (layer index, cell, entity type) of every entity '''
+        return sorted(cell for cells in self._all('cells') for cell in cells)
+
+    def close(self):
+        for conn in self._conns:
+            conn.send(('stop', ()))
+        for proc in self._procs:
+            proc.join()
+        self._reporter.close()
@@ -0,0 +1,109 @@
+# Tunable constants of the entity rules, with their default values
+DEFAULTS = {
+    'plant_max_life': 1000,
+    'plant_max_reproduce': 100,
+    'plant_reproduce_cost': 100,
+    'plant_disease_chance': 1/5000,
+    'plant_diseased_child_chance': 1/5,
+    'creature_max_life': 1000,
+    'creature_max_reproduce': 500,
+    'creature_satiation': 1000,
+    'creature_birth_cost': 200,
+    'creature_disease_resistance': 50,
+    'creature_max_health': 100,
+    'creature_starve_damage': 10,
+    'creature_diseased_child_chance': 1/2,
+    'creature_eat_disease_chance': 1/5,
+    'creature_touch_disease_chance': 2/3,
+    'creature_cure_chance': 1/100,
+    'disease_life': 3,
+}
+# Lowest and highest allowed values, None where there is no limit
+LIMITS = {
+    name: (0, 1) if isinstance(default, float) else (1, None)
+    for name, default in DEFAULTS.items()
+}
+LIMITS.update({
+    'plant_reproduce_cost': (0, None),
+    'creature_birth_cost': (0, None),
+    'creature_disease_resistance': (0, 100),
+    'creature_starve_damage': (0, None),
+    # The disease field stores life + 1 in a byte per cell
+    'disease_life': (1, 254),
+})
+
+
+def check_value(name, value):
+    ''' Return the value of a parameter as the type of its default
+
+    Raises ValueError for values that aren't whole numbers for integer
+    parameters, or that are outside LIMITS.
+    '''
+    kind = type(DEFAULTS[name])
+    if kind is int and isinstance(value, float) and not value.is_integer():
+        raise ValueError(f'{name} must be a whole number: {value}')
+    value = kind(value)
+    low, high = LIMITS[name]
+    if value < low or (high is not None and value > high):
+        bounds = f'at least {low}' if high is None else f'{low} to {high}'
+        raise ValueError(f'{name} must be {bounds}: {value}')
+    return value
+
+
+class Params:
+    ''' Values of the tunable constants, the DEFAULTS unless given
+
+    Entities read them from game.params, so a simulation can be run with
+    different rules without editing code.
+    '''
+    __slots__ = tuple(DEFAULTS)
+
+    def __init__(self, **values):
+        unknown = values.keys() - DEFAULTS.keys()
+        if unknown:
+            raise ValueError(f'Unknown parameters: {", ".join(sorted(unknown))}')
+        for name, default in DEFAULTS.items():
+            setattr(self, name, check_value(name, values.get(name, default)))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in DEFAULTS}
+
+    def changed(self):
+        ''' Return the values that differ from the defaults '''
+        return {
+            name: value
+            for name, value in self.to_dict().items()
+            if value != DEFAULTS[name]
+        }
+
+    def __eq__(self, other):
+        return isinstance(other, Params) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        values = ', '.join(
+            f'{name}={value!r}' for name, value in self.changed().items())
+        return f'Params({values})'
+
+    def __getstate__(self):
+        return self.changed()
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+
+DEFAULT = Params()
+
+
+def param_value(value):
+    ''' argparse type for NAME=VALUE, returning (name, value) '''
+    # Imported here, so the rules don't need argparse
+    import argparse
+    name, sep, text = value.partition('=')
+    if not sep or name not in DEFAULTS:
+        raise argparse.ArgumentTypeError(
+            f'expected NAME=VALUE with NAME one of: {", ".join(DEFAULTS)}')
+    try:
+        kind = type(DEFAULTS[name])
+        return name, check_value(name, kind(text))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f'invalid value for {name}: {e}')
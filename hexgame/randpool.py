@@ -0,0 +1,77 @@
+import numpy as np
+
+
+class RandomPool:
+    ''' Random numbers generated by numpy in blocks and handed out one by one
+
+    Has the parts of random.Random the entities use, with the same
+    probabilities: randrange(n) is floor(random() * n). take hands out a
+    whole slice of the block at once, for the rolls every entity makes.
+    '''
+    def __init__(self, seed=None, block_size=1 << 16):
+        self._generator = np.random.default_rng(seed)
+        self._block_size = block_size
+        self._values = []
+        self._pos = 0
+        self._tick_start = 0
+        self._last_used = 0
+
+    def refill(self, size=None):
+        ''' Replace the pool with a new block of at least size numbers '''
+        size = max(size or 0, self._block_size)
+        self._values = self._generator.random(size).tolist()
+        self._pos = 0
+        self._tick_start = 0
+
+    def start_tick(self):
+        ''' Make sure there are enough numbers for a tick like the last one
+
+        Generating them up front keeps the refill out of the entity updates.
+        '''
+        self._last_used = self._pos - self._tick_start
+        if len(self._values) - self._pos < self._last_used:
+            self.refill(2 * self._last_used)
+        self._tick_start = self._pos
+
+    def getstate(self):
+        ''' Return the state of the pool, as JSON compatible values '''
+        return {
+            'generator': self._generator.bit_generator.state,
+            'values': self._values[self._tick_start:],
+            'pos': self._pos - self._tick_start,
+            'last_used': self._last_used,
+        }
+
+    def setstate(self, state):
+        self._generator.bit_generator.state = state['generator']
+        self._values = list(state['values'])
+        self._pos = state['pos']
+        self._tick_start = 0
+        self._last_used = state['last_used']
+
+    def take(self, count):
+        ''' Return a list of the next count numbers, for rules drawing in bulk '''
+        if len(self._values) - self._pos < count:
+            self.refill(count)
+        pos = self._pos
+        self._pos = pos + count
+        return self._values[pos:pos + count]
+
+    def random(self):
+        pos = self._pos
+        if pos == len(self._values):
+            self.refill()
+            pos = 0
+        self._pos = pos + 1
+        return self._values[pos]
+
+    def randrange(self, stop):
+        if stop <= 0:
+            raise ValueError(f'empty range for randrange({stop})')
+        return int(self.random() * stop)
+
+    def randint(self, a, b):
+        return a + self.randrange(b - a + 1)
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
@@ -0,0 +1,127 @@
+import argparse
+import logging
+import pyglet
+
+from . import eventlog
+from . import main
+from .game import ViewController
+from .util import draw
+
+
+class ReplayViewer:
+    ''' Shows a run recorded by eventlog.EventRecorder, without its rules
+
+    Space plays and pauses, period and comma step a tick forward and back,
+    and page up and page down jump a keyframe interval. The view is moved
+    and zoomed like the game's.
+    '''
+    def __init__(self, window, path, tick=None, rate=30):
+        self._window = window
+        self._replay = eventlog.Replay(path)
+        self._jump = self._replay.log.meta['keyframe_interval']
+        self._playing = False
+        self._renderer = draw.ViewportRenderer()
+        self._keys = pyglet.window.key.KeyStateHandler()
+        self._view_controller = ViewController(draw.state().view)
+        self._seek(self._replay.tick if tick is None else tick)
+
+        @self._window.event
+        def on_draw():
+            self._window.clear()
+            self._renderer.sync(
+                self._replay.world, *self._window.get_size(), self._replay.tick)
+            draw.state().draw()
+
+        @self._window.event
+        def on_key_press(symbol, modifiers):
+            self._key_command(symbol)
+
+        self._window.push_handlers(self._keys)
+        pyglet.clock.schedule_interval(self.update, 1/60)
+        pyglet.clock.schedule_interval(self._play, 1/rate)
+
+    @property
+    def replay(self):
+        return self._replay
+
+    @property
+    def renderer(self):
+        return self._renderer
+
+    def key_pressed(self, key):
+        return self._keys[key]
+
+    def window_center(self):
+        width, height = self._window.get_size()
+        return (width / 2, height / 2)
+
+    def _seek(self, tick):
+        ''' Go to a tick, or the nearest one in the log '''
+        log = self._replay.log
+        log.reload()
+        tick = self._replay.seek(max(log.keyframes[0][0], tick))
+        self._window.set_caption(f'hexgame replay - tick {tick}')
+
+    def _key_command(self, symbol):
+        key = pyglet.window.key
+        tick = self._replay.tick
+        if symbol == key.SPACE:
+            self._playing = not self._playing
+        elif symbol == key.PERIOD:
+            self._seek(tick + 1)
+        elif symbol == key.COMMA:
+            self._seek(tick - 1)
+        elif symbol == key.PAGEUP:
+            self._seek(tick + self._jump)
+        elif symbol == key.PAGEDOWN:
+            self._seek(tick - self._jump)
+
+    def _play(self, dt):
+        if self._playing:
+            tick = self._replay.tick
+            self._seek(tick + 1)
+            # Stop at the end of the log
+            self._playing = self._replay.tick > tick
+
+    def update(self, dt):
+        self._view_controller.update(self)
+
+    def run(self):
+        try:
+            pyglet.app.run()
+        finally:
+            self._replay.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Replay a run recorded with --record')
+    parser.add_argument(
+        'path', metavar='DIR',
+        help='Directory the run was recorded to')
+    parser.add_argument(
+        '-t', '--tick', type=int, default=None,
+        help='Tick to start at, default the first one recorded')
+    parser.add_argument(
+        '-r', '--rate', type=float, default=30,
+        help='Ticks per second when playing')
+    parser.add_argument(
+        '-v', '--verbose', action='store_true',
+        help='Verbose output')
+    return parser.parse_args()
+
+
+def replay_main():
+    args = parse_args()
+    main.init_logging(args.verbose)
+    config = pyglet.gl.Config(alpha_size=8)
+    window = pyglet.window.Window(config=config, width=1300, height=1100)
+    viewer = ReplayViewer(window, args.path, args.tick, args.rate)
+    logging.info(
+        f'Replaying {args.path} from tick {viewer.replay.tick} '
+        f'to {viewer.replay.log.end_tick()}')
+    viewer.run()
+
+
+if __name__ == '__main__':
+    replay_main()
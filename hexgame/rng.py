@@ -0,0 +1,167 @@
+import hashlib
+import random
+import struct
+
+
+# Purposes of ids derived from a parent entity
+CHILD_ID = 1
+
+_MASK = (1 << 64) - 1
+_BLOCK = struct.Struct('<QQQ')
+_VALUES_PER_BLOCK = 8
+_VALUES = struct.Struct(f'<{_VALUES_PER_BLOCK}Q')
+
+
+def mix64(z):
+    ''' The splitmix64 finalizer, a bijective scrambling of a 64 bit int '''
+    z = ((z ^ (z >> 30)) * 0xbf58476d1ce4e5b9) & _MASK
+    z = ((z ^ (z >> 27)) * 0x94d049bb133111eb) & _MASK
+    return z ^ (z >> 31)
+
+
+class Stream:
+    ''' Counter-based random stream, with the parts of random.Random we use
+
+    Values come in blocks, each a keyed hash of (tick, entity id, block
+    number), so a stream only depends on its key, tick and entity id and not
+    on how many numbers were drawn from other streams before it.
+    '''
+    __slots__ = ('_key', '_ent_id', '_tick', '_block', '_values', '_pos')
+
+    def __init__(self, key, ent_id, tick):
+        self._key = key
+        self._ent_id = ent_id & _MASK
+        self._values = None
+        self.reset(tick)
+
+    @property
+    def tick(self):
+        return self._tick
+
+    def reset(self, tick):
+        ''' Start the stream of the entity for another tick '''
+        self._tick = tick
+        self._block = 0
+        self._pos = _VALUES_PER_BLOCK
+
+    def _next(self):
+        ''' Return the next 64 bit value '''
+        pos = self._pos
+        if pos == _VALUES_PER_BLOCK:
+            message = _BLOCK.pack(self._tick & _MASK, self._ent_id, self._block)
+            digest = hashlib.blake2b(message, key=self._key).digest()
+            self._values = _VALUES.unpack(digest)
+            self._block += 1
+            pos = 0
+        self._pos = pos + 1
+        return self._values[pos]
+
+    def random(self):
+        return (self._next() >> 11) * (1.0 / (1 << 53))
+
+    def randrange(self, stop):
+        if stop <= 0:
+            raise ValueError(f'empty range for randrange({stop})')
+        return (self._next() * stop) >> 64
+
+    def randint(self, a, b):
+        return a + self.randrange(b - a + 1)
+
+    def choice(self, seq):
+        return seq[self.randrange(len(seq))]
+
+
+MODES = ['shared', 'streams', 'pool']
+
+
+class RandomSource:
+    ''' The random numbers used by entities during their updates
+
+    The mode decides where entities get them from:
+
+    shared: one random.Random, seeded with shared_seed (default seed)
+    streams: a counter-based stream per entity and tick, so the numbers
+        an entity draws don't depend on the order entities are updated
+        in. What happens still does, for example which of two creatures
+        moves into a cell first.
+    pool: one RandomPool of numbers generated by numpy in blocks, with
+        the rolls of each update taken from a block per layer, see block
+    '''
+    def __init__(self, seed=None, mode='shared', shared_seed=None):
+        if mode not in MODES:
+            raise ValueError(f'Unknown random mode: {mode}')
+        if seed is None:
+            seed = random.getrandbits(64)
+        shared_seed = seed if shared_seed is None else shared_seed
+        self._shared = random.Random(shared_seed)
+        self._key = hashlib.blake2b(str(seed).encode(), digest_size=32).digest()
+        self._id_key = int.from_bytes(self._key[:8], 'little')
+        self._mode = mode
+        self._pool = None
+        if mode == 'pool':
+            # The pool needs numpy, so only import it when asked for
+            from . import randpool
+            self._pool = randpool.RandomPool(shared_seed)
+        self._tick = 0
+
+    @property
+    def shared(self):
+        return self._shared
+
+    @property
+    def mode(self):
+        return self._mode
+
+    def start_tick(self, tick):
+        self._tick = tick
+        if self._pool is not None:
+            self._pool.start_tick()
+
+    def random_for(self, ent):
+        ''' Return the random number generator for an entity '''
+        if self._mode == 'shared':
+            return self._shared
+        if self._mode == 'pool':
+            return self._pool
+        stream = ent._stream
+        if stream is None:
+            stream = ent._stream = Stream(self._key, ent._id, self._tick)
+        elif stream.tick != self._tick:
+            stream.reset(self._tick)
+        return stream
+
+    def block(self, count):
+        ''' Return an iterator over count numbers from the pool
+
+        Returns None unless the mode is pool, the other modes draw one
+        number at a time.
+        '''
+        if self._pool is None:
+            return None
+        return iter(self._pool.take(count))
+
+    def getstate(self):
+        ''' Return the state of the generators, as JSON compatible values '''
+        version, internal, gauss = self._shared.getstate()
+        return {
+            'mode': self._mode,
+            'key': self._key.hex(),
+            'shared': [version, list(internal), gauss],
+            'pool': None if self._pool is None else self._pool.getstate(),
+        }
+
+    def setstate(self, state):
+        ''' Restore the generators from the result of getstate '''
+        if state['mode'] != self._mode:
+            raise ValueError(f'Random mode {state["mode"]} is not {self._mode}')
+        self._key = bytes.fromhex(state['key'])
+        self._id_key = int.from_bytes(self._key[:8], 'little')
+        version, internal, gauss = state['shared']
+        self._shared.setstate((version, tuple(internal), gauss))
+        if self._pool is not None:
+            self._pool.setstate(state['pool'])
+
+    def new_id(self, parent, purpose):
+        ''' Return the id for an entity created by parent this tick '''
+        base = mix64(parent._id ^ mix64(self._tick ^ self._id_key))
+        return mix64((base + purpose) & _MASK)
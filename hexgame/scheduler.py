@@ -0,0 +1,147 @@
+import contextlib
+import threading
+import time
+
+
+# Speed multipliers offered by the game, None runs as fast as possible
+SPEEDS = [1, 10, None]
+
+
+class Scheduler:
+    ''' Updates a simulation at a fixed tick rate in a background thread
+
+    rate is the number of ticks per second at speed 1. Ticks are scheduled
+    at fixed times, so a slow tick is caught up by the following ones, but
+    the scheduler falls behind rather than catching up more than max_lag
+    seconds. Readers of the world hold locked() so they only see the state
+    between ticks.
+    '''
+    def __init__(self, simulation, rate=30, speed=1, max_lag=0.25):
+        if rate <= 0:
+            raise ValueError(f'Invalid tick rate: {rate}')
+        self._sim = simulation
+        self._rate = rate
+        self._speed = speed
+        self._max_lag = max_lag
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._paused = False
+        self._steps = 0
+        self._running = False
+        self._error = None
+        self._thread = None
+
+    @property
+    def speed(self):
+        return self._speed
+
+    @property
+    def paused(self):
+        return self._paused
+
+    @property
+    def running(self):
+        return self._running
+
+    def _interval(self):
+        if self._speed is None:
+            return 0
+        return 1 / (self._rate * self._speed)
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def set_speed(self, speed):
+        ''' Set the speed multiplier, or None to run as fast as possible '''
+        if speed is not None and speed <= 0:
+            raise ValueError(f'Invalid speed: {speed}')
+        self._speed = speed
+        self._notify()
+
+    def pause(self):
+        self._paused = True
+        self._notify()
+
+    def resume(self):
+        self._paused = False
+        self._notify()
+
+    def toggle_pause(self):
+        if self._paused:
+            self.resume()
+        else:
+            self.pause()
+
+    def step(self, ticks=1):
+        ''' Run a number of ticks while paused '''
+        with self._changed:
+            self._steps += ticks
+            self._changed.notify_all()
+
+    @contextlib.contextmanager
+    def locked(self):
+        ''' Keep the simulation from updating while reading the world '''
+        with self._lock:
+            yield self._sim
+
+    def check(self):
+        ''' Raise the error that stopped the simulation thread, if any '''
+        if self._error is not None:
+            raise RuntimeError('Simulation thread failed') from self._error
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name='simulation', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        ''' Stop the thread after the tick in progress '''
+        self._running = False
+        self._notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _wait(self, timeout):
+        ''' Wait until the timeout or until the controls change '''
+        with self._changed:
+            if self._running:
+                self._changed.wait(timeout)
+
+    def _run(self):
+        next_tick = time.perf_counter()
+        try:
+            while self._running:
+                if self._paused:
+                    with self._changed:
+                        if self._steps == 0:
+                            if self._running and self._paused:
+                                self._changed.wait()
+                            next_tick = time.perf_counter()
+                            continue
+                        self._steps -= 1
+                with self._lock:
+                    self._sim.update()
+                last_tick = next_tick
+                # A change of the controls ends the wait early, so the time
+                # of the next tick is worked out again for the new speed
+                while self._running and not self._paused:
+                    interval = self._interval()
+                    if interval == 0:
+                        # Let readers waiting for the lock take it between
+                        # ticks
+                        time.sleep(0)
+                        next_tick = time.perf_counter()
+                        break
+                    now = time.perf_counter()
+                    next_tick = max(last_tick + interval, now - self._max_lag)
+                    if next_tick <= now:
+                        break
+                    self._wait(next_tick - now)
+        except Exception as e:
+            self._error = e
+            self._running = False
@@ -0,0 +1,169 @@
+import logging
+import time
+
+from . import entity
+from . import eventlog
+from . import export
+from . import instrument
+from . import parameters
+from . import rng
+from . import snapshot
+from . import stats
+from . import timingwheel
+from . import world
+from .entity import Creature, Plant
+
+
+def populate(world, include=None, params=parameters.DEFAULT):
+    ''' Add the default starting plants and creatures to a world
+
+    If include is given only cells for which it returns True are populated.
+    Cells that already have an entity are left as they are.
+    '''
+    grid = world.grid
+    radius = 20 if grid.size is None else min(20, grid.size)
+    cells = [
+        (1, Plant, grid.cell(x, y))
+        for x in range(-radius, radius+1)
+        for y in range(-radius, radius+1)
+    ] + [
+        (0, Creature, grid.cell(x, y))
+        for x in range(-1, 2)
+        for y in range(-1, 2)
+    ]
+    for layer, ent_type, cell in cells:
+        if include is None or include(cell):
+            layer = world.layer(layer)
+            # Entities signal their birth when created, so only create them
+            # for cells they can be added to
+            if layer.is_empty(cell):
+                layer.add_entity(ent_type(params=params), cell)
+
+
+class Simulation:
+    ''' The world and everything needed to update it, without any rendering
+
+    scheduling is 'every' to update every plant every tick, or 'active' to
+    only wake plants at the ticks they die or reproduce at. Both give the
+    same chances, but not the same random numbers.
+    '''
+    def __init__(self, seed=None, size=30, random_mode='shared',
+                 stats_sink=None, stats_interval=10, params=None,
+                 scheduling='every'):
+        if scheduling not in timingwheel.SCHEDULING_MODES:
+            raise ValueError(f'Unknown scheduling mode: {scheduling}')
+        self._scheduling = scheduling
+        self._world = world.World(
+            3, size, entity.FIELDS,
+            scheduled=[1] if scheduling == 'active' else ())
+        self.params = parameters.DEFAULT if params is None else params
+        self._random = rng.RandomSource(seed, random_mode)
+        self.random_for = self._random.random_for
+        self.random_block = self._random.block
+        self.new_id = self._random.new_id
+        self._stats = stats.EntityStats(self._world.layer(2))
+        self._reporter = stats.StatsReporter(stats_sink, stats_interval)
+        self._instruments = instrument.Instruments()
+        self._recorder = None
+        self._exporter = None
+        self._tick = 0
+
+    @property
+    def world(self):
+        return self._world
+
+    @property
+    def rand(self):
+        return self._random.shared
+
+    @property
+    def stats(self):
+        return self._stats
+
+    @property
+    def tick(self):
+        return self._tick
+
+    @property
+    def instruments(self):
+        return self._instruments
+
+    @property
+    def scheduling(self):
+        return self._scheduling
+
+    def populate(self):
+        ''' Add the default starting plants and creatures '''
+        populate(self._world, params=self.params)
+        entity.Entity.deliver_events()
+
+    def record(self, path, keyframe_interval=1000):
+        ''' Record the events of every tick to a directory, see eventlog
+
+        The world as it is when recording starts is the first keyframe, so
+        populate first.
+        '''
+        if self._recorder is not None:
+            raise RuntimeError('The simulation is already being recorded')
+        self._recorder = eventlog.EventRecorder(path, self, keyframe_interval)
+
+    def export(self, path, interval=10, chunk_dumps=1000):
+        ''' Dump the world every interval ticks to a directory, see export '''
+        if self._exporter is not None:
+            raise RuntimeError('The simulation is already being exported')
+        self._exporter = export.WorldExporter(
+            path, self, interval, chunk_dumps)
+
+    def save(self, path, compress=False):
+        ''' Save the world, random generators and tick to a snapshot file
+
+        With active scheduling the plants' counters are saved as of the last
+        tick, and their next wakes are drawn again when loaded.
+        '''
+        if self._scheduling == 'active':
+            for plant in self._world.layer(1).entities():
+                plant.sync(self)
+        snapshot.save(
+            path, self._world, self._tick, self._random.getstate(),
+            self._stats.getstate(), compress, self.params.to_dict())
+
+    @classmethod
+    def load(cls, path, stats_sink=None, stats_interval=10, scheduling='every'):
+        ''' Create a simulation from a snapshot file written by save '''
+        snap = snapshot.load(path)
+        random_state = snap.meta['random']
+        sim = cls(
+            size=snap.size, random_mode=random_state['mode'],
+            stats_sink=stats_sink, stats_interval=stats_interval,
+            params=parameters.Params(**snap.meta.get('params') or {}),
+            scheduling=scheduling)
+        sim._random.setstate(random_state)
+        sim._tick = snap.tick
+        ents = snap.restore(sim._world)
+        sim._stats.setstate(snap.meta['stats'], ents)
+        return sim
+
+    def close(self):
+        if self._recorder is not None:
+            self._recorder.close()
+            self._recorder = None
+        if self._exporter is not None:
+            self._exporter.close()
+            self._exporter = None
+        self._instruments.close()
+        self._stats.close()
+        self._reporter.close()
+
+    def update(self):
+        logging.debug(f'Tick {self._tick}')
+        start = time.perf_counter()
+        self._random.start_tick(self._tick)
+        self._world.update(self)
+        if self._reporter.due(self._tick):
+            self._reporter.report(self._tick, self._stats.collect())
+        self._instruments.end_tick(self._tick, time.perf_counter() - start)
+        self._tick += 1
+        if self._recorder is not None:
+            self._recorder.end_tick()
+        if self._exporter is not None:
+            self._exporter.end_tick()
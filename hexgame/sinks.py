@@ -0,0 +1,227 @@
+import array
+import csv
+import json
+import os
+import queue
+import sys
+import threading
+
+
+class Sink:
+    ''' Destination of statistics records
+
+    open is called once with the names of the values, then write is called
+    with batches of records, each a list of values in the same order.
+    All methods are called from the writer thread.
+    '''
+    def open(self, names):
+        pass
+
+    def write(self, records):
+        raise RuntimeError('Not implemented!')
+
+    def close(self):
+        pass
+
+
+class TextSink(Sink):
+    ''' Space separated values without the tick, the original output format '''
+    def __init__(self, path=None):
+        self._path = path
+        self._file = None
+
+    def open(self, names):
+        self._file = sys.stdout if self._path is None else open(self._path, 'w')
+        print(' '.join(names[1:]), file=self._file)
+
+    def write(self, records):
+        for record in records:
+            print(' '.join(str(v) for v in record[1:]), file=self._file)
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None and self._path is not None:
+            self._file.close()
+
+
+class CsvSink(Sink):
+    def __init__(self, path):
+        self._path = path
+        self._file = None
+        self._writer = None
+
+    def open(self, names):
+        self._file = open(self._path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(names)
+
+    def write(self, records):
+        self._writer.writerows(records)
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class JsonLinesSink(Sink):
+    ''' One JSON object per record and line '''
+    def __init__(self, path):
+        self._path = path
+        self._file = None
+        self._names = None
+
+    def open(self, names):
+        self._file = open(self._path, 'w')
+        self._names = names
+
+    def write(self, records):
+        self._file.writelines(
+            json.dumps(dict(zip(self._names, record))) + '\n'
+            for record in records)
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class ColumnarSink(Sink):
+    ''' A directory with one file of native 64 bit ints per value
+
+    columns.json lists the columns, which can be read with array.fromfile
+    or numpy.fromfile.
+    '''
+    TYPECODE = 'q'
+
+    def __init__(self, path):
+        self._path = path
+        self._files = []
+
+    def open(self, names):
+        os.makedirs(self._path, exist_ok=True)
+        with open(os.path.join(self._path, 'columns.json'), 'w') as f:
+            json.dump({
+                'columns': names,
+                'typecode': self.TYPECODE,
+                'byteorder': sys.byteorder,
+            }, f)
+        self._files = [
+            open(os.path.join(self._path, name + '.bin'), 'wb')
+            for name in names
+        ]
+
+    def write(self, records):
+        for index, f in enumerate(self._files):
+            column = array.array(self.TYPECODE, [r[index] for r in records])
+            column.tofile(f)
+            f.flush()
+
+    def close(self):
+        for f in self._files:
+            f.close()
+
+
+def read_columns(path):
+    ''' Read a directory written by ColumnarSink into a dict of arrays '''
+    with open(os.path.join(path, 'columns.json')) as f:
+        info = json.load(f)
+    columns = {}
+    for name in info['columns']:
+        column = array.array(info['typecode'])
+        with open(os.path.join(path, name + '.bin'), 'rb') as f:
+            column.frombytes(f.read())
+        if info['byteorder'] != sys.byteorder:
+            column.byteswap()
+        columns[name] = column
+    return columns
+
+
+SINKS = {
+    'text': TextSink,
+    'csv': CsvSink,
+    'json': JsonLinesSink,
+    'columns': ColumnarSink,
+}
+
+
+def make_sink(spec):
+    ''' Create a sink from a FORMAT[:PATH] string, like csv:stats.csv
+
+    Only the text format, which defaults to stdout, can be used without a path
+    '''
+    name, _, path = spec.partition(':')
+    if name not in SINKS:
+        raise ValueError(f'Unknown stats format: {name}')
+    if path:
+        return SINKS[name](path)
+    if name != 'text':
+        raise ValueError(f'Stats format {name} needs a path')
+    return TextSink()
+
+
+_STOP = object()
+
+
+class StatsWriter:
+    ''' Writes records to a sink from a background thread
+
+    Records are queued and written in batches, so a slow sink doesn't slow
+    down the simulation unless the queue fills up. close() waits until every
+    record has been written. Errors of the sink are raised by the next
+    write or close. what names the records in those errors.
+    '''
+    def __init__(self, sink, names, queue_size=4096, what='statistics'):
+        self._sink = sink
+        self._names = list(names)
+        self._what = what
+        self._queue = queue.Queue(queue_size)
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._run, name='stats-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def names(self):
+        return self._names
+
+    def _run(self):
+        try:
+            self._sink.open(self._names)
+        except Exception as e:
+            self._error = e
+        done = False
+        while not done:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is _STOP:
+                batch.pop()
+                done = True
+            if batch and self._error is None:
+                try:
+                    self._sink.write(batch)
+                except Exception as e:
+                    self._error = e
+        try:
+            self._sink.close()
+        except Exception as e:
+            self._error = self._error or e
+
+    def _check(self):
+        if self._error is not None:
+            raise RuntimeError(f'Writing {self._what} failed: {self._error}')
+
+    def write(self, record):
+        ''' Queue a list of values, in the order of names '''
+        self._check()
+        self._queue.put(record)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._check()
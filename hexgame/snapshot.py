@@ -0,0 +1,278 @@
+import array
+import collections
+import contextlib
+import gc
+import itertools
+import json
+import mmap
+import operator
+import struct
+import zlib
+
+from . import location
+from . import decay
+from .entity import Creature, DiseaseField, Plant
+
+
+MAGIC = b'HEXSNAP1'
+ALIGN = 8
+_HEADER_SIZE = struct.Struct('<Q')
+
+_ID_COLUMNS = [('id', '_id', 'Q'), ('cell', '_cell', 'Q')]
+_REPRODUCE_COLUMNS = [
+    ('life', '_life', 'i'),
+    ('reproduce', '_reproduce', 'i'),
+    ('max_reproduce', '_max_reproduce', 'i'),
+    ('generation', '_generation', 'i'),
+]
+
+# Columns saved for each entity type, as (name, attribute, array typecode)
+COLUMNS = {
+    'Creature': _ID_COLUMNS + _REPRODUCE_COLUMNS + [
+        ('satiation', '_satiation', 'i'),
+        ('birth_cost', '_birth_cost', 'i'),
+        ('health', '_health', 'i'),
+        ('diseased', '_diseased', 'b'),
+        ('disease_resistance', '_disease_resistance', 'i'),
+        ('disease_progression', '_disease_progression', 'i'),
+        ('cured', '_cured', 'b'),
+        ('direction', '_dir.idx', 'b'),
+    ],
+    'Plant': _ID_COLUMNS + _REPRODUCE_COLUMNS + [
+        ('diseased', '_diseased', 'b'),
+    ],
+}
+# Columns saved for fields, the cells that aren't empty and their values
+FIELD_COLUMNS = [('cell', 'Q'), ('life', 'B')]
+
+ENTITY_TYPES = {cls.__name__: cls for cls in (Creature, Plant)}
+FIELD_TYPES = {'Disease': DiseaseField}
+
+# Conversions of column values back to attribute values
+_DECODE = {
+    '_diseased': bool,
+    '_cured': bool,
+    '_dir.idx': location.Direction.dirs().__getitem__,
+}
+
+
+def _consume(iterator):
+    collections.deque(iterator, maxlen=0)
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    ''' Pause garbage collection while creating or reading many entities
+
+    The collector would otherwise scan the growing heap over and over.
+    '''
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+class Snapshot:
+    ''' A saved world, with metadata and one column per entity field '''
+    def __init__(self, meta, columns):
+        self._meta = meta
+        self._columns = columns
+
+    @property
+    def meta(self):
+        return self._meta
+
+    @property
+    def tick(self):
+        return self._meta['tick']
+
+    @property
+    def size(self):
+        return self._meta['size']
+
+    def count(self, ent_type):
+        return self._meta['tables'][ent_type]['count']
+
+    def column(self, ent_type, name):
+        ''' Return a column as a sequence of numbers
+
+        Columns of uncompressed, memory-mapped snapshots are memoryviews of
+        the file, so nothing is copied until they are used.
+        '''
+        return self._columns[ent_type][name]
+
+    def _create(self, ent_type):
+        ''' Create the saved entities of a type, a column at a time '''
+        cls = ENTITY_TYPES[ent_type]
+        # Not cls.__new__, which would take the entities from the pool one
+        # by one
+        ents = list(map(object.__new__, itertools.repeat(
+            cls, self.count(ent_type))))
+        for name, attr, _ in COLUMNS[ent_type]:
+            column = self.column(ent_type, name)
+            decode = _DECODE.get(attr)
+            if decode is not None:
+                column = map(decode, column)
+            if attr == '_dir.idx':
+                attr = '_dir'
+            _consume(map(getattr(cls, attr).__set__, ents, column))
+        # Copy what init_unsaved sets on one entity, which is the same for
+        # all of them, rather than calling it for each
+        template = object.__new__(cls)
+        template.init_unsaved()
+        for attr in cls.slot_names():
+            if hasattr(template, attr):
+                value = getattr(template, attr)
+                _consume(map(
+                    getattr(cls, attr).__set__, ents, itertools.repeat(value)))
+        return ents
+
+    def entities(self):
+        ''' Create the saved entities
+
+        Yields (layer index, entity) tuples. The entities are created
+        without calling __init__, so no birth events are signaled.
+        '''
+        with _gc_paused():
+            tables = [
+                (table['layer'], self._create(ent_type))
+                for ent_type, table in self._meta['tables'].items()
+                if ent_type in ENTITY_TYPES
+            ]
+        for layer_index, ents in tables:
+            for ent in ents:
+                yield layer_index, ent
+
+    def fields(self):
+        ''' Yield (layer index, [(cell, value)]) of the saved fields
+
+        Diseases saved as entities by older versions are read as a field,
+        their life is the value of their cell.
+        '''
+        for name, table in self._meta['tables'].items():
+            if name in FIELD_TYPES:
+                cells = self.column(name, 'cell')
+                values = self.column(name, 'life')
+                yield table['layer'], list(zip(cells, values))
+
+    def restore(self, world):
+        ''' Add the saved entities and field values to an empty world
+
+        Returns the entities
+        '''
+        ents = []
+        with _gc_paused():
+            for ent_type, table in self._meta['tables'].items():
+                if ent_type in ENTITY_TYPES:
+                    table_ents = self._create(ent_type)
+                    world.layer(table['layer']).add_entities(table_ents)
+                    ents += table_ents
+        for layer_index, cells in self.fields():
+            field = world.layer(layer_index)
+            for cell, value in cells:
+                field.put(cell, value)
+        return ents
+
+
+def save(path, world, tick, random_state=None, stats_state=None,
+         compress=False, params=None):
+    ''' Save a world to a file
+
+    Each entity field is stored as one column, aligned so that the file can
+    be memory-mapped. With compress each column is compressed with zlib.
+    '''
+    columns = []
+    tables = {}
+
+    def add_column(table, name, typecode, values):
+        # A list first, array.array adds the items of an iterator one by one
+        data = memoryview(array.array(typecode, list(values))).cast('B')
+        if compress:
+            data = zlib.compress(data, 1)
+        table['columns'].append([name, typecode, 0, len(data)])
+        columns.append(data)
+
+    field_names = {cls: name for name, cls in FIELD_TYPES.items()}
+    for layer in map(world.layer, range(world.num_layers)):
+        if isinstance(layer, decay.DecayField):
+            cells = layer.cells()
+            table = tables[field_names[type(layer)]] = {
+                'layer': layer.index, 'count': len(cells), 'columns': []}
+            field_columns = list(zip(*cells)) or [()] * len(FIELD_COLUMNS)
+            for (name, typecode), values in zip(FIELD_COLUMNS, field_columns):
+                add_column(table, name, typecode, values)
+            continue
+        layer_index = layer.index
+        layer_ents = layer.entities()
+        classes = list(dict.fromkeys(map(type, layer_ents)))
+        for cls in classes:
+            if len(classes) == 1:
+                ents = layer_ents
+            else:
+                ents = [ent for ent in layer_ents if type(ent) is cls]
+            ent_type = cls.__name__
+            table = tables[ent_type] = {
+                'layer': layer_index, 'count': len(ents), 'columns': []}
+            for name, attr, typecode in COLUMNS[ent_type]:
+                add_column(
+                    table, name, typecode, map(operator.attrgetter(attr), ents))
+
+    offset = 0
+    for table in tables.values():
+        for column in table['columns']:
+            column[2] = offset
+            offset = _align(offset + column[3])
+    meta = {
+        'tick': tick,
+        'size': world.size,
+        'compressed': compress,
+        'random': random_state,
+        'stats': stats_state,
+        'params': params,
+        'tables': tables,
+    }
+    header = json.dumps(meta).encode()
+    data_start = _align(len(MAGIC) + _HEADER_SIZE.size + len(header))
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_HEADER_SIZE.pack(len(header)))
+        f.write(header)
+        f.write(bytes(data_start - f.tell()))
+        for data in columns:
+            f.write(data)
+            f.write(bytes(_align(len(data)) - len(data)))
+
+
+def load(path, use_mmap=True):
+    ''' Read a snapshot file
+
+    Uncompressed snapshots are memory-mapped unless use_mmap is False.
+    '''
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a snapshot')
+        header_size, = _HEADER_SIZE.unpack(f.read(_HEADER_SIZE.size))
+        meta = json.loads(f.read(header_size).decode())
+        data_start = _align(len(MAGIC) + _HEADER_SIZE.size + header_size)
+        if use_mmap and not meta['compressed']:
+            data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        else:
+            f.seek(0)
+            data = memoryview(f.read())
+
+    columns = {}
+    for ent_type, table in meta['tables'].items():
+        table_columns = columns[ent_type] = {}
+        for name, typecode, offset, length in table['columns']:
+            column = data[data_start + offset:data_start + offset + length]
+            if meta['compressed']:
+                column = memoryview(zlib.decompress(column))
+            table_columns[name] = column.cast(typecode)
+    return Snapshot(meta, columns)
@@ -0,0 +1,125 @@
+import numpy as np
+
+from . import location
+from .location import X_SCALE, Y_SCALE
+
+
+# RGBA colors of the images, used for cells drawn as texels
+COLORS = {
+    'tile.png': (40, 40, 40, 255),
+    'plant.png': (40, 160, 40, 255),
+    'plant_diseased.png': (140, 120, 30, 255),
+    'creature.png': (60, 110, 230, 255),
+    'creature_diseased.png': (220, 50, 50, 255),
+    'disease.png': (150, 50, 170, 255),
+}
+# Size of a texel in world coordinates. Each cell is two texels wide, so the
+# odd rows can be offset by half a cell like they are on the grid
+TEXEL_SIZE = (X_SCALE / 2, Y_SCALE)
+
+
+def layer_state(layer):
+    ''' Return the draw order of a layer, its entities' cells and image names
+
+    The order is the order of the layer's first entity, or None if it is empty
+    '''
+    ents = layer.entities()
+    cells = np.fromiter((ent._cell for ent in ents), np.uint64, len(ents))
+    names = [ent.image_name() for ent in ents]
+    return (ents[0].order if ents else None), cells, names
+
+
+def field_state(field):
+    ''' layer_state of a DecayField, whose cells all have the field's image '''
+    cells = field.cells()
+    cells = np.fromiter((cell for cell, _ in cells), np.uint64, len(cells))
+    return (field.order if len(cells) else None), cells, [field.image] * len(cells)
+
+
+def cell_xy(grid, cells):
+    ''' Vectorized Grid.xy of an array of uint64 cells '''
+    if grid.size is None:
+        x = (cells & np.uint64(location.PACK_MASK)).astype(np.int64)
+        y = (cells >> np.uint64(location.PACK_BITS)).astype(np.int64)
+        return x - location.PACK_OFFSET, y - location.PACK_OFFSET
+    width = 2*grid.size + 1
+    y, x = np.divmod(cells.astype(np.int64), width)
+    return x - grid.size, y - grid.size
+
+
+class StateImage:
+    ''' Draws the cells of a world into an RGBA array, two texels per cell
+
+    update gathers the state of the entities, which takes time proportional
+    to their number, so it only needs to be called when the world changed.
+    render paints the cells in view with numpy.
+    '''
+    def __init__(self, colors=COLORS):
+        self._names = list(colors)
+        self._palette = np.array([(0, 0, 0, 0)] + list(colors.values()), np.uint8)
+        self._codes = {name: code for code, name in enumerate(self._names, 1)}
+        self._grid = None
+        self._layers = []
+
+    def _codes_of(self, names):
+        codes = self._codes
+        return np.fromiter(
+            (codes.get(name, 0) for name in names), np.uint8, len(names))
+
+    def update(self, world):
+        ''' Gather the positions and images of the entities of a world '''
+        states = [layer_state(layer) for layer in world.entity_layers()]
+        states += [field_state(field) for field in world.fields()]
+        states = sorted(
+            (state for state in states if state[0] is not None),
+            key=lambda state: state[0])
+        self._grid = world.grid
+        self._layers = [
+            cell_xy(self._grid, cells) + (self._codes_of(names),)
+            for _, cells, names in states
+        ]
+
+    def render(self, xy_bounds):
+        ''' Draw the cells with min_x <= x <= max_x and min_y <= y <= max_y
+
+        xy_bounds is (min_x, min_y, max_x, max_y), clipped to the grid if
+        it is bounded. Returns the image, with the lowest row first, and the
+        world coordinates of its bottom left corner.
+        '''
+        size = self._grid.size
+        if size is not None:
+            xy_bounds = [min(max(v, -size), size) for v in xy_bounds]
+        min_x, min_y, max_x, max_y = xy_bounds
+        rows = max_y - min_y + 1
+        cols = 2*(max_x - min_x + 1) + 1
+        codes = np.zeros((rows, cols), np.uint8)
+        # Texel of the left half of cell (x, y) is 2*x - y%2 - base
+        base = 2*min_x - 1
+
+        ys = np.arange(min_y, max_y + 1)
+        xs = np.arange(min_x, max_x + 1)
+        tile = self._codes.get('tile.png', 0)
+        tx, ty = np.meshgrid(xs, ys)
+        self._paint(codes, tx, ty, base, min_y, tile)
+
+        for x, y, values in self._layers:
+            inside = (x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y)
+            self._paint(
+                codes, x[inside], y[inside], base, min_y, values[inside])
+        origin = (base * TEXEL_SIZE[0], min_y * TEXEL_SIZE[1])
+        return self._palette[codes], origin
+
+    @staticmethod
+    def _paint(codes, x, y, base, min_y, values):
+        col = 2*x - (y % 2) - base
+        row = y - min_y
+        codes[row, col] = values
+        codes[row, col + 1] = values
+
+
+def view_xy_bounds(view_bounds):
+    ''' Return (min_x, min_y, max_x, max_y) of the cells in world bounds '''
+    x0, y0, x1, y1 = view_bounds
+    return (
+        int(np.floor(x0 / X_SCALE)), int(np.floor(y0 / Y_SCALE)),
+        int(np.ceil(x1 / X_SCALE)) + 1, int(np.ceil(y1 / Y_SCALE)))
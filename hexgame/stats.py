@@ -1,86 +1,177 @@
+import operator
+
 from . import entity
+from . import sinks
+from . import traits
+
+
+ENT_TYPES = ['Creature', 'Plant']
+COMMON_FIELDS = ['Count', 'Births', 'Deaths', 'Generation', 'Diseased']
+DELTA_FIELDS = ['Births', 'Deaths']
+# Diseases are a DecayField, which only counts its cells, births and deaths
+DISEASE_FIELDS = ['Count', 'Births', 'Deaths']
+MINMAX_FIELDS = {
+    'Creature': ['BirthCost', 'Resistance']
+}
+# Entity attributes of the min/max fields
+MINMAX_ATTRS = {
+    'BirthCost': 'birth_cost',
+    'Resistance': 'disease_resistance',
+}
+
+
+def stat_names():
+    ''' Names of the reported statistics, in output order '''
+    return [
+        ent_type + field
+        for ent_type in ENT_TYPES
+        for field in COMMON_FIELDS
+    ] + [
+        ent_type + minmax + field
+        for ent_type, fields in MINMAX_FIELDS.items()
+        for minmax in ['Min', 'Max']
+        for field in fields
+    ] + ['Disease' + field for field in DISEASE_FIELDS]
+
+
+def delta_stat_names():
+    ''' Names of the statistics that are reset after each report '''
+    return [
+        ent_type + field
+        for ent_type in ENT_TYPES + ['Disease']
+        for field in DELTA_FIELDS
+    ]
 
 
 class EntityStats:
-    def __init__(self):
-        ent_types = ['Creature', 'Plant']
-        common_fields = ['Count', 'Births', 'Deaths', 'Generation', 'Diseased']
-
-        self._ents = set()
-        self._delta_stats = [
-            ent_type + field
-            for ent_type in ent_types
-            for field in ['Births', 'Deaths']
-        ]
-        self._ent_minmax_fields = {
-            'Creature': [
-                ('BirthCost', lambda ent: ent.birth_cost),
-                ('Resistance', lambda ent: ent.disease_resistance)]
+    ''' Statistics of the entities, kept up to date by their events
+
+    The min/max statistics come from a TraitIndex of the values of the
+    living entities, so reporting doesn't have to look at every entity.
+    The disease statistics are the counts of the diseases DecayField, if
+    one is given.
+    '''
+    def __init__(self, diseases=None):
+        ent_types = ENT_TYPES
+        self._diseases = diseases
+
+        self._delta_stats = delta_stat_names()
+        self._stats = {stat: 0 for stat in stat_names()}
+        self._traits = {
+            ent_type: {field: traits.TraitIndex() for field in fields}
+            for ent_type, fields in MINMAX_FIELDS.items()
         }
-        stat_names = [
-            ent_type + field
-            for ent_type in ent_types
-            for field in common_fields
-        ] + [
-            ent_type + minmax + field
-            for ent_type, fields in self._ent_minmax_fields.items()
-            for minmax in ['Min', 'Max']
-            for field, _ in fields
-        ]
-        self._stats = {stat: 0 for stat in stat_names}
 
+        # Stats are only reported between ticks, so events are taken in batches
         entity.Entity.add_event_listener(
-            self._handler_births, ent_types, ['birth'])
-        entity.Entity.add_event_listener(
-            self._handler_deaths, ent_types, ['death'])
-        entity.Entity.add_event_listener(
-            self._handler_disease, ent_types, ['diseased', 'disease_cured'])
-
-    def _handler_births(self, ent, event, value):
-        self._ents.add(ent)
-        ent_type = type(ent).__name__
-        self._stats[ent_type + 'Births'] += 1
-        self._stats[ent_type + 'Count'] += 1
-        self._stats[ent_type + 'Generation'] = max(
-            self._stats[ent_type + 'Generation'], ent.generation)
-
-    def _handler_deaths(self, ent, event, value):
-        self._ents.remove(ent)
-        ent_type = type(ent).__name__
-        if ent.diseased:
-            self._stats[ent_type + 'Diseased'] -= 1
-        self._stats[ent_type + 'Deaths'] += 1
-        self._stats[ent_type + 'Count'] -= 1
-
-    def _handler_disease(self, ent, event, value):
-        ent_type = type(ent).__name__
-        if event == 'diseased':
-            self._stats[ent_type + 'Diseased'] += 1
-        else:
-            self._stats[ent_type + 'Diseased'] -= 1
-
-    def print_header(self):
-        print(' '.join(self._stats.keys()))
-
-    def print_stats(self):
-        def min_max(field_func):
-            min_val = None
-            max_val = None
-            for ent in self._ents:
-                if isinstance(ent, entity.Creature):
-                    val = field_func(ent)
-                    min_val = val if min_val is None else min(min_val, val)
-                    max_val = val if max_val is None else max(max_val, val)
-            return min_val, max_val if min_val is not None else (0, 0)
-
-        for ent_type, fields in self._ent_minmax_fields.items():
-            for field_name, field_func in fields:
-                min_val, max_val = min_max(field_func)
-                self._stats[ent_type + 'Min' + field_name] = min_val
-                self._stats[ent_type + 'Max' + field_name] = max_val
-
-        print(' '.join(str(v) for v in self._stats.values()))
-
-        # Reset 'delta' stats to 0
+            self._handler_events, ent_types,
+            ['birth', 'death', 'diseased', 'disease_cured'], batched=True)
+
+    def close(self):
+        ''' Stop listening to entity events '''
+        entity.Entity.remove_event_listener(self._handler_events)
+
+    def _add_values(self, ent):
+        ent_traits = self._traits.get(type(ent).__name__)
+        if ent_traits is not None:
+            for field, index in ent_traits.items():
+                index.add(getattr(ent, MINMAX_ATTRS[field]))
+
+    def _remove_values(self, ent):
+        ent_traits = self._traits.get(type(ent).__name__)
+        if ent_traits is not None:
+            for field, index in ent_traits.items():
+                index.remove(getattr(ent, MINMAX_ATTRS[field]))
+
+    def _handler_events(self, events):
+        stats = self._stats
+        for ent, event, value in events:
+            ent_type = type(ent).__name__
+            if event == 'birth':
+                self._add_values(ent)
+                stats[ent_type + 'Births'] += 1
+                stats[ent_type + 'Count'] += 1
+                stats[ent_type + 'Generation'] = max(
+                    stats[ent_type + 'Generation'], ent.generation)
+            elif event == 'death':
+                self._remove_values(ent)
+                if ent.diseased:
+                    stats[ent_type + 'Diseased'] -= 1
+                stats[ent_type + 'Deaths'] += 1
+                stats[ent_type + 'Count'] -= 1
+            elif event == 'diseased':
+                stats[ent_type + 'Diseased'] += 1
+            else:
+                stats[ent_type + 'Diseased'] -= 1
+
+    def trait(self, ent_type, field):
+        ''' Return the TraitIndex of the values of a min/max field
+
+        For example trait('Creature', 'BirthCost')
+        '''
+        return self._traits[ent_type][field]
+
+    def _take_disease_counts(self):
+        if self._diseases is not None:
+            births, deaths = self._diseases.take_counts()
+            self._stats['DiseaseBirths'] += births
+            self._stats['DiseaseDeaths'] += deaths
+            self._stats['DiseaseCount'] = self._diseases.count()
+
+    def getstate(self):
+        self._take_disease_counts()
+        return dict(self._stats)
+
+    def setstate(self, state, ents):
+        ''' Restore the statistics of a saved world with the given entities '''
+        self._stats.update(state)
+        for ent_traits in self._traits.values():
+            for index in ent_traits.values():
+                index.clear()
+        for ent_type, ent_traits in self._traits.items():
+            typed = [ent for ent in ents if type(ent).__name__ == ent_type]
+            for field, index in ent_traits.items():
+                index.add_all(map(
+                    operator.attrgetter(MINMAX_ATTRS[field]), typed))
+
+    def collect(self):
+        ''' Return the statistics and reset the delta stats '''
+        self._take_disease_counts()
+        for ent_type, ent_traits in self._traits.items():
+            for field, index in ent_traits.items():
+                self._stats[ent_type + 'Min' + field] = index.min()
+                self._stats[ent_type + 'Max' + field] = index.max()
+        values = dict(self._stats)
         for delta_stat in self._delta_stats:
             self._stats[delta_stat] = 0
+        return values
+
+
+class StatsReporter:
+    ''' Sends statistics to a sink every interval ticks
+
+    The sink is written by a background thread, see sinks.StatsWriter.
+    By default the statistics are printed to stdout.
+    '''
+    def __init__(self, sink=None, interval=10):
+        if interval < 1:
+            raise ValueError(f'Invalid stats interval: {interval}')
+        self._interval = interval
+        self._names = stat_names()
+        if sink is None:
+            sink = sinks.TextSink()
+        self._writer = sinks.StatsWriter(sink, ['Tick'] + self._names)
+
+    @property
+    def interval(self):
+        return self._interval
+
+    def due(self, tick):
+        return tick % self._interval == 0
+
+    def report(self, tick, values):
+        self._writer.write([tick] + [values[name] for name in self._names])
+
+    def close(self):
+        ''' Wait until every report has been written '''
+        self._writer.close()
@@ -0,0 +1,327 @@
+import argparse
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import sqlite3
+import traceback
+from concurrent.futures.process import BrokenProcessPool
+
+from . import main
+from . import parameters
+from . import simulation
+from . import sinks
+from . import stats
+
+
+def run_id(spec):
+    ''' Identifier of a run, the same for the same settings '''
+    key = json.dumps(
+        [spec['params'], spec['seed'], spec['size'], spec['ticks'],
+         spec['interval']], sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def expand_grid(grid, seeds, ticks, size=30, interval=10, base=None):
+    ''' Return a run spec for every combination of the grid values and seed
+
+    grid is {parameter name: [values]}, base holds parameters that are the
+    same for every run.
+    '''
+    names = sorted(grid)
+    specs = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(base or {})
+        params.update(zip(names, values))
+        # Check the names and values before any run starts
+        params = parameters.Params(**params).changed()
+        for seed in seeds:
+            spec = {
+                'params': params, 'seed': seed, 'size': size,
+                'ticks': ticks, 'interval': interval,
+            }
+            spec['run_id'] = run_id(spec)
+            specs.append(spec)
+    return specs
+
+
+# Queue of the messages of a worker process to the sweep, set by _init_worker
+_messages = None
+
+
+def _init_worker(messages):
+    global _messages
+    _messages = messages
+
+
+class QueueSink(sinks.Sink):
+    ''' Sends the records of a run to the sweep as they are written
+
+    The sweep stores them as they arrive, so workers don't keep the
+    statistics of their runs in memory.
+    '''
+    def __init__(self, run_id):
+        self._run_id = run_id
+
+    def open(self, names):
+        _messages.put(('open', self._run_id, names))
+
+    def write(self, records):
+        _messages.put(('write', self._run_id, records))
+
+
+def _start_run(run, spec):
+    # Lets the sweep know which runs a crashed worker could have been running
+    _messages.put(('start', spec['run_id'], None))
+    return run(spec)
+
+
+def run_one(spec):
+    ''' Run a simulation for a spec in a sweep worker, returning the run id '''
+    sink = QueueSink(spec['run_id'])
+    sim = simulation.Simulation(
+        spec['seed'], spec['size'], stats_sink=sink,
+        stats_interval=spec['interval'],
+        params=parameters.Params(**spec['params']))
+    try:
+        sim.populate()
+        for _ in range(spec['ticks']):
+            sim.update()
+    finally:
+        sim.close()
+    return spec['run_id']
+
+
+class ResultsStore:
+    ''' SQLite database of sweep runs and their statistics over time
+
+    The runs table has a row per run with its settings and status, the
+    stats table a row per report of the runs. Reports are added as they
+    arrive, so only runs with the status done have all of theirs.
+    '''
+    def __init__(self, path):
+        self._db = sqlite3.connect(path)
+        columns = ', '.join(f'"{name}" INTEGER' for name in stats.stat_names())
+        with self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS runs ('
+                'run_id TEXT PRIMARY KEY, params TEXT, seed INTEGER, '
+                'size INTEGER, ticks INTEGER, interval INTEGER, '
+                'status TEXT, error TEXT)')
+            self._db.execute(
+                f'CREATE TABLE IF NOT EXISTS stats ('
+                f'run_id TEXT, "Tick" INTEGER, {columns})')
+            self._db.execute(
+                'CREATE INDEX IF NOT EXISTS stats_run ON stats (run_id, "Tick")')
+
+    def close(self):
+        self._db.close()
+
+    def add_run(self, spec):
+        ''' Add a run as pending, unless it is already in the store '''
+        with self._db:
+            self._db.execute(
+                'INSERT OR IGNORE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, NULL)',
+                (spec['run_id'], json.dumps(spec['params'], sort_keys=True),
+                 spec['seed'], spec['size'], spec['ticks'], spec['interval'],
+                 'pending'))
+
+    def status(self, run_id):
+        row = self._db.execute(
+            'SELECT status FROM runs WHERE run_id = ?', (run_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def clear_stats(self, run_id):
+        ''' Remove the statistics of an earlier attempt at a run '''
+        with self._db:
+            self._db.execute('DELETE FROM stats WHERE run_id = ?', (run_id,))
+
+    def add_stats(self, run_id, names, records):
+        placeholders = ', '.join('?' * (len(names) + 1))
+        columns = ', '.join(f'"{name}"' for name in names)
+        with self._db:
+            self._db.executemany(
+                f'INSERT INTO stats (run_id, {columns}) VALUES ({placeholders})',
+                [(run_id, *record) for record in records])
+
+    def add_done(self, run_id):
+        ''' Mark a run done, once all its statistics have been added '''
+        with self._db:
+            self._db.execute(
+                "UPDATE runs SET status = 'done', error = NULL WHERE run_id = ?",
+                (run_id,))
+
+    def add_failure(self, run_id, status, error):
+        with self._db:
+            self._db.execute(
+                'UPDATE runs SET status = ?, error = ? WHERE run_id = ?',
+                (status, error, run_id))
+
+    def runs(self):
+        ''' Return the runs as dicts, with their parameters decoded '''
+        cursor = self._db.execute('SELECT * FROM runs ORDER BY run_id')
+        names = [column[0] for column in cursor.description]
+        runs = [dict(zip(names, row)) for row in cursor]
+        for run in runs:
+            run['params'] = json.loads(run['params'])
+        return runs
+
+    def series(self, run_id):
+        ''' Return the statistics of a run as {name: [values by tick]} '''
+        cursor = self._db.execute(
+            'SELECT * FROM stats WHERE run_id = ? ORDER BY "Tick"', (run_id,))
+        names = [column[0] for column in cursor.description][1:]
+        rows = [row[1:] for row in cursor]
+        return {name: [row[i] for row in rows] for i, name in enumerate(names)}
+
+
+class _Pool:
+    ''' Runs specs in a process pool, storing their statistics as they come
+
+    Workers send their records through a SimpleQueue, whose puts are
+    written to its pipe before they return, so the messages of a run are
+    all there by the time its result is.
+    '''
+    def __init__(self, store, run):
+        self._store = store
+        self._run = run
+        self._names = {}
+        self._started = set()
+
+    def _drain(self, messages):
+        store = self._store
+        while not messages.empty():
+            kind, run_id, value = messages.get()
+            if kind == 'start':
+                self._started.add(run_id)
+                store.clear_stats(run_id)
+            elif kind == 'open':
+                self._names[run_id] = value
+            else:
+                store.add_stats(run_id, self._names[run_id], value)
+
+    def run(self, specs, workers):
+        ''' Run the specs, returning those lost to a crashed worker
+
+        The lost specs are returned as (specs that were running, specs that
+        never started).
+        '''
+        store = self._store
+        self._started = set()
+        lost = []
+        messages = multiprocessing.SimpleQueue()
+        with concurrent.futures.ProcessPoolExecutor(
+                workers, initializer=_init_worker,
+                initargs=(messages,)) as pool:
+            futures = {}
+            for i, spec in enumerate(specs):
+                try:
+                    futures[pool.submit(_start_run, self._run, spec)] = spec
+                except BrokenProcessPool:
+                    # A worker died while the specs were being submitted
+                    lost.extend(specs[i:])
+                    break
+            waiting = set(futures)
+            while waiting:
+                done, waiting = concurrent.futures.wait(
+                    waiting, timeout=0.1,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+                self._drain(messages)
+                for future in done:
+                    spec = futures[future]
+                    run_id = spec['run_id']
+                    try:
+                        future.result()
+                    except BrokenProcessPool:
+                        lost.append(spec)
+                        continue
+                    except Exception:
+                        logging.warning(f'Run {run_id} failed')
+                        store.add_failure(
+                            run_id, 'failed', traceback.format_exc())
+                    else:
+                        store.add_done(run_id)
+                    self._started.discard(run_id)
+        self._drain(messages)
+        running = [spec for spec in lost if spec['run_id'] in self._started]
+        unstarted = [spec for spec in lost if spec['run_id'] not in self._started]
+        return running, unstarted
+
+
+def run_sweep(store_path, specs, workers=None, run=run_one):
+    ''' Run the specs that aren't done yet, storing the results as they come
+
+    Runs raising an exception are marked failed. When a worker process dies
+    the pool breaks: the runs that were running are run again one at a
+    time, so the run that crashed it is found and marked crashed, and the
+    runs that hadn't started go to a new pool. Runs that are not done,
+    including failed and crashed ones, are run again by the next sweep
+    with the same store, so an interrupted sweep can be resumed.
+    Returns the number of runs done.
+    '''
+    store = ResultsStore(store_path)
+    try:
+        for spec in specs:
+            store.add_run(spec)
+        pending = [spec for spec in specs if store.status(spec['run_id']) != 'done']
+        logging.info(
+            f'{len(specs) - len(pending)} of {len(specs)} runs already done')
+        pool = _Pool(store, run)
+        remaining = pending
+        while remaining:
+            running, remaining = pool.run(remaining, workers)
+            if not running:
+                # Nothing had started, so the pool itself is broken
+                crashed = remaining
+                remaining = []
+            else:
+                # Alone in a pool, a crash can only be caused by this run
+                crashed = [spec for spec in running if any(pool.run([spec], 1))]
+            for spec in crashed:
+                logging.warning(f'Run {spec["run_id"]} crashed its worker')
+                store.add_failure(spec['run_id'], 'crashed', 'Worker process died')
+        return sum(store.status(spec['run_id']) == 'done' for spec in pending)
+    finally:
+        store.close()
+
+
+def load_config(path):
+    ''' Read the run specs of a sweep from a JSON file
+
+    The file holds {"grid": {parameter: [values]}, "seeds": [seeds],
+    "ticks": ticks}, and optionally "size", "interval" and "base", the
+    parameters shared by all runs.
+    '''
+    with open(path) as f:
+        config = json.load(f)
+    return expand_grid(
+        config['grid'], config['seeds'], config['ticks'],
+        config.get('size', 30), config.get('interval', 10), config.get('base'))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Run simulations for a grid of parameters and seeds')
+    parser.add_argument('config', help='JSON file describing the sweep')
+    parser.add_argument('store', help='SQLite file to store the results in')
+    parser.add_argument(
+        '-w', '--workers', type=int, default=None,
+        help='Number of worker processes, default one per CPU')
+    parser.add_argument(
+        '-v', '--verbose', action='store_true',
+        help='Verbose output')
+    return parser.parse_args()
+
+
+def sweep_main():
+    args = parse_args()
+    main.init_logging(args.verbose)
+    specs = load_config(args.config)
+    done = run_sweep(args.store, specs, args.workers)
+    logging.info(f'{done} runs done')
+
+
+if __name__ == '__main__':
+    sweep_main()
@@ -0,0 +1,46 @@
+SCHEDULING_MODES = ['every', 'active']
+
+
+class TimingWheel:
+    ''' Items to be woken at future ticks, in a ring of one bucket per tick
+
+    An item due at tick t goes in bucket t % size, so adding and waking
+    items costs the same however many are waiting. Items due more than size
+    ticks ahead share a bucket with nearer ones and stay in it until their
+    lap comes around. pop must be called for every tick, in order.
+    '''
+    def __init__(self, size=1024):
+        self._buckets = [[] for _ in range(size)]
+        self._size = size
+        self._count = 0
+
+    def add(self, tick, item):
+        self._buckets[tick % self._size].append((tick, item))
+        self._count += 1
+
+    def pop(self, tick):
+        ''' Remove and return the items due at the tick, in the order added '''
+        index = tick % self._size
+        bucket = self._buckets[index]
+        if not bucket:
+            return []
+        due = [item for item_tick, item in bucket if item_tick == tick]
+        if len(due) < len(bucket):
+            self._buckets[index] = [entry for entry in bucket if entry[0] != tick]
+        else:
+            self._buckets[index] = []
+        self._count -= len(due)
+        return due
+
+    def __len__(self):
+        return self._count
+
+
+def countdown_ticks(rand, value):
+    ''' Ticks until a countdown like AliveMixin.age ends, drawn at once
+
+    The countdown goes down by one each tick, then ends if it reached zero
+    or with chance 1/value. The survival chances multiply out to every one
+    of the next value - 1 ticks being equally likely.
+    '''
+    return 1 if value <= 2 else rand.randint(1, value - 1)
@@ -0,0 +1,125 @@
+import collections
+import math
+
+
+class TraitIndex:
+    ''' Counts of the values of a non-negative integer trait
+
+    The counts are kept in a Fenwick tree indexed by value, so adding or
+    removing a value, min, max and percentiles take O(log V) time, where V
+    is the largest value seen. The mean takes O(1) time.
+    '''
+    def __init__(self, capacity=256):
+        self._capacity = 1 << max(0, capacity - 1).bit_length()
+        self._tree = [0] * (self._capacity + 1)
+        self._counts = {}
+        self._count = 0
+        self._total = 0
+
+    def __len__(self):
+        return self._count
+
+    def _grow(self, value):
+        ''' Make room for values up to value, rebuilding the tree '''
+        self._capacity = 1 << value.bit_length()
+        self._rebuild()
+
+    def _rebuild(self):
+        ''' Build the tree from the counts '''
+        tree = [0] * (self._capacity + 1)
+        for val, count in self._counts.items():
+            tree[val + 1] = count
+        for index in range(1, len(tree)):
+            parent = index + (index & -index)
+            if parent < len(tree):
+                tree[parent] += tree[index]
+        self._tree = tree
+
+    def _adjust(self, value, delta):
+        tree = self._tree
+        index = value + 1
+        while index < len(tree):
+            tree[index] += delta
+            index += index & -index
+
+    def add(self, value):
+        if value < 0:
+            raise ValueError(f'Trait values must not be negative: {value}')
+        if value >= self._capacity:
+            self._grow(value)
+        self._counts[value] = self._counts.get(value, 0) + 1
+        self._count += 1
+        self._total += value
+        self._adjust(value, 1)
+
+    def add_all(self, values):
+        ''' Add many values at once, building the tree once '''
+        added = collections.Counter(values)
+        if not added:
+            return
+        if min(added) < 0:
+            raise ValueError(f'Trait values must not be negative: {min(added)}')
+        counts = self._counts
+        for value, count in added.items():
+            counts[value] = counts.get(value, 0) + count
+            self._count += count
+            self._total += value * count
+        largest = max(added)
+        if largest >= self._capacity:
+            self._capacity = 1 << largest.bit_length()
+        self._rebuild()
+
+    def remove(self, value):
+        count = self._counts.get(value, 0)
+        if count == 0:
+            raise ValueError(f'Trait value {value} is not in the index')
+        if count == 1:
+            del self._counts[value]
+        else:
+            self._counts[value] = count - 1
+        self._count -= 1
+        self._total -= value
+        self._adjust(value, -1)
+
+    def clear(self):
+        self._tree = [0] * (self._capacity + 1)
+        self._counts = {}
+        self._count = 0
+        self._total = 0
+
+    def count(self, value):
+        return self._counts.get(value, 0)
+
+    def select(self, rank):
+        ''' Return the value with the given rank, starting at 1 for the min '''
+        if not 1 <= rank <= self._count:
+            raise IndexError(f'Rank {rank} out of range')
+        tree = self._tree
+        pos = 0
+        step = self._capacity
+        while step:
+            if pos + step < len(tree) and tree[pos + step] < rank:
+                pos += step
+                rank -= tree[pos]
+            step >>= 1
+        return pos
+
+    def min(self, default=0):
+        return self.select(1) if self._count else default
+
+    def max(self, default=0):
+        return self.select(self._count) if self._count else default
+
+    def mean(self, default=0.0):
+        return self._total / self._count if self._count else default
+
+    def percentile(self, percent, default=0):
+        ''' Return the nearest-rank percentile, percent is from 0 to 100 '''
+        if not self._count:
+            return default
+        rank = max(1, math.ceil(percent / 100 * self._count))
+        return self.select(min(rank, self._count))
+
+    def histogram(self):
+        ''' Return {value: count}, sorted by value '''
+        return dict(sorted(self._counts.items()))
@@ -1,11 +1,16 @@
 import functools
+import logging
 import pyglet
 
+from .. import viewport
+from . import resources
+
 
 class ViewGroup(pyglet.graphics.Group):
-    def __init__(self, translation=None, parent=None):
+    def __init__(self, translation=None, parent=None, scale=1):
         super().__init__(parent)
         self._translation = translation or (0, 0)
+        self._scale = scale
 
     @property
     def translation(self):
@@ -15,15 +20,28 @@ class ViewGroup(pyglet.graphics.Group):
     def translation(self, value):
         self._translation = value or (0, 0)
 
+    @property
+    def scale(self):
+        return self._scale
+
     def translate(self, xy):
         self._translation = (
             self._translation[0] + xy[0],
             self._translation[1] + xy[1]
         )
 
+    def zoom(self, factor, center):
+        ''' Scale the view by factor, keeping the window point center in place '''
+        self._translation = (
+            center[0] - (center[0] - self._translation[0]) * factor,
+            center[1] - (center[1] - self._translation[1]) * factor
+        )
+        self._scale *= factor
+
     def set_state(self):
         pyglet.gl.glPushMatrix()
         pyglet.gl.glTranslatef(self._translation[0], self._translation[1], 0)
+        pyglet.gl.glScalef(self._scale, self._scale, 1)
 
     def unset_state(self):
         pyglet.gl.glPopMatrix()
@@ -64,3 +82,199 @@ def make_sprite(image, *args, order=0, **kwargs):
     batch = state().batch
     group = state().group(order)
     return pyglet.sprite.Sprite(image, *args, batch=batch, group=group, **kwargs)
+
+
+class TileGroup(pyglet.graphics.TextureGroup):
+    ''' Texture group drawn with alpha blending, like sprites are '''
+    def set_state(self):
+        super().set_state()
+        gl = pyglet.gl
+        gl.glEnable(gl.GL_BLEND)
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+
+    def unset_state(self):
+        pyglet.gl.glDisable(pyglet.gl.GL_BLEND)
+        super().unset_state()
+
+
+class TileLayer:
+    ''' The grid tiles, as one static vertex list per chunk of cells
+
+    All chunks share a group, so the batch draws them with one call and
+    the view only has to translate them. Chunks are built when they come
+    into view and deleted when they leave it.
+    '''
+    CHUNK_SIZE = 16
+
+    def __init__(self, image_name, order=0):
+        texture = resources.image(image_name).get_texture()
+        self._group = TileGroup(texture, parent=state().group(order))
+        self._size = (texture.width, texture.height)
+        self._tex_coords = list(texture.tex_coords)
+        self._grid = None
+        self._chunks = {}
+
+    def _build(self, chunk):
+        cells = viewport.chunk_cells(self._grid, chunk, self.CHUNK_SIZE)
+        if not cells:
+            return None
+        width, height = self._size
+        vertices = []
+        for _, (x, y) in cells:
+            vertices += [x, y, x + width, y, x + width, y + height, x, y + height]
+        return state().batch.add(
+            4 * len(cells), pyglet.gl.GL_QUADS, self._group,
+            ('v2f/static', vertices),
+            ('t3f/static', self._tex_coords * len(cells)))
+
+    def sync(self, grid, view_bounds):
+        if grid is not self._grid:
+            self.clear()
+            self._grid = grid
+        wanted = set(viewport.visible_chunks(view_bounds, self.CHUNK_SIZE))
+        for chunk in self._chunks.keys() - wanted:
+            vertex_list = self._chunks.pop(chunk)
+            if vertex_list is not None:
+                vertex_list.delete()
+        for chunk in wanted - self._chunks.keys():
+            self._chunks[chunk] = self._build(chunk)
+
+    def clear(self):
+        for vertex_list in self._chunks.values():
+            if vertex_list is not None:
+                vertex_list.delete()
+        self._chunks = {}
+
+
+class StateTextureLayer:
+    ''' The entities as one texture with a texel per half cell
+
+    Used when zoomed out, where sprites would be too small to see. The
+    texture is drawn by statetexture.StateImage, which needs numpy.
+    '''
+    def __init__(self, order=0):
+        from .. import statetexture
+        self._statetexture = statetexture
+        self._state_image = statetexture.StateImage()
+        self._group = state().group(order)
+        self._sprite = None
+        self._texture = None
+        self._tick = None
+
+    def sync(self, world, view_bounds, tick=None):
+        ''' Draw the world, gathering its state again if tick changed '''
+        st = self._statetexture
+        if tick is None or tick != self._tick:
+            self._state_image.update(world)
+            self._tick = tick
+        pixels, origin = self._state_image.render(
+            st.view_xy_bounds(view_bounds))
+        height, width = pixels.shape[:2]
+        image_data = pyglet.image.ImageData(
+            width, height, 'RGBA', pixels.tobytes(), pitch=width * 4)
+        texture = self._texture
+        # The texture is only made again when the size of the view changes
+        if texture is None or (texture.width, texture.height) != (width, height):
+            texture = self._texture = pyglet.image.Texture.create(width, height)
+            gl = pyglet.gl
+            gl.glBindTexture(texture.target, texture.id)
+            gl.glTexParameteri(
+                texture.target, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
+            gl.glTexParameteri(
+                texture.target, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST)
+            if self._sprite is None:
+                self._sprite = pyglet.sprite.Sprite(
+                    texture, batch=state().batch, group=self._group)
+            else:
+                self._sprite.image = texture
+        texture.blit_into(image_data, 0, 0, 0)
+        self._sprite.update(
+            x=origin[0], y=origin[1],
+            scale_x=st.TEXEL_SIZE[0], scale_y=st.TEXEL_SIZE[1])
+        self._sprite.visible = True
+
+    def hide(self):
+        if self._sprite is not None:
+            self._sprite.visible = False
+
+
+class ViewportRenderer:
+    ''' Draws the tiles and the entities in view
+
+    Only entities in the window (plus a margin) get sprites, which are
+    reused as the view pans, so drawing doesn't depend on the size of the
+    world. The tiles are drawn by a TileLayer. Below SPRITE_SCALE the view
+    is drawn as one texture by a StateTextureLayer instead, if numpy is
+    available, down to TEXTURE_SCALE.
+    '''
+    TILE_IMAGE = 'tile.png'
+    SPRITE_SCALE = 0.5
+    # A texel is 10 pixels wide at scale 1, so at this scale a window 2000
+    # pixels wide needs a texture 4000 texels wide, within the texture size
+    # limit of most GPUs
+    TEXTURE_SCALE = 0.05
+
+    def __init__(self):
+        self._pools = {}
+        self._tiles = TileLayer(self.TILE_IMAGE)
+        self._texture = None
+
+    @property
+    def min_scale(self):
+        ''' The smallest scale the view can be drawn at '''
+        if self._texture is None:
+            try:
+                self._texture = StateTextureLayer()
+            except ImportError:
+                logging.warning('numpy is not installed, zooming out is limited')
+                self._texture = False
+        return self.TEXTURE_SCALE if self._texture else self.SPRITE_SCALE
+
+    def _pool(self, order):
+        pool = self._pools.get(order)
+        if pool is None:
+            def make(img):
+                return make_sprite(img, order=order)
+            pool = self._pools[order] = viewport.SpritePool(make)
+        return pool
+
+    def sync(self, world, width, height, tick=None):
+        ''' Update what is drawn to show the world in a window of the given size
+
+        tick identifies the state of the world, if given the world is assumed
+        not to change until it does
+        '''
+        view = state().view
+        view_bounds = viewport.bounds(width, height, view.translation, view.scale)
+        if view.scale < self.SPRITE_SCALE and self.min_scale < self.SPRITE_SCALE:
+            self._tiles.clear()
+            for pool in self._pools.values():
+                pool.show([])
+            self._texture.sync(world, view_bounds, tick)
+            return
+        if self._texture:
+            self._texture.hide()
+        self._tiles.sync(world.grid, view_bounds)
+        cells = viewport.visible_cells(world.grid, view_bounds)
+        items = {}
+        image = resources.image
+        for layer in world.entity_layers():
+            get_entity = layer.get_entity
+            for cell, (x, y) in cells:
+                ent = get_entity(cell)
+                if ent is not None:
+                    items.setdefault(ent.order, []).append(
+                        ((layer.index, cell), image(ent.image_name()), x, y))
+        for field in world.fields():
+            field_image = image(field.image)
+            field_items = [
+                ((field.index, cell), field_image, x, y)
+                for cell, (x, y) in cells
+                if field.get(cell)
+            ]
+            if field_items:
+                items.setdefault(field.order, []).extend(field_items)
+        for order in self._pools.keys() - items.keys():
+            self._pools[order].show([])
+        for order, order_items in items.items():
+            self._pool(order).show(order_items)
@@ -0,0 +1,26 @@
+import functools
+import os
+
+
+# The images are in the data directory next to the package
+DATA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'data')
+
+
+def path(name):
+    ''' Return the path of a data file, independent of the working directory '''
+    return os.path.join(DATA_DIR, name)
+
+
+@functools.lru_cache(None)
+def image(name):
+    ''' Load an image the first time it is needed, then return the same one '''
+    # Imported here so the simulation modules never need pyglet
+    import pyglet
+    return pyglet.image.load(path(name))
+
+
+def clear():
+    ''' Forget the loaded images, like when the GL context is gone '''
+    image.cache_clear()
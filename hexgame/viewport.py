@@ -0,0 +1,127 @@
+import math
+
+from .location import X_SCALE, Y_SCALE, real_pos
+
+
+# Cells this far outside the window are still given sprites, so sprites are
+# ready before they scroll into view
+MARGIN = 2 * X_SCALE
+
+
+def bounds(width, height, translation, scale=1, margin=MARGIN):
+    ''' Return the world coordinates (x0, y0, x1, y1) shown in a window
+
+    translation and scale are the offset and zoom of the view, as in
+    util.draw.ViewGroup
+    '''
+    tx, ty = translation
+    return (
+        -tx / scale - margin, -ty / scale - margin,
+        (width - tx) / scale + margin, (height - ty) / scale + margin)
+
+
+def visible_xy(view_bounds):
+    ''' Yield the (x, y) grid coordinates of the cells within the bounds '''
+    x0, y0, x1, y1 = view_bounds
+    for y in range(math.ceil(y0 / Y_SCALE), math.floor(y1 / Y_SCALE) + 1):
+        offset = (y % 2) * X_SCALE // 2
+        for x in range(math.ceil((x0 + offset) / X_SCALE),
+                       math.floor((x1 + offset) / X_SCALE) + 1):
+            yield x, y
+
+
+def visible_cells(grid, view_bounds):
+    ''' Return (cell, position) of the cells of a grid within the bounds '''
+    cells = []
+    for x, y in visible_xy(view_bounds):
+        cell = grid.cell(x, y)
+        if cell >= 0:
+            cells.append((cell, real_pos(x, y)))
+    return cells
+
+
+def visible_chunks(view_bounds, chunk_size):
+    ''' Return the (cx, cy) chunks of cells that overlap the bounds
+
+    A chunk holds the cells with chunk_size*cx <= x < chunk_size*(cx+1)
+    and the same for y.
+    '''
+    x0, y0, x1, y1 = view_bounds
+    min_x = math.floor(x0 / X_SCALE) // chunk_size
+    max_x = (math.ceil(x1 / X_SCALE) + 1) // chunk_size
+    min_y = math.floor(y0 / Y_SCALE) // chunk_size
+    max_y = math.ceil(y1 / Y_SCALE) // chunk_size
+    return [
+        (cx, cy)
+        for cy in range(min_y, max_y + 1)
+        for cx in range(min_x, max_x + 1)
+    ]
+
+
+def chunk_cells(grid, chunk, chunk_size):
+    ''' Return (cell, position) of the cells of a grid in a chunk '''
+    cx, cy = chunk
+    cells = []
+    for y in range(cy * chunk_size, (cy + 1) * chunk_size):
+        for x in range(cx * chunk_size, (cx + 1) * chunk_size):
+            cell = grid.cell(x, y)
+            if cell >= 0:
+                cells.append((cell, real_pos(x, y)))
+    return cells
+
+
+class SpritePool:
+    ''' Sprites for the things in view, recycled as the view moves
+
+    make_sprite(image) creates a sprite, which needs an image attribute,
+    a visible attribute and update(x=, y=). Sprites that are no longer
+    needed are hidden and kept for reuse instead of being deleted.
+    '''
+    def __init__(self, make_sprite):
+        self._make_sprite = make_sprite
+        self._shown = {}
+        self._free = []
+
+    def __len__(self):
+        ''' Number of sprites created, shown or not '''
+        return len(self._shown) + len(self._free)
+
+    def shown(self):
+        return len(self._shown)
+
+    def show(self, items):
+        ''' Show exactly the given (key, image, x, y) items
+
+        A key keeps its sprite while it stays in view, and the sprite is
+        only changed when its image or position changes.
+        '''
+        items = list(items)
+        old = self._shown
+        keep = {item[0] for item in items}
+        for key in [key for key in old if key not in keep]:
+            sprite = old.pop(key)[0]
+            sprite.visible = False
+            self._free.append(sprite)
+        shown = {}
+        for key, image, x, y in items:
+            entry = old.pop(key, None)
+            if entry is None:
+                if self._free:
+                    sprite = self._free.pop()
+                    sprite.image = image
+                    sprite.update(x=x, y=y)
+                    sprite.visible = True
+                else:
+                    sprite = self._make_sprite(image)
+                    sprite.update(x=x, y=y)
+                entry = [sprite, image, x, y]
+            else:
+                sprite = entry[0]
+                if entry[1] is not image:
+                    sprite.image = entry[1] = image
+                if entry[2] != x or entry[3] != y:
+                    sprite.update(x=x, y=y)
+                    entry[2] = x
+                    entry[3] = y
+            shown[key] = entry
+        self._shown = shown
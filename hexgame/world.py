@@ -1,9 +1,23 @@
+import collections
+import itertools
+import operator
+
+from . import chunks
+from . import entity
+from . import location
+from . import timingwheel
+
+
+ID_MASK = (1 << 64) - 1
+
+
 class World:
     class Layer:
-        def __init__(self, world, index):
-            self._ents = {}
+        def __init__(self, world, index, scheduled=False):
+            self._ents = chunks.ChunkedStore()
             self._world = world
             self._index = index
+            self._scheduled = scheduled
 
         @property
         def index(self):
@@ -13,59 +27,174 @@ class World:
         def world(self):
             return self._world
 
-        def get_entity(self, loc):
-            ''' Return the entity at the location, or None if there isn't one '''
-            return self._ents.get(loc)
+        def get_entity(self, cell):
+            ''' Return the entity in the cell, or None if there isn't one '''
+            return self._ents.get(cell)
 
-        def add_entity(self, ent, loc):
-            ''' Attempt to add an entity to the layer at the specific location
+        def add_entity(self, ent, cell):
+            ''' Attempt to add an entity to the layer in the specific cell
 
             Returns True if the entity was added
             '''
             assert ent._layer is None, 'Trying to add entity already in layer!'
-            added = (self._ents.setdefault(loc, ent) is ent)
+            added = (self._ents.setdefault(cell, ent) is ent)
             if added:
-                ent._loc = loc
+                if ent._id is None:
+                    # Entities not created by another entity are identified
+                    # by the cell they started in
+                    num_layers = len(self._world._layers)
+                    ent._id = (cell * num_layers + self._index) & ID_MASK
+                ent._cell = cell
                 ent._layer = self
-                ent._update_position()
+                if self._scheduled:
+                    self._world._unscheduled.append(ent)
             return added
 
-        def move_entity(self, ent, loc):
+        def add_entities(self, ents):
+            ''' Add entities that have an id to the empty cells in their cell
+
+            Used to restore saved entities, many at a time.
+            '''
+            self._ents.fill(map(operator.attrgetter('_cell'), ents), ents)
+            collections.deque(
+                map(entity.Entity._layer.__set__, ents, itertools.repeat(self)),
+                maxlen=0)
+            if self._scheduled:
+                self._world._unscheduled.extend(ents)
+
+        def move_entity(self, ent, cell):
             assert ent._layer is self, 'Trying to move entity not in layer!'
-            if self.is_empty(loc):
-                del self._ents[ent.loc]
-                self._ents[loc] = ent
-                ent._loc = loc
-                ent._update_position()
+            if cell >= 0 and self._ents.move(ent._cell, cell):
+                ent._cell = cell
+                ent.signal_event('move', cell)
                 return True
             return False
 
-        def is_empty(self, loc):
-            ''' Returns True if there is no entity at the location '''
-            size = 30
-            if not (-size <= loc.x <= size and -size <= loc.y <= size):
-                return False
-            return self.get_entity(loc) is None
+        def is_empty(self, cell):
+            ''' Returns True if the cell is on the grid and has no entity '''
+            return cell >= 0 and not self._ents.is_occupied(cell)
+
+        def occupied(self, cells):
+            ''' Return a bytearray with 1 for each of the cells with an entity '''
+            return self._ents.occupied(cells)
+
+        def free_neighbors(self, cells):
+            ''' Return, for each cell, its neighbors on the grid with no entity
+
+            The neighbors are in Direction order. All the cells are looked
+            up in one pass over the occupancy of the layer.
+            '''
+            neighbors = [
+                n for cell in cells for n in self._world._grid.neighbors(cell)]
+            flags = self._ents.occupied(neighbors)
+            return [
+                [n for n, flag in zip(neighbors[i:i+6], flags[i:i+6])
+                 if n >= 0 and not flag]
+                for i in range(0, len(neighbors), 6)
+            ]
+
+        def count_occupied_neighbors(self, cells):
+            ''' Return, for each cell, the number of its neighbors with an entity '''
+            neighbors = [
+                n for cell in cells for n in self._world._grid.neighbors(cell)]
+            flags = self._ents.occupied(neighbors)
+            return [sum(flags[i:i+6]) for i in range(0, len(flags), 6)]
 
         def remove_entity(self, ent):
             assert ent._layer is self, 'Trying to remove entity not in layer!'
-            del self._ents[ent._loc]
-            ent._loc = None
+            self._ents.pop(ent._cell)
+            ent._cell = None
             ent._layer = None
-            ent._update_position()
 
         def entities(self):
             return self._ents.values()
 
-    def __init__(self, num_layers):
-        self._layers = [World.Layer(self, i) for i in range(num_layers)]
+        def occupancy(self):
+            ''' Return a bytearray with 1 for each grid cell with an entity
+
+            Only bounded grids have a fixed number of cells to return.
+            '''
+            return self._ents.occupancy(self._world._grid.num_cells())
+
+        def count(self):
+            return len(self._ents)
+
+    def __init__(self, num_layers, size=30, fields=None, scheduled=()):
+        ''' Create a world with the given number of layers
+
+        size is the grid radius, or None for an unbounded grid. fields maps
+        layer indexes to DecayField classes, for layers that are fields
+        instead of entity layers. The entities of the scheduled layers are
+        not updated every tick, they are woken by a timing wheel when they
+        have something to do, see Plant.wake.
+        '''
+        fields = fields or {}
+        self._layers = [
+            fields[i](self, i) if i in fields
+            else World.Layer(self, i, i in scheduled)
+            for i in range(num_layers)
+        ]
+        self._fields = [self._layers[i] for i in sorted(fields)]
+        self._entity_layers = [
+            layer for layer in self._layers if layer not in self._fields]
+        self._updated_layers = [
+            layer for layer in self._entity_layers if not layer._scheduled]
+        self._wheel = timingwheel.TimingWheel() if scheduled else None
+        # Entities added to scheduled layers since the last update
+        self._unscheduled = []
+        self._grid = location.Grid(size)
+
+    @property
+    def size(self):
+        return self._grid.size
+
+    @property
+    def grid(self):
+        return self._grid
 
     def layer(self, index):
         return self._layers[index]
 
+    @property
+    def num_layers(self):
+        return len(self._layers)
+
+    def entity_layers(self):
+        return self._entity_layers
+
+    def fields(self):
+        return self._fields
+
+    def wake_at(self, ent, tick):
+        ''' Wake an entity of a scheduled layer at a later tick '''
+        self._wheel.add(tick, ent)
+
+    def _wake(self, game):
+        tick = game.tick
+        for ent in self._wheel.pop(tick):
+            # Entities that died, were reused or were rescheduled leave
+            # stale entries
+            if ent._layer is not None and ent.wake_tick == tick:
+                ent.wake(game)
+
     def update(self, game):
-        layer_ents = [(layer, list(layer.entities())) for layer in self._layers]
+        if self._unscheduled:
+            unscheduled, self._unscheduled = self._unscheduled, []
+            for ent in unscheduled:
+                # Dead entities, or ones added twice, are skipped
+                if ent._layer is not None and ent.wake_tick is None:
+                    ent.schedule(game)
+        layer_ents = [
+            (layer, list(layer.entities())) for layer in self._updated_layers]
         for layer, ents in layer_ents:
+            # In pool mode the rolls of the whole layer come from one block
+            draws = game.random_block(len(ents) * entity.UPDATE_DRAWS)
             for ent in ents:
                 if ent._layer is layer:
-                    ent.update(game)
+                    ent.update(game, draws)
+        if self._wheel is not None:
+            self._wake(game)
+        # Fields are updated after the entities, like a last layer
+        for field in self._fields:
+            field.decay()
+        entity.Entity.deliver_events()
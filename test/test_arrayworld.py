@@ -0,0 +1,39 @@
+import pytest
+
+from hexgame import location
+
+np = pytest.importorskip('numpy')
+from hexgame import arrayworld  # noqa: E402
+
+
+def test_neighbors_match_location():
+    world = arrayworld.ArrayWorld(size=3)
+    for loc in [location.Location(0, 0), location.Location(1, 1),
+                location.Location(-2, 3)]:
+        cell = world.cell(loc)
+        for dir in location.Direction.dirs():
+            neighbor = world.cell(loc.in_direction(dir))
+            assert world._neighbors[dir.idx, cell] == neighbor
+
+
+def test_stats_match_layers(capsys):
+    sim = arrayworld.ArraySimulation(seed=2)
+    sim.populate()
+    for _ in range(50):
+        sim.update()
+    stats = sim.world.stats()
+    assert stats['CreatureCount'] == sim.world.creatures.count()
+    assert stats['PlantCount'] == sim.world.plants.count()
+    assert not np.any(sim.world.creatures.occupied & (sim.world.creatures.life <= 0))
+
+
+def test_seeded_runs_match(capsys):
+    def run():
+        sim = arrayworld.ArraySimulation(seed=7)
+        sim.populate()
+        for _ in range(30):
+            sim.update()
+        world = sim.world
+        return world.plants.cells().tolist(), world.creatures.cells().tolist()
+
+    assert run() == run()
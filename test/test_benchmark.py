@@ -0,0 +1,35 @@
+import json
+
+from hexgame import benchmark
+from hexgame import entity
+
+
+def test_scenarios_run():
+    results = benchmark.run(ticks=3, memory=False)
+    assert list(results['scenarios']) == list(benchmark.SCENARIOS)
+    for result in results['scenarios'].values():
+        assert result['ticks'] == 3
+        assert result['entity_updates'] > 0
+        assert result['phases']['world_update'] > 0
+    json.dumps(results)
+    assert benchmark.format_results(results, results).count('1.00x') == 4
+
+
+def test_timing_is_removed_afterwards():
+    benchmark.run(['default'], ticks=2, memory=True)
+    sim = benchmark.make_simulation('default', 1)
+    sim.close()
+    assert 'update' not in vars(sim.world)
+    assert isinstance(vars(entity.Entity)['deliver_events'], staticmethod)
+
+
+def test_populated_counts_match_stats():
+    for name in ['outbreak', 'default']:
+        sim = benchmark.make_simulation(name, 1)
+        try:
+            values = sim.stats.collect()
+            world = sim.world
+            assert values['CreatureCount'] == world.layer(0).count()
+            assert values['PlantCount'] == world.layer(1).count()
+        finally:
+            sim.close()
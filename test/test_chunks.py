@@ -0,0 +1,85 @@
+import pytest
+
+from hexgame import chunks
+from hexgame import location
+
+
+def test_store_and_free_chunks():
+    store = chunks.ChunkedStore()
+    grid = location.Grid()
+    cells = [grid.cell(x, y) for x in (-17, -1, 0, 15, 16) for y in (-3, 40)]
+    for i, cell in enumerate(cells):
+        assert store.setdefault(cell, i) == i
+    assert store.setdefault(cells[0], 'other') == 0
+    assert len(store) == len(cells)
+    assert sorted(store.values()) == list(range(len(cells)))
+    for i, cell in enumerate(cells):
+        assert store.get(cell) == i
+        assert store.pop(cell) == i
+        assert store.get(cell) is None
+    assert len(store) == 0
+    assert store.chunk_count() == 0
+
+
+def test_unbounded_world():
+    from hexgame import world
+    unbounded = world.World(1, size=None)
+    assert unbounded.layer(0).is_empty(unbounded.grid.cell(100000, -100000))
+    bounded = world.World(1, size=30)
+    assert not bounded.layer(0).is_empty(bounded.grid.cell(100000, -100000))
+
+
+def test_move():
+    store = chunks.ChunkedStore()
+    grid = location.Grid()
+    a, b, c = grid.cell(0, 0), grid.cell(1, 0), grid.cell(300, 2)
+    store.setdefault(a, 'a')
+    store.setdefault(b, 'b')
+    assert list(store.occupied([a, c, b, -1])) == [1, 0, 1, 0]
+    assert store.is_occupied(a) and not store.is_occupied(c)
+    assert not store.move(a, b)
+    assert store.move(a, c)
+    assert list(store.occupied([a, b, c])) == [0, 1, 1]
+    assert store.get(c) == 'a' and len(store) == 2
+    # Moving the only value of a chunk within it frees and reallocates it
+    store.pop(b)
+    assert store.move(c, c + 1)
+    assert store.get(c + 1) == 'a' and store.chunk_count() == 1
+
+
+def test_neighbor_queries():
+    from hexgame import entity, world
+    w = world.World(1, size=2)
+    grid = w.grid
+    layer = w.layer(0)
+    center = grid.cell(0, 0)
+    neighbors = grid.neighbors(center)
+    layer.add_entity(entity.Entity(), neighbors[0])
+    corner = grid.cell(2, 2)
+    assert list(layer.occupied([center, neighbors[0], -1])) == [0, 1, 0]
+    free = layer.free_neighbors([center, corner])
+    assert free[0] == neighbors[1:]
+    assert free[1] == [n for n in grid.neighbors(corner) if n >= 0]
+    assert layer.count_occupied_neighbors([center, corner, neighbors[3]]) == [
+        1, 0, 0]
+
+
+def test_occupancy():
+    store = chunks.ChunkedStore()
+    cells = [3, chunks.CHUNK_SIZE + 1, 3 * chunks.CHUNK_SIZE]
+    for cell in cells:
+        store.setdefault(cell, 'x')
+    size = 2 * chunks.CHUNK_SIZE
+    flags = store.occupancy(size)
+    assert len(flags) == size
+    assert [i for i, flag in enumerate(flags) if flag] == cells[:2]
+
+
+def test_fill():
+    store = chunks.ChunkedStore()
+    cells = [5, 6, chunks.CHUNK_SIZE + 2, 7]
+    store.fill(cells, ['a', 'b', 'c', 'd'])
+    assert [store.get(cell) for cell in cells] == ['a', 'b', 'c', 'd']
+    assert len(store) == 4 and store.chunk_count() == 2
+    with pytest.raises(ValueError):
+        store.fill([8, 6], ['e', 'f'])
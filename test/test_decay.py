@@ -0,0 +1,86 @@
+import pytest
+
+from hexgame import benchmark
+from hexgame import decay
+from hexgame import entity
+from hexgame import parameters
+from hexgame import simulation
+from hexgame import sinks
+from hexgame import world
+
+
+def test_countdown():
+    w = world.World(1, size=None)
+    field = decay.DecayField(w, 0)
+    cells = [w.grid.cell(x, 0) for x in (0, 1, 300)]
+    assert field.add(cells[0], 2)
+    assert not field.add(cells[0], 5)
+    assert field.add(cells[1], 1)
+    field.put(cells[2], 1)
+    assert field.count() == 3
+    assert [field.get(cell) for cell in cells] == [3, 2, 1]
+    # The decay of the tick a cell was added in doesn't age it
+    field.decay()
+    assert sorted(field.cells()) == [(cells[0], 2), (cells[1], 1)]
+    field.kill(cells[1])
+    field.kill(cells[1])
+    field.decay()
+    field.decay()
+    assert field.count() == 0 and field.cells() == []
+    assert field.is_empty(cells[0]) and not field.is_empty(-1)
+    # put doesn't count as a birth, kill and decays count as deaths
+    assert field.take_counts() == (2, 3)
+    assert field.take_counts() == (0, 0)
+
+
+class ListSink(sinks.Sink):
+    def open(self, names):
+        self.names = names
+        self.records = []
+
+    def write(self, records):
+        self.records.extend(records)
+
+
+def test_diseases_in_stats(tmp_path):
+    sink = ListSink()
+    sim = simulation.Simulation(3, size=6, stats_sink=sink, stats_interval=1)
+    try:
+        for x in range(-4, 5, 2):
+            creature = entity.Creature()
+            creature._diseased = True
+            sim.world.layer(0).add_entity(creature, sim.world.grid.cell(x, 0))
+        entity.Entity.deliver_events()
+        for _ in range(20):
+            sim.update()
+        path = tmp_path / 'world.snap'
+        sim.save(path)
+    finally:
+        sim.close()
+    diseases = sim.world.layer(2)
+    rows = [dict(zip(sink.names, record)) for record in sink.records]
+    births = sum(row['DiseaseBirths'] for row in rows)
+    deaths = sum(row['DiseaseDeaths'] for row in rows)
+    assert births > 0 and deaths > 0
+    assert births - deaths == rows[-1]['DiseaseCount'] == diseases.count()
+
+    restored = simulation.Simulation.load(path)
+    restored.close()
+    assert sorted(restored.world.layer(2).cells()) == sorted(diseases.cells())
+
+
+def test_longest_disease_life():
+    with pytest.raises(ValueError):
+        parameters.Params(disease_life=255)
+    params = parameters.Params(disease_life=254)
+    size, populate, _ = benchmark.SCENARIOS['outbreak']
+    sim = simulation.Simulation(
+        3, size, stats_sink=benchmark.NullSink(), params=params)
+    try:
+        populate(sim.world)
+        entity.Entity.deliver_events()
+        for _ in range(20):
+            sim.update()
+        assert max(value for _, value in sim.world.layer(2).cells()) == 254
+    finally:
+        sim.close()
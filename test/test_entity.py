@@ -0,0 +1,71 @@
+from hexgame import entity
+
+
+def test_dispatch_follows_listener_changes():
+    events = []
+
+    def listener(ent, event, value):
+        events.append((type(ent).__name__, event))
+
+    entity.Entity.add_event_listener(listener, ['Plant'], ['birth'])
+    try:
+        entity.Plant()
+        entity.Creature()
+        entity.Entity.add_event_listener(listener, ['Creature'])
+        entity.Creature()
+    finally:
+        entity.Entity.remove_event_listener(listener)
+    entity.Plant()
+    assert events == [('Plant', 'birth'), ('Creature', 'birth')]
+
+
+def test_batched_events():
+    batches = []
+    entity.Entity.add_event_listener(
+        batches.append, ['Plant'], ['birth', 'diseased'], batched=True)
+    try:
+        plants = [entity.Plant(), entity.Plant(diseased=True)]
+        assert batches == []
+        entity.Entity.deliver_events()
+        entity.Entity.deliver_events()
+    finally:
+        entity.Entity.remove_event_listener(batches.append)
+    assert batches == [[
+        (plants[0], 'birth', None),
+        (plants[1], 'birth', None),
+        (plants[1], 'diseased', None),
+    ]]
+
+
+def test_dead_entities_are_reused_after_delivery():
+    from hexgame import world
+    entity.Entity.clear_pool()
+    w = world.World(3, size=2)
+    deaths = []
+    entity.Entity.add_event_listener(
+        deaths.append, ['Plant'], ['death'], batched=True)
+    try:
+        plant = entity.Plant(diseased=True, generation=5)
+        w.layer(1).add_entity(plant, w.grid.cell(0, 0))
+        plant.die()
+        # Not reused before the listeners saw the death
+        assert entity.Plant() is not plant
+        entity.Entity.deliver_events()
+        assert deaths == [[(plant, 'death', None)]]
+        reused = entity.Plant()
+        assert reused is plant
+        assert not reused.diseased and reused.generation == 1
+        assert reused.layer is None and reused.id is None
+        assert entity.Creature() is not plant
+    finally:
+        entity.Entity.remove_event_listener(deaths.append)
+        entity.Entity.clear_pool()
+
+
+def test_entities_have_slots():
+    import pickle
+    creature = entity.Creature(disease_resistance=7)
+    assert not hasattr(creature, '__dict__')
+    copy = pickle.loads(pickle.dumps(creature))
+    assert copy.__getstate__() == creature.__getstate__()
+    assert copy.disease_resistance == 7
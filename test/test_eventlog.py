@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from hexgame import benchmark
+from hexgame import entity
+from hexgame import eventlog
+from hexgame import headless
+from hexgame import simulation
+
+
+def world_state(world):
+    ents = sorted(
+        (layer.index, ent.cell, type(ent).__name__, ent.diseased)
+        for layer in world.entity_layers()
+        for ent in layer.entities())
+    return ents, sorted(world.layer(2).cells())
+
+
+def record(path, scenario, ticks, keyframe_interval):
+    size, populate, _ = benchmark.SCENARIOS[scenario]
+    sim = simulation.Simulation(3, size, stats_sink=benchmark.NullSink())
+    try:
+        populate(sim.world)
+        entity.Entity.deliver_events()
+        sim.record(path, keyframe_interval)
+        states = {sim.tick: world_state(sim.world)}
+        for _ in range(ticks):
+            sim.update()
+            states[sim.tick] = world_state(sim.world)
+    finally:
+        sim.close()
+    return states
+
+
+def test_replay_seeks_to_recorded_states(tmp_path):
+    states = record(tmp_path, 'outbreak', 60, 16)
+    assert any(fields for _, fields in states.values())
+    replay = eventlog.Replay(tmp_path)
+    try:
+        assert replay.log.keyframes[-1][0] == 48
+        assert replay.log.end_tick() == 60
+        for tick in [0, 1, 17, 60, 5, 33, 32, 59]:
+            assert replay.seek(tick) == tick
+            assert world_state(replay.world) == states[tick]
+        assert replay.seek(100) == 60
+        assert not replay.step()
+    finally:
+        replay.close()
+
+
+def test_keyframes_load_as_simulations(tmp_path):
+    states = record(tmp_path, 'default', 20, 10)
+    sim = simulation.Simulation.load(eventlog.keyframe_path(tmp_path, 10))
+    try:
+        assert sim.tick == 10
+        assert world_state(sim.world) == states[10]
+    finally:
+        sim.close()
+
+
+def test_headless_record(tmp_path):
+    path = os.path.join(tmp_path, 'log')
+    headless.run(15, seed=2, record=path, keyframe_interval=5)
+    log = eventlog.EventLog(path)
+    try:
+        assert [tick for tick, _ in log.keyframes] == [0, 5, 10, 15]
+        assert log.end_tick() == 15
+    finally:
+        log.close()
+    with pytest.raises(ValueError):
+        headless.run(5, seed=2, workers=2, record=path)
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from hexgame import benchmark
+from hexgame import entity
+from hexgame import export
+from hexgame import headless
+from hexgame import simulation
+
+np = pytest.importorskip('numpy')
+
+
+def test_npy_writer_rows_are_readable(tmp_path):
+    path = os.path.join(tmp_path, 'rows.npy')
+    writer = export.NpyWriter(path, export.npy_descr('i'), (2,))
+    assert np.load(path).shape == (0, 2)
+    writer.append(np.array([[1, -2], [3, 4]], dtype='=i4').tobytes(), 2)
+    writer.flush()
+    assert np.load(path, mmap_mode='r').tolist() == [[1, -2], [3, 4]]
+    writer.append(np.array([5, 6], dtype='=i4').tobytes())
+    writer.close()
+    assert np.load(path)[-1].tolist() == [5, 6]
+
+
+def test_export_dumps_the_world(tmp_path):
+    size, populate, _ = benchmark.SCENARIOS['outbreak']
+    sim = simulation.Simulation(3, size, stats_sink=benchmark.NullSink())
+    try:
+        populate(sim.world)
+        entity.Entity.deliver_events()
+        sim.export(tmp_path, interval=4, chunk_dumps=5)
+        for _ in range(20):
+            sim.update()
+            if sim.tick == 12:
+                world = sim.world
+                plants = world.layer(1).occupancy()
+                diseases = sorted(world.layer(2).cells())
+                creatures = sorted(
+                    (ent.id, ent.cell, ent.diseased)
+                    for ent in world.layer(0).entities())
+    finally:
+        sim.close()
+    chunks = list(export.read_chunks(tmp_path))
+    assert [chunk['ticks'].tolist() for chunk in chunks] == [
+        [0, 4, 8, 12, 16], [20]]
+    chunk = chunks[0]
+    width = 2*size + 1
+    assert chunk['layer1'].shape == (5, width, width)
+    assert chunk['layer1'][3].tobytes() == bytes(plants)
+    layer2 = chunk['layer2'][3].ravel().tolist()
+    assert [
+        (cell, value) for cell, value in enumerate(layer2) if value] == diseases
+    dumped = chunk['creature_tick'] == 12
+    assert sorted(zip(
+        chunk['creature_id'][dumped].tolist(),
+        chunk['creature_cell'][dumped].tolist(),
+        chunk['creature_diseased'][dumped].astype(bool).tolist())) == creatures
+
+
+def test_export_needs_a_bounded_grid(tmp_path):
+    with pytest.raises(ValueError):
+        headless.run(1, seed=1, size=None, export=str(tmp_path))
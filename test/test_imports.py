@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from hexgame.util import resources
+
+
+def _imported(modules):
+    code = (
+        f'import sys\n'
+        f'import {", ".join(modules)}\n'
+        f'print(" ".join(sorted(sys.modules)))\n')
+    return subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True,
+        check=True).stdout.split()
+
+
+def test_rules_import_without_pyglet():
+    imported = _imported([
+        'hexgame.location', 'hexgame.world', 'hexgame.entity',
+        'hexgame.simulation', 'hexgame.util'])
+    for module in ['pyglet', 'numpy', 'argparse', 'cProfile']:
+        assert module not in imported
+
+
+def test_resources_path():
+    statetexture = pytest.importorskip('hexgame.statetexture')
+    for name in statetexture.COLORS:
+        assert os.path.isfile(resources.path(name))
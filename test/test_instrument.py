@@ -0,0 +1,72 @@
+import json
+import pstats
+
+import pytest
+
+from hexgame import entity
+from hexgame import headless
+from hexgame import simulation
+
+
+def test_records_per_tick(tmp_path):
+    path = tmp_path / 'ticks.json'
+    sim = simulation.Simulation(1)
+    try:
+        sim.populate()
+        sim.instruments.enable(str(path))
+        for _ in range(5):
+            sim.update()
+        sim.instruments.disable()
+        sim.update()
+    finally:
+        sim.close()
+    records = sim.instruments.buffer
+    assert [record['tick'] for record in records] == [0, 1, 2, 3, 4]
+    phases = records[0]['phases']
+    assert phases['Plant.update'][0] == 41 * 41
+    assert phases['Creature.update'][0] == 9
+    with open(path) as f:
+        assert [json.loads(line) for line in f] == list(records)
+    assert sim.instruments.totals()['Creature.update'][0] == sum(
+        record['phases']['Creature.update'][0] for record in records)
+
+
+def test_disable_restores_methods():
+    originals = {
+        cls: dict(vars(cls))
+        for cls in (entity.Creature, entity.Plant, entity.DiseaseField)
+    }
+    sim = simulation.Simulation(1)
+    sim.instruments.enable()
+    assert vars(entity.Plant)['die'] is not entity.Entity.die
+    other = simulation.Simulation(2)
+    with pytest.raises(RuntimeError):
+        other.instruments.enable()
+    other.close()
+    sim.close()
+    for cls, attrs in originals.items():
+        assert dict(vars(cls)) == attrs
+
+
+def test_headless_profile(tmp_path):
+    path = tmp_path / 'run.prof'
+    headless.run(3, seed=1, profile=str(path))
+    functions = pstats.Stats(str(path)).stats
+    assert any(name == 'update' for _, _, name in functions)
+
+
+def test_active_scheduling_phases():
+    sim = simulation.Simulation(1, scheduling='active')
+    try:
+        sim.populate()
+        sim.instruments.enable()
+        for _ in range(30):
+            sim.update()
+    finally:
+        sim.close()
+    totals = sim.instruments.totals()
+    assert 'Plant.update' not in totals
+    wakes = totals['Plant.wake'][0]
+    reproductions = totals['Plant.reproduce'][0]
+    assert 0 < reproductions <= wakes
+    assert totals['Plant.wake'][1] >= totals['Plant.reproduce'][1]
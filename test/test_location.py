@@ -27,3 +27,28 @@ def test_odd_location():
     start = location.Location(0, 1)
     for dir, loc in locs:
         assert start.in_direction(dir) == loc
+
+
+def test_grid_neighbors():
+    table_grid = location.Grid(5)
+    unbounded_grid = location.Grid()
+    for x in range(-5, 6):
+        for y in range(-5, 6):
+            loc = location.Location(x, y)
+            for dir in location.Direction.dirs():
+                neighbor = loc.in_direction(dir)
+                cell = table_grid.neighbor(table_grid.cell_at(loc), dir.idx)
+                assert cell == table_grid.cell_at(neighbor)
+                assert cell == table_grid._bounded_neighbor(
+                    table_grid.cell_at(loc), dir.idx)
+                if cell != -1:
+                    assert table_grid.location(cell) == neighbor
+                cell = unbounded_grid.neighbor(unbounded_grid.cell_at(loc), dir.idx)
+                assert unbounded_grid.location(cell) == neighbor
+
+
+def test_grid_bounds():
+    grid = location.Grid(5)
+    assert grid.cell(6, 0) == -1
+    assert grid.neighbor(grid.cell(5, 0), location.Direction.E.idx) == -1
+    assert grid.num_cells() == 121
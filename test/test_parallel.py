@@ -0,0 +1,25 @@
+from hexgame import parallel
+
+
+def run(seed, workers, ticks=31):
+    sim = parallel.PartitionedSimulation(seed=seed, size=10, workers=workers)
+    try:
+        sim.populate()
+        for _ in range(ticks):
+            sim.update()
+        return sim.cells(), sim.stats
+    finally:
+        sim.close()
+
+
+def test_deterministic(capsys):
+    assert run(4, 3) == run(4, 3)
+
+
+def test_stats_match_cells(capsys):
+    cells, stats = run(4, 3)
+    assert stats['PlantCount'] == sum(1 for cell in cells if cell[2] == 'Plant')
+    assert stats['CreatureCount'] == sum(
+        1 for cell in cells if cell[2] == 'Creature')
+    assert stats['DiseaseCount'] == sum(
+        1 for cell in cells if cell[2] == 'Disease')
@@ -0,0 +1,26 @@
+import pytest
+
+from hexgame import parameters
+
+
+def test_values_are_checked():
+    params = parameters.Params(plant_max_life=2.0, creature_cure_chance=1)
+    assert params.plant_max_life == 2
+    assert type(params.creature_cure_chance) is float
+    for values in [
+            {'plant_max_life': 1.5},
+            {'plant_max_life': 0},
+            {'creature_cure_chance': 1.5},
+            {'plant_disease_chance': -0.1},
+            {'creature_disease_resistance': 101},
+            {'disease_life': -3}]:
+        with pytest.raises(ValueError):
+            parameters.Params(**values)
+
+
+def test_param_value():
+    import argparse
+    assert parameters.param_value('disease_life=5') == ('disease_life', 5)
+    for text in ['disease_life=1.5', 'disease_life=0', 'nothing=1']:
+        with pytest.raises(argparse.ArgumentTypeError):
+            parameters.param_value(text)
@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip('numpy')
+from hexgame import entity  # noqa: E402
+from hexgame import randpool  # noqa: E402
+from hexgame import simulation  # noqa: E402
+
+
+def test_pool_ranges():
+    pool = randpool.RandomPool(1, block_size=100)
+    values = [pool.randint(-2, 2) for _ in range(1000)]
+    assert set(values) == {-2, -1, 0, 1, 2}
+    assert all(pool.randrange(1) == 0 for _ in range(100))
+    assert len(pool.take(500)) == 500
+
+
+def test_pool_refills_before_tick():
+    pool = randpool.RandomPool(1, block_size=100)
+    pool.start_tick()
+    for _ in range(90):
+        pool.random()
+    pool.start_tick()
+    values = pool._values
+    for _ in range(90):
+        pool.random()
+    assert pool._values is values
+
+
+def test_simulation_with_pool(capsys):
+    def run():
+        sim = simulation.Simulation(3, random_mode='pool')
+        sim.populate()
+        for _ in range(20):
+            sim.update()
+        sim.close()
+        return sorted(ent.cell for ent in sim.world.layer(1).entities())
+
+    assert run() == run()
+
+
+def test_updates_take_blocks(capsys):
+    sim = simulation.Simulation(3, random_mode='pool')
+    try:
+        sim.populate()
+        updates = sum(layer.count() for layer in sim.world.entity_layers())
+        sim.update()
+        pool = sim._random._pool
+        assert pool._pos >= updates * entity.UPDATE_DRAWS
+    finally:
+        sim.close()
@@ -0,0 +1,39 @@
+from hexgame import rng
+
+
+class FakeEntity:
+    def __init__(self, ent_id):
+        self._id = ent_id
+        self._stream = None
+
+
+def test_streams_ignore_draw_order():
+    def draws(source, ents):
+        return {ent._id: [source.random_for(ent).randrange(1000) for _ in range(10)]
+                for ent in ents}
+
+    source = rng.RandomSource(seed=3, mode='streams')
+    source.start_tick(5)
+    forward = draws(source, [FakeEntity(i) for i in range(10)])
+    source = rng.RandomSource(seed=3, mode='streams')
+    source.start_tick(5)
+    backward = draws(source, [FakeEntity(i) for i in reversed(range(10))])
+    assert forward == backward
+    assert forward[0] != forward[1]
+
+
+def test_streams_change_each_tick():
+    source = rng.RandomSource(seed=3, mode='streams')
+    ent = FakeEntity(1)
+    first = source.random_for(ent).random()
+    source.start_tick(1)
+    assert source.random_for(ent).random() != first
+    source.start_tick(0)
+    assert source.random_for(ent).random() == first
+
+
+def test_stream_ranges():
+    stream = rng.Stream(b'key', 1, 0)
+    values = [stream.randint(-2, 2) for _ in range(1000)]
+    assert set(values) == {-2, -1, 0, 1, 2}
+    assert all(0 <= stream.random() < 1 for _ in range(1000))
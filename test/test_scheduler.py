@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from hexgame import scheduler
+
+
+class CountingSimulation:
+    def __init__(self, fail_at=None):
+        self.tick = 0
+        self._fail_at = fail_at
+
+    def update(self):
+        if self.tick == self._fail_at:
+            raise ValueError('tick failed')
+        self.tick += 1
+
+
+def wait_for(condition, timeout=5):
+    end = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < end:
+        time.sleep(0.001)
+    return condition()
+
+
+def test_pause_and_step():
+    sim = CountingSimulation()
+    sched = scheduler.Scheduler(sim, rate=1000, speed=None)
+    sched.pause()
+    sched.start()
+    try:
+        sched.step(3)
+        assert wait_for(lambda: sim.tick == 3)
+        time.sleep(0.01)
+        with sched.locked():
+            assert sim.tick == 3
+        sched.resume()
+        assert wait_for(lambda: sim.tick > 100)
+    finally:
+        sched.stop()
+    assert not sched.running
+
+
+def test_fixed_rate():
+    sim = CountingSimulation()
+    sched = scheduler.Scheduler(sim, rate=100)
+    sched.start()
+    time.sleep(0.2)
+    sched.stop()
+    assert 5 <= sim.tick <= 30
+
+
+def test_changes_dont_add_ticks():
+    sim = CountingSimulation()
+    sched = scheduler.Scheduler(sim, rate=10)
+    sched.start()
+    try:
+        end = time.perf_counter() + 0.25
+        while time.perf_counter() < end:
+            sched.set_speed(1)
+            time.sleep(0.005)
+    finally:
+        sched.stop()
+    assert 1 <= sim.tick <= 4
+
+
+def test_errors_are_raised():
+    sched = scheduler.Scheduler(CountingSimulation(fail_at=2), speed=None)
+    sched.start()
+    assert wait_for(lambda: not sched.running)
+    sched.stop()
+    with pytest.raises(RuntimeError):
+        sched.check()
@@ -0,0 +1,23 @@
+from hexgame import headless
+from hexgame import simulation
+
+
+def test_headless_run():
+    sim = headless.run(20, seed=1)
+    assert sim.tick == 20
+    assert sim.world.layer(1).count() > 0
+
+
+def test_seeded_runs_match():
+    def run(seed):
+        sim = simulation.Simulation(seed)
+        sim.populate()
+        for _ in range(30):
+            sim.update()
+        sim.close()
+        return sorted(
+            (repr(ent.loc), layer.index)
+            for layer in sim.world.entity_layers()
+            for ent in layer.entities()), sim.world.layer(2).cells()
+
+    assert run(5) == run(5)
@@ -0,0 +1,56 @@
+import pytest
+
+from hexgame import headless
+from hexgame import simulation
+from hexgame import snapshot
+
+
+def entity_states(sim):
+    skip = {'_layer', '_stream'}
+    return sorted(
+        (layer, repr(sorted(
+            (name, value) for name, value in ent.__getstate__().items()
+            if name not in skip)))
+        for layer in range(2)
+        for ent in sim.world.layer(layer).entities()) + [
+            (2, sorted(sim.world.layer(2).cells()))]
+
+
+@pytest.mark.parametrize('compress', [False, True])
+@pytest.mark.parametrize('random_mode', ['shared', 'streams'])
+def test_restored_run_matches(tmp_path, capsys, compress, random_mode):
+    path = tmp_path / 'world.snap'
+    sim = simulation.Simulation(4, random_mode=random_mode)
+    sim.populate()
+    for _ in range(50):
+        sim.update()
+    sim.save(path, compress)
+    for _ in range(30):
+        sim.update()
+    sim.close()
+
+    restored = simulation.Simulation.load(path)
+    for _ in range(30):
+        restored.update()
+    restored.close()
+    assert restored.tick == sim.tick
+    assert entity_states(restored) == entity_states(sim)
+    assert restored.stats.getstate() == sim.stats.getstate()
+
+
+def test_columns_are_mapped(tmp_path, capsys):
+    path = tmp_path / 'world.snap'
+    sim = simulation.Simulation(4)
+    sim.populate()
+    sim.save(path)
+    sim.close()
+    snap = snapshot.load(path)
+    cells = snap.column('Plant', 'cell')
+    assert isinstance(cells, memoryview)
+    assert len(cells) == snap.count('Plant') == sim.world.layer(1).count()
+    assert sorted(cells) == sorted(ent.cell for ent in sim.world.layer(1).entities())
+
+
+def test_headless_save_needs_the_object_engine(tmp_path):
+    with pytest.raises(ValueError):
+        headless.run(1, seed=1, workers=2, save=str(tmp_path / 'world.snap'))
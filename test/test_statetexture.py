@@ -0,0 +1,50 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+from hexgame import entity  # noqa: E402
+from hexgame import location  # noqa: E402
+from hexgame import statetexture  # noqa: E402
+from hexgame import world  # noqa: E402
+
+
+def texel_color(pixels, origin, x, y):
+    ''' Color of the texel under the centre of cell (x, y) '''
+    px, py = location.real_pos(x, y)
+    col = int((px - origin[0]) // statetexture.TEXEL_SIZE[0])
+    row = int(round((py - origin[1]) / statetexture.TEXEL_SIZE[1]))
+    return tuple(pixels[row, col + 1])
+
+
+@pytest.mark.parametrize('size', [5, None])
+def test_cells_are_drawn(size):
+    w = world.World(3, size)
+    grid = w.grid
+    w.layer(1).add_entity(entity.Plant(), grid.cell(0, 0))
+    w.layer(1).add_entity(entity.Plant(diseased=True), grid.cell(1, 1))
+    w.layer(0).add_entity(entity.Creature(), grid.cell(1, 1))
+    w.layer(1).add_entity(entity.Plant(), grid.cell(-2, -3))
+
+    image = statetexture.StateImage()
+    image.update(w)
+    pixels, origin = image.render((-2, -2, 3, 2))
+    colors = statetexture.COLORS
+    assert pixels.shape == (5, 13, 4)
+    assert texel_color(pixels, origin, 0, 0) == colors['plant.png']
+    assert texel_color(pixels, origin, 1, 1) == colors['creature.png']
+    assert texel_color(pixels, origin, -1, 1) == colors['tile.png']
+    assert texel_color(pixels, origin, -1, -2) == colors['tile.png']
+    assert (pixels == colors['plant.png']).all(axis=2).sum() == 2
+
+
+def test_render_is_clipped_to_the_grid():
+    w = world.World(3, 1)
+    image = statetexture.StateImage()
+    image.update(w)
+    pixels, origin = image.render((-300, -300, 300, 300))
+    assert pixels.shape == (3, 7, 4)
+    assert texel_color(pixels, origin, 1, -1) == statetexture.COLORS['tile.png']
+    assert texel_color(pixels, origin, -1, 1) == statetexture.COLORS['tile.png']
+    # The half texels beside the offset rows are off the grid
+    assert pixels[1, 0, 3] == 0 and pixels[0, -1, 3] == 0
+    pixels, _ = image.render((5, 5, 9, 9))
+    assert pixels.shape == (1, 3, 4)
@@ -0,0 +1,76 @@
+import collections
+import csv
+import json
+
+import pytest
+
+from hexgame import sinks
+from hexgame import simulation
+from hexgame import stats
+
+
+def run(sink, ticks=25, interval=5):
+    sim = simulation.Simulation(2, stats_sink=sink, stats_interval=interval)
+    try:
+        sim.populate()
+        for _ in range(ticks):
+            sim.update()
+    finally:
+        sim.close()
+    return sim
+
+
+def test_csv_sink(tmp_path):
+    path = tmp_path / 'stats.csv'
+    run(sinks.make_sink(f'csv:{path}'))
+    with open(path) as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['Tick'] + stats.stat_names()
+    assert [int(row[0]) for row in rows[1:]] == [0, 5, 10, 15, 20]
+
+
+def test_sinks_write_the_same_records(tmp_path):
+    run(sinks.make_sink(f'json:{tmp_path / "stats.json"}'))
+    run(sinks.make_sink(f'columns:{tmp_path / "columns"}'))
+    with open(tmp_path / 'stats.json') as f:
+        records = [json.loads(line) for line in f]
+    columns = sinks.read_columns(tmp_path / 'columns')
+    assert list(columns) == list(records[0])
+    for name, column in columns.items():
+        assert list(column) == [record[name] for record in records]
+
+
+def test_text_sink_prints(capsys):
+    run(None, ticks=11)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split() == stats.stat_names()
+    assert len(lines) == 4
+
+
+def test_histograms_match_creatures(capsys):
+    sim = simulation.Simulation(4)
+    sim.populate()
+    for _ in range(100):
+        sim.update()
+    creatures = [
+        ent for ent in sim.world.layer(0).entities()
+        if type(ent).__name__ == 'Creature']
+    values = sim.stats.collect()
+    sim.close()
+    costs = [ent.birth_cost for ent in creatures]
+    index = sim.stats.trait('Creature', 'BirthCost')
+    assert index.histogram() == dict(sorted(collections.Counter(costs).items()))
+    assert index.mean() == pytest.approx(sum(costs) / len(costs))
+    assert values['CreatureMinBirthCost'] == min(costs)
+    assert values['CreatureMaxBirthCost'] == max(costs)
+
+
+def test_sink_errors_are_raised(tmp_path):
+    with pytest.raises(RuntimeError):
+        run(sinks.CsvSink(str(tmp_path / 'missing' / 'stats.csv')))
+
+
+def test_make_sink_needs_path():
+    with pytest.raises(ValueError):
+        sinks.make_sink('csv')
+    assert isinstance(sinks.make_sink('text'), sinks.TextSink)
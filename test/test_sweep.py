@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from hexgame import sweep
+
+
+def failing_run(spec):
+    if spec['seed'] == 2:
+        raise ValueError('bad run')
+    return sweep.run_one(spec)
+
+
+def crashing_run(spec):
+    if spec['seed'] == 2:
+        os._exit(1)
+    return sweep.run_one(spec)
+
+
+def _specs():
+    return sweep.expand_grid(
+        {'plant_max_life': [500, 1000]}, seeds=[1, 2], ticks=10, size=8,
+        interval=5)
+
+
+def test_expand_grid():
+    specs = _specs()
+    assert len(specs) == 4
+    assert len({spec['run_id'] for spec in specs}) == 4
+    # Defaults are left out, so the id doesn't depend on how they are given
+    assert specs[2]['params'] == {}
+    assert [spec['run_id'] for spec in _specs()] == [
+        spec['run_id'] for spec in specs]
+    # Bad values are found before any run starts
+    with pytest.raises(ValueError):
+        sweep.expand_grid({'plant_max_life': [500, 1.5]}, seeds=[1], ticks=10)
+
+
+def test_sweep_and_resume(tmp_path):
+    path = str(tmp_path / 'results.db')
+    specs = _specs()
+    assert sweep.run_sweep(path, specs, workers=2) == 4
+    store = sweep.ResultsStore(path)
+    try:
+        runs = store.runs()
+        assert [run['status'] for run in runs] == ['done'] * 4
+        series = store.series(specs[0]['run_id'])
+        assert series['Tick'] == [0, 5]
+    finally:
+        store.close()
+    assert sweep.run_sweep(path, specs, workers=2) == 0
+
+
+def test_failures_are_recorded(tmp_path):
+    path = str(tmp_path / 'results.db')
+    specs = _specs()
+    assert sweep.run_sweep(path, specs, workers=2, run=failing_run) == 2
+    assert sweep.run_sweep(path, specs, workers=2, run=crashing_run) == 0
+    store = sweep.ResultsStore(path)
+    try:
+        status = {run['run_id']: run['status'] for run in store.runs()}
+        for spec in specs:
+            expected = 'crashed' if spec['seed'] == 2 else 'done'
+            assert status[spec['run_id']] == expected
+    finally:
+        store.close()
+    # Fixed runs are picked up by the next sweep
+    assert sweep.run_sweep(path, specs, workers=2) == 2
+
+
+def test_crashes_only_isolate_running_runs(tmp_path, monkeypatch):
+    path = str(tmp_path / 'results.db')
+    specs = sweep.expand_grid(
+        {'plant_max_life': [400, 500, 600, 700, 800, 900]}, seeds=[1, 2],
+        ticks=10, size=8, interval=5)
+    pools = []
+    run_pool = sweep._Pool.run
+
+    def counting_run(self, pool_specs, workers):
+        pools.append((len(pool_specs), workers))
+        return run_pool(self, pool_specs, workers)
+
+    monkeypatch.setattr(sweep._Pool, 'run', counting_run)
+    assert sweep.run_sweep(path, specs, workers=2, run=crashing_run) == 6
+    crashes = len(specs) // 2
+    # A broken pool only had its two workers' runs running
+    isolated = [size for size, workers in pools if workers == 1]
+    assert len(isolated) <= 2 * crashes
+    store = sweep.ResultsStore(path)
+    try:
+        for run in store.runs():
+            expected = 'crashed' if run['seed'] == 2 else 'done'
+            assert run['status'] == expected
+            if expected == 'done':
+                assert store.series(run['run_id'])['Tick'] == [0, 5]
+    finally:
+        store.close()
@@ -0,0 +1,107 @@
+import collections
+import random
+
+import pytest
+
+from hexgame import headless
+from hexgame import simulation
+from hexgame import timingwheel
+from hexgame.entity import Plant
+
+
+def test_wheel_pops_items_at_their_tick():
+    wheel = timingwheel.TimingWheel(size=8)
+    wheel.add(3, 'a')
+    wheel.add(11, 'b')
+    wheel.add(3, 'c')
+    assert len(wheel) == 3
+    assert wheel.pop(2) == []
+    assert wheel.pop(3) == ['a', 'c']
+    # b shares the bucket of tick 3, but is a lap later
+    assert len(wheel) == 1
+    assert wheel.pop(11) == ['b']
+    assert len(wheel) == 0
+
+
+def test_countdown_ticks_matches_aging():
+    rand = random.Random(1)
+    value = 6
+    drawn = collections.Counter(
+        timingwheel.countdown_ticks(rand, value) for _ in range(20000))
+    aged = collections.Counter()
+    for _ in range(20000):
+        life = value
+        ticks = 0
+        while True:
+            ticks += 1
+            life -= 1
+            if life <= 0 or rand.randrange(life) == 0:
+                break
+        aged[ticks] += 1
+    assert sorted(drawn) == sorted(aged) == [1, 2, 3, 4, 5]
+    for ticks in drawn:
+        assert abs(drawn[ticks] - aged[ticks]) < 600
+
+
+def run_active(seed, ticks=50):
+    sim = simulation.Simulation(seed, 15, scheduling='active')
+    try:
+        sim.populate()
+        for _ in range(ticks):
+            sim.update()
+    finally:
+        sim.close()
+    return sim
+
+
+def plants(sim):
+    return sorted(
+        (plant.cell, plant._life, plant._reproduce)
+        for plant in sim.world.layer(1).entities())
+
+
+def test_active_runs_match():
+    first = run_active(5)
+    assert first.world.layer(1).count() > 0
+    assert plants(first) == plants(run_active(5))
+
+
+def test_active_plants_are_woken():
+    sim = run_active(3, ticks=10)
+    for plant in sim.world.layer(1).entities():
+        assert plant.wake_tick >= sim.tick
+
+
+def test_active_snapshot_saves_synced_plants(tmp_path):
+    sim = run_active(2, ticks=20)
+    path = tmp_path / 'active.snap'
+    sim.save(path)
+    expected = plants(sim)
+    loaded = simulation.Simulation.load(path, scheduling='active')
+    try:
+        assert plants(loaded) == expected
+        loaded.update()
+        assert all(
+            plant.wake_tick is not None
+            for plant in loaded.world.layer(1).entities())
+    finally:
+        loaded.close()
+
+
+def test_every_mode_does_not_schedule():
+    sim = simulation.Simulation(1, 10)
+    try:
+        sim.populate()
+        sim.update()
+        assert all(
+            isinstance(plant, Plant) and plant.wake_tick is None
+            for plant in sim.world.layer(1).entities())
+    finally:
+        sim.close()
+
+
+def test_only_object_engine_schedules():
+    with pytest.raises(ValueError):
+        headless.make_simulation('object', 1, workers=2, scheduling='active')
+    with pytest.raises(ValueError):
+        simulation.Simulation(1, scheduling='sometimes')
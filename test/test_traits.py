@@ -0,0 +1,54 @@
+import math
+import random
+
+import pytest
+
+from hexgame import traits
+
+
+def test_matches_sorted_values():
+    rand = random.Random(1)
+    index = traits.TraitIndex(capacity=4)
+    values = []
+    for _ in range(2000):
+        if values and rand.random() < 0.4:
+            value = values.pop(rand.randrange(len(values)))
+            index.remove(value)
+        else:
+            value = rand.randint(0, 300)
+            values.append(value)
+            index.add(value)
+        ordered = sorted(values)
+        assert len(index) == len(values)
+        if ordered:
+            assert index.min() == ordered[0]
+            assert index.max() == ordered[-1]
+            assert index.mean() == pytest.approx(sum(values) / len(values))
+            for percent in (10, 50, 90):
+                rank = max(1, math.ceil(percent / 100 * len(ordered)))
+                assert index.percentile(percent) == ordered[rank - 1]
+
+
+def test_empty_and_invalid():
+    index = traits.TraitIndex()
+    assert index.min() == 0 and index.max() == 0 and index.percentile(50) == 0
+    with pytest.raises(ValueError):
+        index.add(-1)
+    with pytest.raises(ValueError):
+        index.remove(3)
+    index.add(3)
+    index.clear()
+    assert len(index) == 0 and index.histogram() == {}
+
+
+def test_add_all():
+    index = traits.TraitIndex(capacity=4)
+    index.add(3)
+    index.add_all([1, 300, 3, 1])
+    assert len(index) == 5
+    assert index.histogram() == {1: 2, 3: 2, 300: 1}
+    assert (index.min(), index.percentile(50), index.max()) == (1, 3, 300)
+    index.remove(300)
+    assert index.max() == 3
+    with pytest.raises(ValueError):
+        index.add_all([2, -1])
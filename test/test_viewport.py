@@ -0,0 +1,61 @@
+from hexgame import location
+from hexgame import viewport
+
+
+class FakeSprite:
+    def __init__(self, image):
+        self.image = image
+        self.visible = True
+        self.updates = 0
+
+    def update(self, x, y):
+        self.x = x
+        self.y = y
+        self.updates += 1
+
+
+def test_visible_cells_match_positions():
+    grid = location.Grid(10)
+    view_bounds = viewport.bounds(200, 150, (120, 90), margin=0)
+    x0, y0, x1, y1 = view_bounds
+    expected = sorted(
+        cell
+        for cell in range(grid.num_cells())
+        for x, y in [grid.real_pos(cell)]
+        if x0 <= x <= x1 and y0 <= y <= y1
+    )
+    cells = viewport.visible_cells(grid, view_bounds)
+    assert sorted(cell for cell, _ in cells) == expected
+    assert all(grid.real_pos(cell) == pos for cell, pos in cells)
+
+
+def test_pool_recycles_sprites():
+    pool = viewport.SpritePool(FakeSprite)
+    pool.show([(1, 'a', 0, 0), (2, 'a', 20, 0)])
+    sprite = pool._shown[1][0]
+    pool.show([(1, 'a', 0, 0), (3, 'b', 40, 0)])
+    assert len(pool) == 2
+    assert pool._shown[1][0] is sprite and sprite.updates == 1
+    assert pool._shown[3][0].image == 'b'
+
+    pool.show([])
+    assert len(pool) == 2 and pool.shown() == 0
+    assert not sprite.visible
+
+
+def test_chunks_cover_visible_cells():
+    grid = location.Grid(40)
+    view_bounds = viewport.bounds(300, 250, (-130, 77))
+    chunk_size = 8
+    cells = set()
+    for chunk in viewport.visible_chunks(view_bounds, chunk_size):
+        chunk_cells = viewport.chunk_cells(grid, chunk, chunk_size)
+        assert len(chunk_cells) <= chunk_size * chunk_size
+        cells.update(cell for cell, _ in chunk_cells)
+    visible = {cell for cell, _ in viewport.visible_cells(grid, view_bounds)}
+    assert visible <= cells
+
+
+def test_bounds_with_zoom():
+    assert viewport.bounds(100, 50, (10, 20), scale=0.5, margin=0) == (
+        -20, -40, 180, 60)